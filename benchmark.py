@@ -0,0 +1,355 @@
+"""
+月次取込処理のベンチマーク。
+
+各データソースと同じレイアウトの合成ファイルを生成し、SQLiteを代替DBとして
+変換・抽出・挿入の各段階と取込処理全体の処理時間、件数/秒を計測する。
+変換（convert）段階は、取込処理と同じくconvert_source_file（ファイルの読み込みと「年月」列の追加）全体を計測する
+（「年月」列の追加だけを切り出して計測するものではない）。
+--memoryを指定すると、各段階をtracemallocで追跡しながらもう一度実行してピークメモリも計測する
+（追跡中は処理が数倍遅くなるため、処理時間は追跡しない1回目の実行で計測する）。
+
+使用例:
+    python benchmark.py --rows 10000
+    python benchmark.py --rows 100000 --workers 4 --typed --memory --output bench.json
+    python benchmark.py --rows 10000 --compare-strategies executemany multi_values
+"""
+from datetime import date, timedelta
+from functools import partial
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+from sqlalchemy import Date, Integer, Numeric, inspect
+from sqlalchemy.orm import sessionmaker
+
+from bulk_insert_utils import INSERT_STRATEGIES, compare_insert_strategies
+from database import build_engine
+from models import CostCenterReports, ActualExpenses, SalesReceivables, Discounts, PurchasePriceGap, ItemList, TYPED_MODELS
+from column_insert import convert_source_file
+from excel_reader import open_frame
+from monthly_loader import LEDGER_SOURCES, assign_sources, extract_source, convert_to_typed, insert_extracted, load_year_month, reset_month, get_sheet_name
+
+# 表形式のデータソース（ファイル名, モデル）。元ファイルには「年月」列が無く、取込時に追加される
+TABLE_LAYOUTS = [
+    ('売上実績.xlsx', CostCenterReports),
+    ('S4データ.xlsx', ActualExpenses),
+    ('値引き.xlsx', Discounts),
+    ('AQZZCO_CT.xlsx', PurchasePriceGap),
+]
+
+# 見出し行付きのタブ区切りテキスト（拡張子.xls）で出力される表形式のデータソース
+TEXT_TABLE_LAYOUTS = [
+    ('品目一覧表.xls', ItemList),
+]
+
+# テキスト形式（cp932のタブ区切り）の元帳データソース
+LEDGER_FILENAME = 'SBU別売上債権（各種売掛金）.xls'
+LEDGER_PAGE_ROWS = 50  # 1ページあたりの明細行数（ページごとに見出し行を挿入する）
+
+def _column_number(key):
+    match = re.fullmatch(r'column(\d+)', key)
+    return int(match.group(1)) if match else None
+
+def get_source_columns(model, has_year_month):
+    """
+    元ファイルの列構成を (属性名, 列名, 型) のリストで返す。
+    「年月」列は取込時に先頭へ追加されるため、元ファイルに無い場合はcolumn1を除く。
+    モデルに定義されていない列（SalesReceivablesのcolumn8など）は属性名をNoneとする。
+    """
+    typed_columns = {prop.key: prop.columns[0] for prop in inspect(TYPED_MODELS[model]).column_attrs}
+    numbers = [number for number in map(_column_number, typed_columns) if number is not None]
+    columns = []
+    for number in range(1 if has_year_month else 2, max(numbers) + 1):
+        column = typed_columns.get(f'column{number}')
+        if column is None:
+            columns.append((None, f'列{number}', None))
+        else:
+            columns.append((f'column{number}', column.name, column))
+    return columns
+
+def make_row_factory(columns, processing_year_month, seed=0):
+    """
+    列の型に応じた値を持つ行を生成する関数を返す。主キーの列は行番号から一意な値にする。
+    """
+    rng = random.Random(seed)
+    base_date = date(processing_year_month // 100, processing_year_month % 100, 1)
+
+    def value(column, row_number):
+        if column is None:
+            return 'x'
+        if column.primary_key:
+            return str(processing_year_month) if column.name == '年月' else f'{row_number:010d}'
+        if isinstance(column.type, Integer):
+            return processing_year_month if column.name == '年月' else rng.randint(1, 9999)
+        if isinstance(column.type, Numeric):
+            return round(rng.uniform(-1_000_000, 1_000_000), 2)
+        if isinstance(column.type, Date):
+            return base_date + timedelta(days=rng.randint(0, 27))
+        return f'{column.name[:8]}{rng.randint(0, 999)}'
+
+    return lambda row_number: [value(column, row_number) for _, _, column in columns]
+
+def write_table_workbook(path, columns, rows, processing_year_month):
+    """
+    1行目が見出し、2行目以降が明細の表形式ブックを書き込む（write_onlyで一定のメモリで生成する）。
+    """
+    make_row = make_row_factory(columns, processing_year_month)
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append([name for _, name, _ in columns])
+    for row_number in range(rows):
+        worksheet.append(make_row(row_number))
+    workbook.save(path)
+
+def write_text_table(path, columns, rows, processing_year_month):
+    """
+    1行目が見出しのcp932のタブ区切りテキスト（拡張子.xls）を書き込む。
+    """
+    make_row = make_row_factory(columns, processing_year_month)
+    with open(path, 'w', encoding='cp932', newline='\r\n') as f:
+        f.write('\t'.join(name for _, name, _ in columns) + '\n')
+        for row_number in range(rows):
+            f.write('\t'.join(str(value) for value in make_row(row_number)) + '\n')
+
+def write_ledger(path, rows, processing_year_month):
+    """
+    SAPの元帳出力と同じ、ページ見出しを含むcp932のタブ区切りテキスト（拡張子.xls）を書き込む。
+    """
+    columns = get_source_columns(SalesReceivables, True)
+    make_row = make_row_factory(columns, processing_year_month)
+    with open(path, 'w', encoding='cp932', newline='\r\n') as f:
+        for row_number in range(rows):
+            if row_number % LEDGER_PAGE_ROWS == 0:
+                f.write(f"ナブテスコ株式会社\tJapan 元帳\tページ {row_number // LEDGER_PAGE_ROWS + 1}\n")
+                f.write("＜売上債権＞\n")
+                f.write("会社コード\t事業領域\t得意先\t勘定\t金額\n")
+            values = make_row(row_number)
+            f.write('\t'.join('' if value is None else str(value) for value in values) + '\n')
+
+def write_fixed_layouts(input_dir_path, processing_year_month, seed=0):
+    """
+    固定レイアウトの帳票（受注売上受注残、人員集計表、建仮計上額、原価差額調整計算表、品目別在庫明細表、
+    PJ管理物件勘定内訳表、財務諸表）を、抽出処理が参照するセル位置に値を入れて書き込む。
+    「年月」列が追加される帳票は、追加後に1列右へずれることを考慮して元の列に書き込む。
+    """
+    rng = random.Random(seed)
+    amount = lambda: round(rng.uniform(0, 100_000), 1)
+    sheet_name = partial(get_sheet_name, processing_year_month=processing_year_month)
+
+    def save(filename, fill):
+        workbook = openpyxl.Workbook()
+        worksheet = workbook.active
+        worksheet.title = sheet_name(filename) or 'Sheet1'
+        worksheet['A1'] = filename
+        fill(worksheet)
+        workbook.save(os.path.join(input_dir_path, filename))
+
+    def fill_columns(rows, columns):
+        def fill(worksheet):
+            for row in rows:
+                for column in columns:
+                    worksheet.cell(row=row, column=column, value=amount())
+        return fill
+
+    def fill_financial_statements(worksheet):
+        for row in range(2, 200):
+            worksheet.cell(row=row, column=1, value=f'科目{row}')
+            worksheet.cell(row=row, column=7, value=amount())
+        worksheet['A120'] = '売上原価  合計'
+        worksheet['A180'] = '営業利益'
+        worksheet['G180'] = f'{amount():,}'
+
+    def fill_direct_expenses(worksheet):
+        for row in range(346, 362):
+            worksheet[f'AA{row}'] = amount()
+
+    save('受注売上受注残.xlsx', fill_columns(range(6, 45), range(5, 17)))
+    save('人員集計表.xlsx', fill_columns(range(59, 68), range(4, 16)))
+    save('建仮計上額.xlsx', fill_columns(range(2, 5), range(1, 13)))
+    save('原価差額調整計算表 AI.xlsx', fill_columns(range(5, 66), range(4, 17)))
+    save('品目別在庫明細表.xlsx', fill_columns(range(8, 15), range(2, 18)))
+    save('PJ管理物件勘定内訳表.xlsx', fill_direct_expenses)
+    save('財務諸表.xlsx', fill_financial_statements)
+
+def generate_sources(input_dir_path, processing_year_month, rows):
+    """
+    処理年月のデータソース一式を合成して書き込む。
+    Args:
+        input_dir_path (str): 出力ディレクトリ
+        processing_year_month (int): 処理年月（YYYYMM形式）
+        rows (int): 表形式・元帳形式のデータソースの明細行数
+    """
+    os.makedirs(input_dir_path, exist_ok=True)
+    for filename, model in TABLE_LAYOUTS:
+        write_table_workbook(os.path.join(input_dir_path, filename), get_source_columns(model, False), rows, processing_year_month)
+    for filename, model in TEXT_TABLE_LAYOUTS:
+        write_text_table(os.path.join(input_dir_path, filename), get_source_columns(model, False), rows, processing_year_month)
+    write_ledger(os.path.join(input_dir_path, LEDGER_FILENAME), rows, processing_year_month)
+    write_fixed_layouts(input_dir_path, processing_year_month)
+
+def measure(results, stage, source, func, *args, count_rows=None, bytes_read=None, trace_memory=False, setup=None, **kwargs):
+    """
+    関数の処理時間を計測し、結果をresultsに追加する。
+    trace_memory=Trueの場合は、tracemallocで追跡しながらもう一度実行してピークメモリを計測する
+    （setupは各実行の前に呼び出され、計測には含めない）。
+    """
+    if setup:
+        setup()
+    start_time = time.perf_counter()
+    value = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start_time
+
+    peak_memory_mb = None
+    if trace_memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    rows = count_rows(value) if count_rows else None
+    results.append({
+        'stage': stage,
+        'source': source,
+        'seconds': round(elapsed, 3),
+        'rows': rows,
+        'rows_per_sec': round(rows / elapsed) if rows and elapsed > 0 else None,
+        'bytes_read': bytes_read,
+        'peak_memory_mb': peak_memory_mb,
+    })
+    return value
+
+def count_extracted(extracted):
+    return sum(len(data_list) for _, data_list in extracted)
+
+def run_benchmark(input_dir_path, processing_year_month, session_factory, workers=1, typed=False, trace_memory=False):
+    """
+    データソースごとに変換（convert_source_file）・抽出・（型変換・）挿入の各段階を計測し、最後に取込処理全体を計測する。
+    Returns:
+        List[dict]: 段階ごとの計測結果
+    """
+    results = []
+    filenames = sorted(filename for filename in os.listdir(input_dir_path) if filename.lower().endswith(('.xlsx', '.xls')))
+    assignments, _ = assign_sources(filenames)
+    sheet_name = partial(get_sheet_name, processing_year_month=processing_year_month)
+    stage = partial(measure, results, trace_memory=trace_memory)
+
+    for filename, source_key in assignments.items():
+        bytes_read = os.path.getsize(os.path.join(input_dir_path, filename))
+        df = stage('convert', source_key, convert_source_file, input_dir_path, filename, processing_year_month, sheet_name,
+                   ledger=source_key in LEDGER_SOURCES, count_rows=len, bytes_read=bytes_read)
+        extracted = stage('extract', source_key, lambda: extract_source(source_key, open_frame(df), processing_year_month), count_rows=count_extracted)
+        if typed:
+            extracted = stage('typed', source_key, convert_to_typed, extracted, count_rows=count_extracted)
+        stage('insert', source_key, insert_extracted, extracted, processing_year_month, session_factory, replace_month=True, count_rows=lambda _: count_extracted(extracted))
+        del df, extracted
+
+    # 取込処理全体（プロセスプールのワーカーのメモリはtracemallocでは追跡されない）
+    stage(
+        'load_year_month', f'全体（workers={workers}）', load_year_month,
+        processing_year_month, input_dir_path, workers, session_factory=session_factory, typed=typed,
+        count_rows=lambda result: len(result['loaded']),
+        setup=lambda: reset_month(processing_year_month, session_factory, typed=typed),
+    )
+    return results
+
+def run_strategy_comparison(input_dir_path, processing_year_month, engine, strategies=None, typed=False):
+    """
+    表形式のデータソースごとに、抽出したデータを挿入方式ごとに挿入して処理速度（件/秒）を計測する。
+    各方式の挿入はロールバックするため、データベースにデータは残らない。
+    Returns:
+        List[dict]: 挿入方式・データソースごとの計測結果（run_benchmarkと同じ形式）
+    """
+    results = []
+    sheet_name = partial(get_sheet_name, processing_year_month=processing_year_month)
+    filenames = [filename for filename, _ in TABLE_LAYOUTS + TEXT_TABLE_LAYOUTS]
+    assignments, _ = assign_sources(filenames)
+    for filename, source_key in assignments.items():
+        df = convert_source_file(input_dir_path, filename, processing_year_month, sheet_name)
+        extracted = extract_source(source_key, open_frame(df), processing_year_month)
+        if typed:
+            extracted = convert_to_typed(extracted)
+        for model, data_list in extracted:
+            for strategy, rows_per_sec in compare_insert_strategies(engine, model, data_list, strategies).items():
+                results.append({
+                    'stage': f'insert:{strategy}',
+                    'source': source_key,
+                    'seconds': round(len(data_list) / rows_per_sec, 3) if rows_per_sec else 0.0,
+                    'rows': len(data_list),
+                    'rows_per_sec': round(rows_per_sec),
+                    'bytes_read': None,
+                    'peak_memory_mb': None,
+                })
+    return results
+
+def format_results(results):
+    """
+    計測結果を表形式の文字列にする。
+    """
+    header = f"{'段階':<24}{'データソース':<32}{'秒':>10}{'件数':>10}{'件/秒':>10}{'MB(最大)':>10}"
+    lines = [header, '-' * len(header)]
+    for result in results:
+        lines.append(
+            f"{result['stage']:<24}{result['source']:<32}{result['seconds']:>10.3f}"
+            f"{result['rows'] if result['rows'] is not None else '-':>10}"
+            f"{result['rows_per_sec'] if result['rows_per_sec'] is not None else '-':>10}"
+            f"{result['peak_memory_mb'] if result['peak_memory_mb'] is not None else '-':>10}"
+        )
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="合成データで月次取込処理の各段階を計測する",
+        epilog="convertの段階は、convert_source_file（ファイルの読み込みと「年月」列の追加）全体の処理時間を計測する。",
+    )
+    parser.add_argument('--rows', type=int, default=10000, help="表形式・元帳形式のデータソースの明細行数")
+    parser.add_argument('--year-month', type=int, default=202405, help="処理年月（YYYYMM形式）")
+    parser.add_argument('--workers', type=int, default=1, help="取込処理全体を計測する際の並列実行数")
+    parser.add_argument('--typed', action='store_true', help="型付きテーブルへ取り込む")
+    parser.add_argument('--memory', action='store_true', help="tracemallocで各段階のピークメモリも計測する")
+    parser.add_argument('--compare-strategies', nargs='*', choices=list(INSERT_STRATEGIES), metavar='STRATEGY',
+                        help="表形式のデータソースを挿入方式ごとに挿入して件/秒を比較する（方式を省略した場合はすべて）")
+    parser.add_argument('--work-dir', help="合成ファイルとSQLiteファイルの出力先（省略時は一時ディレクトリ）")
+    parser.add_argument('--output', help="計測結果をJSONで保存するファイル")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='monthly_benchmark_')
+    input_dir_path = os.path.join(work_dir, str(args.year_month))
+
+    start_time = time.perf_counter()
+    generate_sources(input_dir_path, args.year_month, args.rows)
+    print(f"合成データを生成しました: {input_dir_path}（{args.rows}行, {time.perf_counter() - start_time:.1f}秒）")
+
+    db_path = os.path.join(work_dir, 'benchmark.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = build_engine({'url': f'sqlite:///{db_path}', 'create_tables': True})
+    session_factory = sessionmaker(bind=engine)
+
+    results = run_benchmark(input_dir_path, args.year_month, session_factory, args.workers, args.typed, args.memory)
+    print(format_results(results))
+
+    if args.compare_strategies is not None:
+        # 取り込んだデータと主キーが重複しないよう、処理年月分を削除してから比較する
+        reset_month(args.year_month, session_factory, typed=args.typed)
+        strategy_results = run_strategy_comparison(input_dir_path, args.year_month, engine, args.compare_strategies, args.typed)
+        print(format_results(strategy_results))
+        results += strategy_results
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'year_month': args.year_month, 'workers': args.workers, 'typed': args.typed, 'memory': args.memory, 'results': results}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,362 @@
+from sqlalchemy import and_, bindparam, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.orm import Session
+from functools import lru_cache
+from itertools import islice
 import logging
+import time
 
-def bulk_insert_with_chunk(session: Session, model, data_list, chunk_size=1000):
+from instrumentation import annotate
+from row_batch import RowBatch
+from row_validation import REASON_DATABASE_ERROR, RowValidator, reject_rows
+from transaction_utils import begin_transaction, is_autocommit
+
+# 挿入方式
+STRATEGY_ORM = 'orm'                            # session.bulk_insert_mappings（ORMマッパー経由）
+STRATEGY_EXECUTEMANY = 'executemany'            # Core INSERT + DBAPIのexecutemany（SQLiteでも動作）
+STRATEGY_FAST_EXECUTEMANY = 'fast_executemany'  # pyodbcのfast_executemanyでパラメータ配列を一括送信
+STRATEGY_MULTI_VALUES = 'multi_values'          # 複数行のVALUES句を持つINSERT文
+
+# テーブルごとの挿入方式（指定のないテーブルはDEFAULT_INSERT_STRATEGYを使用）
+INSERT_STRATEGY_MAPPING = {
+    'T_CostCenterReport': STRATEGY_FAST_EXECUTEMANY,
+    'T_ExpenseActuals': STRATEGY_FAST_EXECUTEMANY,
+    'T_SBU_SalesReceivables': STRATEGY_FAST_EXECUTEMANY,
+    'T_DiscountList': STRATEGY_FAST_EXECUTEMANY,
+    'T_PurchasePriceGap': STRATEGY_FAST_EXECUTEMANY,
+    'T_ItemList': STRATEGY_FAST_EXECUTEMANY,
+    'T_CostCenterReport_Typed': STRATEGY_FAST_EXECUTEMANY,
+    'T_ExpenseActuals_Typed': STRATEGY_FAST_EXECUTEMANY,
+    'T_SBU_SalesReceivables_Typed': STRATEGY_FAST_EXECUTEMANY,
+    'T_DiscountList_Typed': STRATEGY_FAST_EXECUTEMANY,
+    'T_PurchasePriceGap_Typed': STRATEGY_FAST_EXECUTEMANY,
+    'T_ItemList_Typed': STRATEGY_FAST_EXECUTEMANY,
+}
+DEFAULT_INSERT_STRATEGY = STRATEGY_EXECUTEMANY
+
+# 1文あたりのバインドパラメータ上限（SQL Serverは2100、SQLiteの旧版は999）
+MAX_PARAMETERS_PER_STATEMENT = {'mssql': 2000, 'sqlite': 999}
+MAX_ROWS_PER_VALUES = 1000  # SQL ServerのVALUES句は1000行まで
+
+# 1チャンクのうち、1行ずつに分けても挿入できなかった行として除外できる割合の上限
+# 超えた場合は一部の行ではなくデータ全体の問題として扱い、元のエラーを送出してテーブル全体をロールバックする
+MAX_BISECT_REJECTED_RATIO = 0.5
+
+class LoadCancelled(Exception):
+    """
+    キャンセル要求によりデータ挿入を中断したことを示す例外。
+    """
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _enable_fast_executemany(conn, cursor, statement, parameters, context, executemany):
+    """
+    実行オプションでfast_executemanyが指定された場合のみ、pyodbcカーソルのfast_executemanyを有効にする。
+    pyodbc以外のドライバ（SQLiteなど）では通常のexecutemanyのまま実行される。
+    """
+    if executemany and context is not None and context.execution_options.get('fast_executemany'):
+        if hasattr(cursor, 'fast_executemany'):
+            cursor.fast_executemany = True
+
+def _column_mapping(model):
+    """
+    モデルの属性名（column1など）とテーブル列の対応を返すヘルパー関数。
+    """
+    return {prop.key: prop.columns[0] for prop in inspect(model).column_attrs}
+
+def _core_rows(model, chunk):
+    """
+    属性名をキーとする辞書のリスト（またはRowBatch）を、テーブル列のキーをキーとする辞書のリストに変換する。
+    モデルに存在しないキーは無視し、チャンク先頭行に無い列（自動採番列など）は挿入対象にしない。
+    """
+    columns = [(key, column) for key, column in _column_mapping(model).items() if key in chunk[0]]
+    return [{column.key: row.get(key) for key, column in columns} for row in chunk]
+
+@lru_cache(maxsize=256)
+def _compile_positional_insert(table, model, keys, dialect):
+    """
+    RowBatchの列の並び（keys）に対するexecutemany用のINSERT文を、位置パラメータ（?）の形式でコンパイルする。
+    テーブル・列の並びごとに1回だけコンパイルし、行のタプルから取り出す位置と型ごとの値の変換処理も合わせて返す。
+    Returns:
+        Tuple[str, tuple, tuple]: (SQL文, 各パラメータに対応する行のインデックス（並びが一致する場合はNone）, (パラメータの位置, 変換処理) のタプル)
+    """
+    mapping = _column_mapping(model)
+    indexes = {mapping[key].key: index for index, key in enumerate(keys) if key in mapping}
+    compiled = table.insert().compile(dialect=dialect, column_keys=list(indexes), for_executemany=True)
+    positions = tuple(indexes[key] for key in compiled.positiontup)
+    processors = tuple(
+        (position, processor) for position, key in enumerate(compiled.positiontup)
+        if (processor := table.c[key].type.dialect_impl(dialect).bind_processor(dialect)) is not None
+    )
+    return compiled.string, None if positions == tuple(range(len(keys))) else positions, processors
+
+def _positional_parameters(model, table, batch, dialect):
+    """
+    RowBatchの行を、位置パラメータのタプルのリストに変換するヘルパー関数。
+    列の並びが一致し、値の変換も不要な場合（VARCHARのみのテーブルなど）は行のタプルをそのまま渡す。
+    """
+    statement, positions, processors = _compile_positional_insert(table, model, batch.keys, dialect)
+    if positions is None and not processors:
+        return statement, batch.rows
+    parameters = []
+    for row in batch.rows:
+        values = [row[i] for i in positions] if positions is not None else list(row)
+        for position, processor in processors:
+            values[position] = processor(values[position])
+        parameters.append(tuple(values))
+    return statement, parameters
+
+def execute_insert(connection, model, table, chunk, execution_options=None):
+    """
+    チャンクをexecutemanyでテーブル（モデルのテーブル、または同じ列を持つステージング・シャドウテーブル）へ挿入する。
+    RowBatchは行のタプルを位置パラメータとしてそのまま渡し、行ごとの辞書を作らない。
+    辞書のリストや、位置パラメータを使わないドライバの場合は、列のキーをキーとする辞書に変換して挿入する。
+    """
+    if isinstance(chunk, RowBatch) and connection.dialect.positional:
+        statement, parameters = _positional_parameters(model, table, chunk, connection.dialect)
+        connection.exec_driver_sql(statement, parameters, execution_options=execution_options or {})
+    else:
+        connection.execute(table.insert(), _core_rows(model, chunk), execution_options=execution_options or {})
+
+def _insert_orm(session, model, chunk):
+    session.bulk_insert_mappings(model, list(chunk))
+
+def _insert_executemany(session, model, chunk):
+    execute_insert(session.connection(), model, model.__table__, chunk)
+
+def _insert_fast_executemany(session, model, chunk):
+    execute_insert(session.connection(), model, model.__table__, chunk, execution_options={'fast_executemany': True})
+
+@lru_cache(maxsize=None)
+def _compile_multi_values(table, column_keys, row_count, dialect):
+    """
+    row_count行分のVALUES句を持つINSERT文をコンパイルして返す。
+    複数行VALUESの文はSQLAlchemyのコンパイルキャッシュに載らないため、行数ごとに1回だけコンパイルして再利用する。
+    """
+    statement = table.insert().values([
+        {key: bindparam(f"p{i}_{j}", type_=table.c[key].type) for j, key in enumerate(column_keys)}
+        for i in range(row_count)
+    ])
+    return statement.compile(dialect=dialect)
+
+def _insert_multi_values(session, model, chunk):
+    connection = session.connection()
+    rows = _core_rows(model, chunk)
+    column_keys = tuple(rows[0])
+    max_parameters = MAX_PARAMETERS_PER_STATEMENT.get(connection.dialect.name, 999)
+    rows_per_statement = max(1, min(MAX_ROWS_PER_VALUES, max_parameters // max(1, len(column_keys))))
+    for i in range(0, len(rows), rows_per_statement):
+        batch = rows[i:i + rows_per_statement]
+        compiled = _compile_multi_values(model.__table__, column_keys, len(batch), connection.dialect)
+        params = {
+            f"p{row_index}_{j}": row[key]
+            for row_index, row in enumerate(batch) for j, key in enumerate(column_keys)
+        }
+        if compiled.positiontup:
+            connection.exec_driver_sql(compiled.string, tuple(params[name] for name in compiled.positiontup))
+        else:
+            connection.exec_driver_sql(compiled.string, params)
+
+INSERT_STRATEGIES = {
+    STRATEGY_ORM: _insert_orm,
+    STRATEGY_EXECUTEMANY: _insert_executemany,
+    STRATEGY_FAST_EXECUTEMANY: _insert_fast_executemany,
+    STRATEGY_MULTI_VALUES: _insert_multi_values,
+}
+
+def get_insert_strategy(model):
+    """
+    モデルに対応する挿入方式を返す。
+    """
+    return INSERT_STRATEGY_MAPPING.get(model.__tablename__, DEFAULT_INSERT_STRATEGY)
+
+def _begin_savepoint(session):
+    """
+    チャンクの挿入だけを取り消せるよう、セーブポイントを作成するヘルパー関数。
+    pysqliteは最初の更新系の文まで BEGIN を送らず、その前に作成したセーブポイントの解放がコミットになるため、明示的に開始する。
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+    return session.begin_nested()
+
+def _exists_in_table(session, model, key_attrs, row):
+    """
+    行と主キーが一致するレコードが、挿入先のテーブルにすでに存在するかどうかを返すヘルパー関数。
+    """
+    from reset_utils import has_rows
+
+    if not key_attrs or any(attr not in row for attr in key_attrs):
+        return False
+    return has_rows(session, model, and_(*(getattr(model, attr) == row[attr] for attr in key_attrs)))
+
+def _insert_bisecting(session, model, chunk, insert_func, validator, failed, max_failed):
+    """
+    チャンクをセーブポイント内で挿入し、データベースのエラーで失敗した場合はチャンクを半分ずつに分けて挿入し直す。
+    1行ずつに分けても挿入できない行だけをfailedに追加し、残りの行は挿入する。
+    次の場合は一部の行ではなくデータ全体の問題（処理年月分が取込済みなど）として扱い、元のエラーを送出する。
+    ・挿入できない行と主キーが一致するレコードが、テーブルにすでに存在する
+    ・除外する行がmax_failedを超える
+    Returns:
+        int: 挿入した件数
+    """
+    savepoint = _begin_savepoint(session)
+    try:
+        insert_func(session, model, chunk)
+        savepoint.commit()
+        return len(chunk)
+    except (IntegrityError, DataError) as e:
+        savepoint.rollback()
+        if len(chunk) > 1:
+            middle = len(chunk) // 2
+            return (_insert_bisecting(session, model, chunk[:middle], insert_func, validator, failed, max_failed)
+                    + _insert_bisecting(session, model, chunk[middle:], insert_func, validator, failed, max_failed))
+        if isinstance(e, IntegrityError) and _exists_in_table(session, model, validator.key_attrs, chunk[0]):
+            logging.error(f"{model.__tablename__} に主キーが一致するレコードがすでに存在します。処理年月分が取込済みの可能性があります。")
+            raise
+        if len(failed) >= max_failed:
+            raise
+        failed.append(validator.make_record(chunk[0], REASON_DATABASE_ERROR, detail=str(e.orig)))
+        return 0
+
+def bulk_insert_with_chunk(session: Session, model, data_list, chunk_size=1000, strategy=None, cancel_event=None, progress_callback=None, validate=True):
     """
     データをチャンク単位でバルクインサートする共通関数。
+    cancel_eventがセットされた場合は次のチャンクの前で中断し、ロールバックしてLoadCancelledを送出する。
+    validate=Trueの場合は、挿入できない行だけを取込から除外して残りを挿入する（bulk_insert_streamを参照）。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        model: SQLAlchemyのモデルクラス
+        data_list (List[Dict] | RowBatch): 挿入対象の辞書形式データ、またはRowBatch
+        chunk_size (int): 1チャンクあたりのレコード数（デフォルト1000）
+        strategy (str): 挿入方式（INSERT_STRATEGIESのキー。省略時はモデルごとの設定を使用）
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        progress_callback (function): 1チャンク挿入ごとに (挿入済み件数, 総件数) で呼び出される関数
+        validate (bool): 挿入前の検査と、失敗したチャンクの分割による行の除外を行うかどうか
+    Returns:
+        int: 挿入した件数（除外した行を含まない）
+    """
+    return bulk_insert_stream(session, model, data_list, chunk_size, strategy, cancel_event, progress_callback, total=len(data_list), validate=validate)
+
+def iter_chunks(rows, chunk_size, keys=None):
+    """
+    行の反復子からchunk_size件ずつのリストを取り出すジェネレータ。
+    keysを指定した場合は、各行を値のタプルとして扱い、チャンクをRowBatchにまとめて返す。
+    """
+    if isinstance(rows, RowBatch):
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+        return
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk if keys is None else RowBatch(keys, chunk)
+
+def bulk_insert_stream(session: Session, model, rows, chunk_size=1000, strategy=None, cancel_event=None, progress_callback=None, total=None, keys=None, validate=True):
+    """
+    行の反復子（ジェネレータなど）から1チャンクずつ取り出してバルクインサートする共通関数。
+    全件をリストに展開しないため、メモリ使用量はファイルサイズではなくチャンクサイズに比例する。
+    すべてのチャンクを1つのトランザクションで挿入し、最後にコミットする。
+    cancel_eventがセットされた場合は次のチャンクの前で中断し、ロールバックしてLoadCancelledを送出する。
+
+    validate=Trueの場合は、各チャンクを挿入する前に列単位で検査し（主キーの重複・NULL、文字列の長さ）、該当する行を除外する。
+    さらにチャンクごとにセーブポイントを作成し、挿入に失敗したチャンクは半分ずつに分けて挿入し直して、
+    挿入できない行だけを除外する。除外した行はログに出力し、取込から除外した行のファイル（load_quarantine.jsonl）に集める。
+    既存のレコードと主キーが重複する場合や、チャンクのMAX_BISECT_REJECTED_RATIOを超える行が挿入できない場合は、除外せずにエラーを送出する。
+    セーブポイントはトランザクション内でしか作成できないため、接続URLでautocommitを有効にしている場合も明示的なトランザクションで挿入する。
+    それでもautocommitのコネクションの場合は、セーブポイントを作成せずに挿入し、失敗した場合は分割せずにエラーを送出する。
 
     Args:
         session (Session): SQLAlchemyセッション
         model: SQLAlchemyのモデルクラス
-        data_list (List[Dict]): 挿入対象の辞書形式データ
+        rows (Iterable[Dict] | Iterable[tuple] | RowBatch): 挿入対象の辞書形式データ（keys指定時は値のタプル）を返す反復子、またはRowBatch
         chunk_size (int): 1チャンクあたりのレコード数（デフォルト1000）
+        strategy (str): 挿入方式（INSERT_STRATEGIESのキー。省略時はモデルごとの設定を使用）
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        progress_callback (function): 1チャンク挿入ごとに (挿入済み件数, 総件数) で呼び出される関数（総件数が不明な場合はNone）
+        total (int): 総件数（分かっている場合のみ）
+        keys (tuple): rowsが値のタプルを返す場合の列の並び（属性名）
+        validate (bool): 挿入前の検査と、失敗したチャンクの分割による行の除外を行うかどうか
+    Returns:
+        int: 挿入した件数（除外した行を含まない）
     """
+    strategy = strategy or get_insert_strategy(model)
+    insert_func = INSERT_STRATEGIES.get(strategy)
+    if insert_func is None:
+        raise ValueError(f"未対応の挿入方式です: {strategy}")
+
+    validator = RowValidator(model) if validate else None
+    inserted = processed = rejected_count = 0
     try:
-        for i in range(0, len(data_list), chunk_size):
-            chunk = data_list[i:i + chunk_size]
-            session.bulk_insert_mappings(model, chunk)
+        start_time = time.perf_counter()
+        bisect = validator is not None and not is_autocommit(begin_transaction(session))
+        for chunk in iter_chunks(rows, chunk_size, keys):
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled(f"{model.__tablename__} へのデータ挿入はキャンセルされました。")
+            processed += len(chunk)
+            if validator is None:
+                insert_func(session, model, chunk)
+                inserted += len(chunk)
+            else:
+                chunk, rejected = validator.check(chunk)
+                failed = []
+                if chunk and bisect:
+                    inserted += _insert_bisecting(session, model, chunk, insert_func, validator, failed, int(len(chunk) * MAX_BISECT_REJECTED_RATIO))
+                elif chunk:
+                    insert_func(session, model, chunk)
+                    inserted += len(chunk)
+                rejected += failed
+                reject_rows(model, rejected)
+                rejected_count += len(rejected)
+            if progress_callback:
+                progress_callback(processed, total)
+        commit_start_time = time.perf_counter()
         session.commit()
-        logging.info(f"{model.__tablename__} に {len(data_list)} 件のデータをバルクインサートしました。")
+        annotate(strategy=strategy, rows=inserted, rejected=rejected_count, commit_seconds=time.perf_counter() - commit_start_time)
+        elapsed = time.perf_counter() - start_time
+        rows_per_sec = inserted / elapsed if elapsed > 0 else 0
+        logging.info(f"{model.__tablename__} に {inserted} 件のデータをバルクインサートしました。（方式: {strategy}, {elapsed:.2f}秒, {rows_per_sec:.0f}件/秒"
+                     + (f", 除外: {rejected_count}件）" if rejected_count else "）"))
+        return inserted
+    except LoadCancelled as e:
+        session.rollback()
+        logging.warning(f"{e}ロールバックしました。")
+        raise
     except Exception as e:
         session.rollback()
-        logging.error(f"{model.__tablename__} へのデータ挿入中にエラー: {e}")
+        logging.error(f"{model.__tablename__} へのデータ挿入中にエラーが発生しました（方式: {strategy}）: {e}")
         raise
+
+def compare_insert_strategies(engine, model, data_list, strategies=None, chunk_size=1000):
+    """
+    挿入方式ごとの処理速度（件/秒）を計測する関数。
+    各方式の挿入はトランザクション内で実行した後にロールバックするため、データは残らない。
+
+    Args:
+        engine: SQLAlchemyエンジン（SQLiteの代替DBでも可）
+        model: SQLAlchemyのモデルクラス
+        data_list (List[Dict] | RowBatch): 挿入対象の辞書形式データ、またはRowBatch
+        strategies (List[str]): 計測する挿入方式（省略時はすべての方式）
+        chunk_size (int): 1チャンクあたりのレコード数
+    Returns:
+        dict: 挿入方式をキー、件/秒を値とする辞書
+    """
+    results = {}
+    for strategy in strategies or INSERT_STRATEGIES:
+        insert_func = INSERT_STRATEGIES[strategy]
+        session = Session(bind=engine)
+        try:
+            start_time = time.perf_counter()
+            for i in range(0, len(data_list), chunk_size):
+                insert_func(session, model, data_list[i:i + chunk_size])
+            session.flush()
+            elapsed = time.perf_counter() - start_time
+        finally:
+            session.rollback()
+            session.close()
+        results[strategy] = len(data_list) / elapsed if elapsed > 0 else 0
+        logging.info(f"{model.__tablename__}: {strategy} {results[strategy]:.0f}件/秒（{len(data_list)}件, {elapsed:.2f}秒）")
+    return results
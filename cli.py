@@ -0,0 +1,234 @@
+"""
+月次取込処理のコマンドラインエントリポイント（画面を使わずにタスクスケジューラなどから実行する）。
+
+使用例:
+    python cli.py load-month 202405
+    python cli.py load-month 202405 --sources CostCenterReports FinancialCostOfSales --workers 4
+    python cli.py load-month 202405 --stream CostCenterReports ItemList --workers 4
+    python cli.py reset-month 202405
+    python cli.py backfill 202401 202405 --sources SalesBacklog Staffingtable
+    python cli.py refresh-summary 202405
+    python cli.py list-sources
+    python cli.py --db-profile sqlite load-month 202405
+
+pandas・openpyxlなどの重いライブラリは、ファイルを読み込む段階で初めて読み込む。
+"""
+import argparse
+import logging
+import re
+import sys
+import threading
+
+# 終了コード
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_CANCELLED = 130  # Ctrl+Cで中断した場合
+
+def year_month(value):
+    """
+    YYYYMM形式の処理年月を検証して整数で返す（argparseの型変換用）。
+    """
+    if not re.match(r"^\d{4}(0[1-9]|1[0-2])$", value):
+        raise argparse.ArgumentTypeError("処理年月はYYYYMM形式で指定してください。")
+    return int(value)
+
+def run_cancellable(target, *args, **kwargs):
+    """
+    処理をワーカースレッドで実行し、Ctrl+Cが押された場合はcancel_eventで中断してロールバックさせる。
+    Returns:
+        tuple: (戻り値, キャンセルされたかどうか)
+    """
+    from bulk_insert_utils import LoadCancelled
+
+    cancel_event = threading.Event()
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = target(*args, cancel_event=cancel_event, **kwargs)
+        except LoadCancelled:
+            outcome['cancelled'] = True
+        except BaseException as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.2)
+    except KeyboardInterrupt:
+        print("キャンセルしています...", file=sys.stderr)
+        cancel_event.set()
+        worker.join()
+
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result'), outcome.get('cancelled', False) or cancel_event.is_set()
+
+def print_rejected(result):
+    """
+    取込から除外した行数をファイルごとに表示する。
+    """
+    from row_validation import QUARANTINE_FILENAME
+
+    for filename, count in result['rejected'].items():
+        print(f"  除外した行: {filename}: {count}件（{QUARANTINE_FILENAME}を参照）", file=sys.stderr)
+
+def command_load_month(args):
+    from monthly_loader import load_year_month, get_input_dir_path, configure_logging
+    from parse_cache import DEFAULT_CACHE_DIR
+
+    input_dir_path = args.input_dir or get_input_dir_path(args.year_month)
+    configure_logging(input_dir_path, args.log_level)
+
+    result, cancelled = run_cancellable(
+        load_year_month, args.year_month, input_dir_path,
+        workers=args.workers, write_tmp=args.write_tmp, incremental=args.incremental,
+        typed=args.typed, sources=args.sources, upsert=args.upsert, swap=args.swap,
+        cache_dir=None if args.no_cache else args.cache_dir or DEFAULT_CACHE_DIR, stream=args.stream or args.stream is not None,
+        single_transaction=args.single_transaction or args.all_or_nothing, savepoint_per_source=not args.all_or_nothing,
+    )
+    if cancelled or result['cancelled']:
+        print(f"{args.year_month}のデータ取込をキャンセルしました。")
+        return EXIT_CANCELLED
+
+    print(f"{args.year_month}のデータ取込が完了しました。（取込: {len(result['loaded'])}件, スキップ: {len(result['skipped'])}件, "
+          f"エラー: {len(result['failed'])}件, 対応するモデルが無いファイル: {len(result['unknown'])}件）")
+    if args.summary:
+        print(result['metrics'].format_summary())
+    for filename, error in result['failed'].items():
+        print(f"  エラー: {filename}: {error}", file=sys.stderr)
+    for filename in result['unknown']:
+        print(f"  対応するモデルが無いファイル: {filename}", file=sys.stderr)
+    print_rejected(result)
+    return EXIT_FAILED if result['failed'] or result['unknown'] else EXIT_OK
+
+def command_reset_month(args):
+    from monthly_loader import reset_month, get_input_dir_path, configure_logging
+
+    input_dir_path = args.input_dir or get_input_dir_path(args.year_month)
+    configure_logging(input_dir_path, args.log_level)
+
+    deleted_counts, cancelled = run_cancellable(
+        reset_month, args.year_month,
+        input_dir_path=input_dir_path, workers=args.workers, typed=args.typed,
+    )
+    if cancelled:
+        print(f"{args.year_month}のリセットをキャンセルしました。（削除済みのバッチは元に戻りません）")
+        return EXIT_CANCELLED
+
+    for tablename, deleted in deleted_counts.items():
+        print(f"  {tablename}: {deleted}件")
+    print(f"{args.year_month}のリセットが完了しました。（削除: {sum(deleted_counts.values())}件）")
+    return EXIT_OK
+
+def command_backfill(args):
+    from monthly_loader import backfill_year_months, get_input_dir_path, configure_logging
+
+    input_dir_path = args.input_dir or get_input_dir_path(args.end)
+    configure_logging(input_dir_path, args.log_level)
+
+    result, cancelled = run_cancellable(
+        backfill_year_months, args.start, args.end,
+        input_dir_path=input_dir_path, sources=args.sources,
+    )
+    if cancelled or result['cancelled']:
+        print(f"{args.start}～{args.end}の取込をキャンセルしました。")
+        return EXIT_CANCELLED
+
+    for filename, rows in result['loaded'].items():
+        print(f"  {filename}: {rows}件")
+    print(f"{args.start}～{args.end}の{len(result['year_months'])}か月分の取込が完了しました。（取込: {len(result['loaded'])}件, "
+          f"エラー: {len(result['failed'])}件, ファイルが無いデータソース: {len(result['missing'])}件）")
+    for filename, error in result['failed'].items():
+        print(f"  エラー: {filename}: {error}", file=sys.stderr)
+    for source_key in result['missing']:
+        print(f"  ファイルが無いデータソース: {source_key}", file=sys.stderr)
+    print_rejected(result)
+    return EXIT_FAILED if result['failed'] else EXIT_OK
+
+def command_refresh_summary(args):
+    from monthly_loader import refresh_summaries, get_input_dir_path, configure_logging
+    from summary_utils import get_summary_sources
+
+    configure_logging(args.input_dir or get_input_dir_path(args.year_month), args.log_level)
+
+    refreshed = refresh_summaries(get_summary_sources(args.typed), args.year_month)
+    for tablename, rows in refreshed.items():
+        print(f"  {tablename}: {rows}件")
+    print(f"{args.year_month}の集計テーブルの集計が完了しました。")
+    return EXIT_OK
+
+def command_list_sources(args):
+    from monthly_loader import SOURCE_PATTERNS
+
+    for pattern, source_key in SOURCE_PATTERNS:
+        print(f"{source_key}\t{pattern}")
+    return EXIT_OK
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="月次データソースの取込・リセット")
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help="標準エラー出力に表示するログのレベル（app.logには常にすべて出力）")
+    parser.add_argument('--db-profile', help="接続先のプロファイル（database.pyまたはdatabase.jsonで定義。省略時は環境変数MONTHLY_REPORT_DB_PROFILE）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = subparsers.add_parser('load-month', help="処理年月のデータソースを取り込む")
+    load_parser.add_argument('year_month', type=year_month, help="処理年月（YYYYMM形式）")
+    load_parser.add_argument('--sources', nargs='+', metavar='SOURCE', help="取り込むデータソース名（list-sourcesで確認。省略時はすべて）")
+    load_parser.add_argument('--workers', type=int, default=1, help="並列実行数")
+    load_parser.add_argument('--input-dir', help="入力ディレクトリ（省略時は処理年月のディレクトリ）")
+    load_parser.add_argument('--write-tmp', action='store_true', help="TMPフォルダに「年月」列追加後の.xlsxを出力する")
+    load_parser.add_argument('--full', dest='incremental', action='store_false', help="変更されていないファイルもすべて取り込む")
+    load_parser.add_argument('--typed', action='store_true', help="明細テーブルを型付きテーブルへ取り込む")
+    load_parser.add_argument('--stream', nargs='*', metavar='SOURCE',
+                             help="指定したデータソース（省略時は表形式のすべてのデータソース）の.xlsxファイルと元帳形式のテキストを1行ずつ読み込みながら挿入する（メモリ使用量を抑える）")
+    load_parser.add_argument('--single-transaction', action='store_true', help="1つのコネクション・トランザクションで取り込み、最後に1回だけコミットする（エラーのデータソースのみロールバック）")
+    load_parser.add_argument('--all-or-nothing', action='store_true', help="1つのトランザクションで取り込み、エラーが発生した場合はすべてロールバックする")
+    load_parser.add_argument('--summary', action='store_true', help="データソース・処理段階ごとの処理時間の集計を表示する（load_metrics.jsonlには常に出力）")
+    load_parser.add_argument('--cache-dir', help="読み込んだファイルの変換結果をキャッシュするディレクトリ（省略時はホームディレクトリの.monthly_report_cache）")
+    load_parser.add_argument('--no-cache', action='store_true', help="変換結果のキャッシュを使用しない")
+    load_mode = load_parser.add_mutually_exclusive_group()
+    load_mode.add_argument('--upsert', action='store_true', help="処理年月分を削除せず、主キーが一致するレコードを更新して取り込む")
+    load_mode.add_argument('--swap', action='store_true', help="シャドウテーブルへ取り込んでから処理年月分を一度に入れ替える")
+    load_parser.set_defaults(func=command_load_month)
+
+    reset_parser = subparsers.add_parser('reset-month', help="処理年月のデータを全テーブルから削除する")
+    reset_parser.add_argument('year_month', type=year_month, help="処理年月（YYYYMM形式）")
+    reset_parser.add_argument('--workers', type=int, default=1, help="並列に削除するテーブル数")
+    reset_parser.add_argument('--input-dir', help="取込履歴を削除する入力ディレクトリ（省略時は処理年月のディレクトリ）")
+    reset_parser.add_argument('--typed', action='store_true', help="型付きテーブルも削除する")
+    reset_parser.set_defaults(func=command_reset_month)
+
+    backfill_parser = subparsers.add_parser('backfill', help="1年分の月を持つデータソースから、複数の年月分をまとめて取り込み直す")
+    backfill_parser.add_argument('start', type=year_month, help="開始年月（YYYYMM形式）")
+    backfill_parser.add_argument('end', type=year_month, help="終了年月（YYYYMM形式）")
+    backfill_parser.add_argument('--sources', nargs='+', metavar='SOURCE', help="取り込むデータソース名（SalesBacklog, Staffingtable, ConstructionSuspenseAccounts, CostVarianceAdjustment。省略時はすべて）")
+    backfill_parser.add_argument('--input-dir', help="入力ディレクトリ（省略時は終了年月のディレクトリ）")
+    backfill_parser.set_defaults(func=command_backfill)
+
+    summary_parser = subparsers.add_parser('refresh-summary', help="取込済みの明細テーブルから、処理年月の集計テーブルを集計し直す")
+    summary_parser.add_argument('year_month', type=year_month, help="処理年月（YYYYMM形式）")
+    summary_parser.add_argument('--typed', action='store_true', help="型付きテーブルから集計する")
+    summary_parser.add_argument('--input-dir', help="app.logを出力する入力ディレクトリ（省略時は処理年月のディレクトリ）")
+    summary_parser.set_defaults(func=command_refresh_summary)
+
+    list_parser = subparsers.add_parser('list-sources', help="選択できるデータソース名を表示する")
+    list_parser.set_defaults(func=command_list_sources)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.log_level = getattr(logging, args.log_level)
+    try:
+        if args.db_profile:
+            from database import use_profile
+
+            use_profile(args.db_profile)
+        return args.func(args)
+    except Exception as e:
+        logging.error(f"処理中にエラーが発生しました: {e}")
+        print(f"エラー: {e}", file=sys.stderr)
+        return EXIT_FAILED
+
+if __name__ == "__main__":
+    sys.exit(main())
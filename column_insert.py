@@ -1,16 +1,8 @@
 import os
-import pandas as pd
 import fnmatch
-import chardet
 import logging
-
-def detect_encoding(file_path):
-    """
-    ファイルのエンコーディングを検出するヘルパー関数
-    """
-    with open(file_path, 'rb') as f:
-        result = chardet.detect(f.read(10000))  # 最初の10KBを検査
-    return result['encoding']
+from ledger_parser import read_ledger
+from instrumentation import span
 
 def is_text_file(file_path):
     """
@@ -44,111 +36,111 @@ def get_previous_year_month(processing_year_month):
         month -= 1
     return year * 100 + month
 
-def insert_year_month_column(input_dir_path, output_dir_path, processing_year_month, get_sheet_name_func, exclude_files=('*SBU別売上債権（各種売掛金）*','*原価差額調整計算表 AI.xlsx','人員集計表*','受注売上受注残*','*品目別在庫明細表.xlsx','PJ管理物件勘定内訳表*','*建仮計上額.xls')):
+# 「年月」列を追加しないファイル名のパターン
+DEFAULT_EXCLUDE_FILES = ('*SBU別売上債権（各種売掛金）*','*原価差額調整計算表 AI.xlsx','人員集計表*','受注売上受注残*','*品目別在庫明細表.xlsx','PJ管理物件勘定内訳表*','*建仮計上額.xls')
+
+def get_year_month_to_insert(filename, processing_year_month):
+    """
+    ファイルに埋め込む年月を返すヘルパー関数（品目一覧表とAQZZCO_CTは前月、それ以外は処理年月）。
+    """
+    if fnmatch.fnmatch(filename, '品目一覧表.xls') or fnmatch.fnmatch(filename, '*AQZZCO_CT.xlsx'):
+        return get_previous_year_month(processing_year_month)
+    return processing_year_month
+
+def has_year_month_column(filename, exclude_files=DEFAULT_EXCLUDE_FILES):
+    """
+    取込時に先頭へ「年月」列を追加するファイルかどうかを返すヘルパー関数。
     """
-    Excelファイルまたはテキストファイルの先頭に「年月」列を追加し、TMPフォルダに保存する関数。
+    return not any(fnmatch.fnmatch(filename, pattern) for pattern in exclude_files)
+
+def get_output_filename(filename):
+    """
+    入力ファイル名に対応する変換後のファイル名（拡張子.xlsx）を返すヘルパー関数。
+    """
+    return os.path.splitext(filename)[0] + '.xlsx'
+
+def convert_source_file(input_dir_path, filename, processing_year_month, get_sheet_name_func, exclude_files=DEFAULT_EXCLUDE_FILES, ledger=False):
+    """
+    1つのExcelファイルまたはテキストファイルを読み込み、先頭に「年月」列を追加したDataFrameを返す関数。
+    ファイル単位で完結するため、プロセスプールのワーカーからも呼び出せる。
     Args:
         input_dir_path (str): 入力ディレクトリのパス
-        output_dir_path (str): 出力ディレクトリのパス
+        filename (str): 入力ファイル名
         processing_year_month (int): 処理年月（YYYYMM形式）
         get_sheet_name_func (function): ファイル名に基づいてシート名を取得する関数
         exclude_files (tuple): 「年月」列を追加しないファイル名のリスト
+        ledger (bool): 元帳形式のデータソース（タイトルやページ見出しを含むテキスト）かどうか
+    Returns:
+        DataFrame: 変換後のデータ
+    """
+    # ファイルパスの生成
+    file_path = os.path.join(input_dir_path, filename)
+    with span('read', filename, bytes=os.path.getsize(file_path)) as read_span:
+        df = _read_source_file(file_path, filename, processing_year_month, get_sheet_name_func, exclude_files, ledger)
+        read_span['rows'] = len(df)
+    return df
+
+def _read_source_file(file_path, filename, processing_year_month, get_sheet_name_func, exclude_files, ledger=False):
     """
-    
-    logging.info(f"ディレクトリ {input_dir_path} 内のExcelファイル変換処理を開始します。")
+    convert_source_fileの読み込みと「年月」列の追加を行うヘルパー関数。
+    """
+    # pandasの読み込みには時間がかかるため、ファイルを変換する時に読み込む
+    import pandas as pd
+
+    logging.info(f"ファイル {filename} の処理を開始します。")
+    sheet_name = get_sheet_name_func(filename)  # ファイル名に基づくシート名取得
+
+    # ファイル名に基づいて、前月を埋め込むか現月を埋め込むかを決定
+    year_month_to_insert = get_year_month_to_insert(filename, processing_year_month)
+
+    # テキストファイルかどうかを判定
+    if is_text_file(file_path) and filename.lower().endswith('.xls'):
+
+        if ledger:
+            # タイトルやページ見出しを含む元帳形式は、見出し行を除きながら1回の読み込みで変換する
+            logging.info(f"{filename} を元帳形式のテキストとして読み込みます。")
+            df = read_ledger(file_path)
+        else:
+            # エンコーディングを'cp932'で固定
+            encoding = 'cp932'
+            logging.info(f"エンコーディングを固定します。 {filename}: cp932")
+
+            # テキストファイルの場合はread_csvで読み込む
+            try:
+                df = pd.read_csv(file_path, sep='\t', encoding=encoding)  # セパレータを適宜設定
+            except (UnicodeDecodeError, ValueError):
+                logging.warning(f"{file_path} の処理中にエラーが発生。元帳形式として再試行。")
+                try:
+                    df = read_ledger(file_path)
+                except Exception as e:
+                    logging.error(f"{file_path} の読み込みに最終的に失敗しました: {e}")
+                    raise
+
+        logging.info(f"{file_path} のデータ処理が完了しました。")
 
+    else:
+        # Excelファイルの場合はread_excelで読み込む
+        sheet_name = get_sheet_name_func(filename)  # ファイル名に基づくシート名取得
+        if sheet_name:
+            df = pd.read_excel(file_path, sheet_name=sheet_name)
+        else:
+            df = pd.read_excel(file_path)
+        
+    # 除外ファイルのチェック
+    if has_year_month_column(filename, exclude_files):
+        # 除外ファイルでない場合は「年月」列を追加
+        df.insert(0, '年月', year_month_to_insert)
+
+    return df
+
+def write_tmp_file(output_dir_path, output_filename, df):
+    """
+    監査用に変換後のデータをTMPフォルダへ.xlsx形式で保存する関数。
+    """
     # TMPフォルダが存在しない場合は作成
     if not os.path.exists(output_dir_path):
-        os.makedirs(output_dir_path)
+        os.makedirs(output_dir_path, exist_ok=True)
         logging.info(f"出力ディレクトリ {output_dir_path} を作成しました。")
 
-    # フォルダ内のすべてのExcelファイルまたはテキストファイルを処理
-    for filename in os.listdir(input_dir_path):
-        # 対応する拡張子のチェック
-        if filename.lower().endswith(('.xlsx', '.xls')):
-            # ファイルパスの生成
-            file_path = os.path.join(input_dir_path, filename)
-            logging.info(f"ファイル {filename} の処理を開始します。")
-            sheet_name = get_sheet_name_func(filename)  # ファイル名に基づくシート名取得
-
-            # ファイル名に基づいて、前月を埋め込むか現月を埋め込むかを決定
-            if fnmatch.fnmatch(filename, '品目一覧表.xls') or fnmatch.fnmatch(filename, '*AQZZCO_CT.xlsx'):
-                year_month_to_insert = get_previous_year_month(processing_year_month)
-            else:
-                year_month_to_insert = processing_year_month
-
-            # テキストファイルかどうかを判定
-            if is_text_file(file_path) and filename.lower().endswith('.xls'):
-                
-                # エンコーディングを自動検出
-                #encoding = detect_encoding(file_path)
-                # エンコーディングを'cp932'で固定
-                encoding = 'cp932'
-                logging.info(f"エンコーディングを固定します。 {filename}: cp932")
-                
-                # テキストファイルの場合はread_csvで読み込む
-                try:
-                    df = pd.read_csv(file_path, sep='\t', encoding=encoding)  # セパレータを適宜設定
-                except (UnicodeDecodeError, ValueError):
-                    logging.warning(f"{file_path} の処理中にエラーが発生。エンコーディング変更して再試行。")
-
-                    # エンコーディングを自動検出
-                    detected_encoding = detect_encoding(file_path)
-                    logging.info(f"{file_path} の検出エンコーディング: {detected_encoding}")
-
-                    # ファイルを1行ずつ読み込み、データ行を判定して抽出
-                    try:
-                        valid_rows = []  # データ部分のみ格納するリスト
-
-                        with open(file_path, 'r', encoding=detected_encoding) as f:
-                            for line in f:
-                                # 空白のみの行はスキップ
-                                if line.strip() == "":
-                                    continue
-
-                                # ヘッダー行のパターン（タイトルやページ情報を除外）
-                                if "ナブテスコ株式会社" in line or "Japan 元帳" in line or "ページ" in line:
-                                    continue
-                                if "会社コード" in line and "事業領域" in line and "金額" in line:
-                                    continue
-                                if "C 会社 事業 テキスト" in line:
-                                    continue
-                                if "＜" in line and "＞" in line:  # 「＜資産の部＞」などのタイトル行を除外
-                                    continue
-
-                                # 有効なデータ行を追加
-                                valid_rows.append(line)
-
-                        # 抽出したデータをDataFrameに変換（タブ区切りのみ適用）
-                        df = pd.DataFrame([row.strip().split('\t') for row in valid_rows])
-
-                        # 空の列を削除
-                        df.dropna(axis=1, how='all', inplace=True)
-
-                        logging.info(f"{file_path} のデータ処理が完了しました。")
-
-                    except Exception as e:
-                        logging.error(f"{file_path} の読み込みに最終的に失敗しました: {e}")
-                        raise
-                    
-            else:
-                # Excelファイルの場合はread_excelで読み込む
-                sheet_name = get_sheet_name_func(filename)  # ファイル名に基づくシート名取得
-                if sheet_name:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
-                else:
-                    df = pd.read_excel(file_path)
-                
-            # 除外ファイルのチェック
-            if not any(fnmatch.fnmatch(filename, pattern) for pattern in exclude_files):
-                # 除外ファイルでない場合は「年月」列を追加
-                df.insert(0, '年月', year_month_to_insert)
-
-            # ファイル名を拡張子を含まずに取得し、.xlsxに変更
-            output_filename = os.path.splitext(filename)[0] + '.xlsx'
-            output_file_path = os.path.join(output_dir_path, output_filename)
-
-            # 処理後のファイルをTMPフォルダに.xlsx形式で保存
-            df.to_excel(output_file_path, index=False)
-
-    logging.info(f"処理が完了しました。")
+    output_file_path = os.path.join(output_dir_path, output_filename)
+    df.to_excel(output_file_path, index=False)
\ No newline at end of file
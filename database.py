@@ -1,32 +1,183 @@
 from sqlalchemy import create_engine
-from sqlalchemy.engine import URL
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import json
+import logging
+import os
+import threading
 
-connection_url = URL.create(
-    "mssql+pyodbc",
-    username="sa",
-    password="Tan1gut19",
-    host="TKPC2933\\SQLEXPRESS",
-    #host="K-DP2404\\SQLEXPRESS",
-    port="1433",
-    database="MonthlyReport",
-    query={
-        "driver": "ODBC Driver 17 for SQL Server",
-        "autocommit": "True",
-        "LongAsMax": "Yes",
+# 使用する接続先のプロファイル名を指定する環境変数（省略時は設定ファイルのdefault_profile、それも無ければproduction）
+PROFILE_ENV = "MONTHLY_REPORT_DB_PROFILE"
+# 接続先の設定ファイル（JSON）のパスを指定する環境変数（省略時はこのファイルと同じフォルダのdatabase.json）
+CONFIG_ENV = "MONTHLY_REPORT_DB_CONFIG"
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.json")
+DEFAULT_PROFILE = "production"
+
+# 接続先のプロファイル（設定ファイルのprofilesに同じ名前のプロファイルがあれば、その値で上書きする）
+PROFILES = {
+    "production": {
+        "drivername": "mssql+pyodbc",
+        "username": "sa",
+        "password": "Tan1gut19",
+        "host": "TKPC2933\\SQLEXPRESS",
+        #"host": "K-DP2404\\SQLEXPRESS",
+        "port": 1433,
+        "database": "MonthlyReport",
+        "query": {
+            "driver": "ODBC Driver 17 for SQL Server",
+            "autocommit": "True",
+            "LongAsMax": "Yes",
+        },
+        "connect_args": {"TrustServerCertificate": "yes"},
+        "echo": False,  # ログ出力を抑える
+        "pool_pre_ping": True,
+        "pool_size": 10,  # 最大接続数
+        "max_overflow": 20,  # ピーク時の最大増加接続数
+        "pool_recycle": 3600,  # 1時間ごとに接続をリサイクル
+        "pool_timeout": 30,  # 接続取得のタイムアウトを30秒
+        "fast_executemany": False,  # Trueの場合はすべてのexecutemanyでpyodbcのfast_executemanyを使用する
+    },
+    # SQL Serverに接続できない環境での確認用（テーブルは初回の接続時に作成する）
+    "sqlite": {
+        "url": "sqlite:///monthly_report.db",
+        "create_tables": True,
+    },
+    # テスト・ベンチマーク用のメモリ上のデータベース（すべてのセッションで1つのコネクションを共有する）
+    "memory": {
+        "url": "sqlite://",
+        "create_tables": True,
     },
-)
-engine = create_engine(
-    connection_url,
-    echo=False,  # ログ出力を抑える
-    connect_args={"TrustServerCertificate": "yes"},
-    pool_pre_ping=True,
-    pool_size=10,  # 最大接続数
-    max_overflow=20,  # ピーク時の最大増加接続数
-    pool_recycle=3600,  # 1時間ごとに接続をリサイクル
-    pool_timeout=30,  # 接続取得のタイムアウトを30秒
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-Base = declarative_base()
\ No newline at end of file
+}
+
+# create_engineへそのまま渡すプロファイルの項目
+ENGINE_OPTIONS = ("echo", "pool_pre_ping", "pool_size", "max_overflow", "pool_recycle", "pool_timeout", "connect_args")
+
+Base = declarative_base()
+
+_engines = {}
+_engine_lock = threading.Lock()
+_selected_profile = None
+
+def load_profiles(config_path=None):
+    """
+    既定のプロファイルに、設定ファイル（{"default_profile": ..., "profiles": {名前: {項目: 値}}}）の値を重ねて返す。
+    設定ファイルが無い場合は既定のプロファイルをそのまま返す。
+    Returns:
+        Tuple[dict, str]: (プロファイル名をキーとする辞書, 設定ファイルのdefault_profile（無い場合はNone）)
+    """
+    profiles = {name: dict(profile) for name, profile in PROFILES.items()}
+    config_path = config_path or os.environ.get(CONFIG_ENV) or DEFAULT_CONFIG_PATH
+    if not os.path.exists(config_path):
+        return profiles, None
+    with open(config_path, encoding="utf-8") as f:
+        config = json.load(f)
+    for name, values in config.get("profiles", {}).items():
+        profiles.setdefault(name, {}).update(values)
+    return profiles, config.get("default_profile")
+
+def get_profile_name():
+    """
+    使用するプロファイル名を返す（use_profile、環境変数、設定ファイルのdefault_profile、productionの順に優先する）。
+    """
+    if _selected_profile:
+        return _selected_profile
+    return os.environ.get(PROFILE_ENV) or load_profiles()[1] or DEFAULT_PROFILE
+
+def get_profile(name=None):
+    """
+    プロファイルの設定を返す。
+    """
+    name = name or get_profile_name()
+    profiles, _ = load_profiles()
+    if name not in profiles:
+        raise ValueError(f"接続先のプロファイルが定義されていません: {name}（定義済み: {', '.join(sorted(profiles))}）")
+    return profiles[name]
+
+def get_url(profile):
+    """
+    プロファイルの接続URLを返す。urlが無い場合は、drivername・host などの項目から作成する。
+    """
+    if profile.get("url"):
+        return make_url(profile["url"])
+    return URL.create(
+        profile["drivername"],
+        username=profile.get("username"),
+        password=profile.get("password"),
+        host=profile.get("host"),
+        port=profile.get("port"),
+        database=profile.get("database"),
+        query=profile.get("query", {}),
+    )
+
+def build_engine(profile):
+    """
+    プロファイルの設定からエンジンを作成する。
+    SQLiteのメモリ上のデータベースは、スレッド間で同じデータベースを参照するよう1つのコネクションを共有する。
+    """
+    url = get_url(profile)
+    options = {key: profile[key] for key in ENGINE_OPTIONS if key in profile}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False, **options.get("connect_args", {})}
+        if url.database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+            for key in ("pool_size", "max_overflow", "pool_recycle", "pool_timeout"):
+                options.pop(key, None)
+    if profile.get("fast_executemany") and url.get_driver_name() == "pyodbc":
+        options["fast_executemany"] = True
+
+    engine = create_engine(url, **options)
+    if profile.get("create_tables"):
+        import models  # モデルを定義してからテーブルを作成する
+
+        Base.metadata.create_all(engine)
+    return engine
+
+def get_engine(profile_name=None):
+    """
+    プロファイルのエンジンを返す。エンジンは最初に使用した時点で作成し、以降は同じものを使用する。
+    """
+    profile_name = profile_name or get_profile_name()
+    with _engine_lock:
+        if profile_name not in _engines:
+            _engines[profile_name] = build_engine(get_profile(profile_name))
+            logging.info(f"接続先のプロファイル {profile_name} のエンジンを作成しました。")
+        return _engines[profile_name]
+
+def use_profile(profile_name):
+    """
+    このプロセスで使用するプロファイルを切り替える（SessionLocalは次に生成するセッションから切り替えたエンジンを使用する）。
+    """
+    global _selected_profile
+    get_profile(profile_name)
+    _selected_profile = profile_name
+    SessionLocal.configure(bind=None)
+
+def dispose_engines():
+    """
+    作成済みのエンジンのコネクションプールをすべて閉じる。
+    """
+    with _engine_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+    SessionLocal.configure(bind=None)
+
+class LazySessionmaker(sessionmaker):
+    """
+    最初にセッションを生成する時点で、選択されたプロファイルのエンジンにバインドするsessionmaker。
+    モジュールの読み込みだけではODBCドライバの読み込みやデータベースへの接続を行わない。
+    """
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+
+def __getattr__(name):
+    # 従来の database.engine は、参照した時点で選択されたプロファイルのエンジンを作成して返す
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
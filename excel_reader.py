@@ -0,0 +1,339 @@
+import logging
+import re
+import unicodedata
+import openpyxl
+import xlrd
+
+# 読み込みバックエンド名
+BACKEND_STREAMING = 'streaming'  # read_onlyモードで1行ずつ読み込む（大きな明細表向け）
+BACKEND_XLRD = 'xlrd'            # 旧形式(.xls)用
+
+class SheetCell:
+    """
+    セル値をopenpyxlのセルと同じく .value で参照するためのクラス。
+    """
+    def __init__(self, value):
+        self.value = value
+
+class StreamingSheet:
+    """
+    openpyxlのread_onlyモードで開いたワークシートのラッパー。
+    行単位の逐次読み込みのみをサポートし、メモリ使用量はファイルサイズに依存しない。
+    """
+    def __init__(self, workbook, worksheet):
+        self.workbook = workbook
+        self.worksheet = worksheet
+        self._max_column = None
+
+    @property
+    def max_column(self):
+        if self._max_column is None:
+            self._max_column = self.worksheet.max_column
+            if self._max_column is None:
+                # dimension情報が無いファイルは全行を走査して列数を求める
+                self._max_column = max((len(row) for row in self.worksheet.iter_rows(values_only=True)), default=0)
+        return self._max_column
+
+    def iter_rows(self, min_row=1, values_only=True):
+        return self.worksheet.iter_rows(min_row=min_row, values_only=values_only)
+
+    def close(self):
+        self.workbook.close()
+
+class XlrdSheet:
+    """
+    xlrdで開いた旧形式(.xls)ワークシートのラッパー。
+    """
+    def __init__(self, workbook, worksheet):
+        self.workbook = workbook
+        self.worksheet = worksheet
+
+    @property
+    def max_column(self):
+        return self.worksheet.ncols
+
+    def iter_rows(self, min_row=1, values_only=True):
+        for row_index in range(min_row - 1, self.worksheet.nrows):
+            values = tuple(self.worksheet.row_values(row_index))
+            yield values if values_only else tuple(SheetCell(value) for value in values)
+
+    def cell(self, row, column):
+        if row > self.worksheet.nrows or column > self.worksheet.ncols:
+            return SheetCell(None)
+        return SheetCell(self.worksheet.cell_value(row - 1, column - 1))
+
+    def __getitem__(self, coordinate):
+        column_letter, row = openpyxl.utils.cell.coordinate_from_string(coordinate)
+        return self.cell(row, openpyxl.utils.cell.column_index_from_string(column_letter))
+
+    def close(self):
+        self.workbook.release_resources()
+
+def _excel_number(value):
+    """
+    to_excelで書き出してopenpyxlで読み込み直した場合と同じ値を返すヘルパー関数。
+    整数値の小数は、指数表記で書き出される大きさ（1e16以上）でなければintとして読み込まれる。
+    """
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+        return int(value)
+    return value
+
+class FrameSheet:
+    """
+    メモリ上のDataFrameを、to_excel(index=False)で書き出したワークシートと同じ座標で参照するためのラッパー。
+    1行目が列名、2行目以降がデータ行となり、欠損値はNoneとして返す。
+    日時の列は、openpyxlで読み込んだ場合と同じくdatetime.datetimeとして返す。
+    整数値の小数（欠損値を含む整数の列はpandasでfloat64になる）は、openpyxlで読み込んだ場合と同じくintとして返す。
+    変換後のDataFrame（frame）は、表形式の抽出で列単位にまとめて参照するために公開する。
+    """
+    def __init__(self, frame):
+        values = frame.astype(object).where(frame.notna(), None)
+        for position, dtype in enumerate(frame.dtypes):
+            if dtype.kind == 'M':
+                values.iloc[:, position] = [value.to_pydatetime() if value is not None else None for value in values.iloc[:, position]]
+            elif dtype.kind == 'f' or dtype == object:
+                values.iloc[:, position] = [_excel_number(value) for value in values.iloc[:, position]]
+        self.frame = values
+        self._header = tuple(frame.columns)
+        self._rows = None
+
+    @property
+    def max_column(self):
+        return len(self._header)
+
+    def _data_rows(self):
+        # 行単位の参照が必要になるまでタプルのリストを作らない
+        if self._rows is None:
+            self._rows = list(self.frame.itertuples(index=False, name=None))
+        return self._rows
+
+    def _row_values(self, row):
+        return self._header if row == 1 else self._data_rows()[row - 2]
+
+    def iter_rows(self, min_row=1, values_only=True):
+        for row in range(min_row, len(self.frame) + 2):
+            values = self._row_values(row)
+            yield values if values_only else tuple(SheetCell(value) for value in values)
+
+    def cell(self, row, column):
+        if row > len(self.frame) + 1 or column > len(self._header):
+            return SheetCell(None)
+        return SheetCell(self._row_values(row)[column - 1])
+
+    def __getitem__(self, coordinate):
+        column_letter, row = openpyxl.utils.cell.coordinate_from_string(coordinate)
+        return self.cell(row, openpyxl.utils.cell.column_index_from_string(column_letter))
+
+    def close(self):
+        pass
+
+class YearMonthSheet:
+    """
+    ワークシートを、先頭に「年月」列を追加した場合と同じ座標で行単位に読み込むためのラッパー。
+    1行目（列名の行）の先頭には「年月」、2行目以降の先頭には埋め込む年月を追加する。
+    pandasで読み込んだ場合と同じく、値がすべて空の行（書式だけが残った末尾の行など）は読み飛ばす。
+    空の行を読み飛ばすと以降の行番号が元のワークシートとずれるため、セル単位の参照（cell()）は持たない。
+    """
+    def __init__(self, sheet, year_month):
+        self.sheet = sheet
+        self.year_month = year_month
+
+    @property
+    def max_column(self):
+        return self.sheet.max_column + 1
+
+    def iter_rows(self, min_row=1, values_only=True):
+        for row_index, row in enumerate(self.sheet.iter_rows(min_row=min_row, values_only=values_only), start=min_row):
+            if all((value if values_only else value.value) is None for value in row):
+                continue
+            value = '年月' if row_index == 1 else self.year_month
+            yield ((value if values_only else SheetCell(value)),) + tuple(row)
+
+    def close(self):
+        self.sheet.close()
+
+class SparseSheet:
+    """
+    必要なセルだけを読み込んだワークシートのラッパー。
+    セル単位の参照（cell()、セル番地）のみを持ち、読み込みを宣言していないセルを参照した場合はKeyErrorを送出する。
+    """
+    def __init__(self, values):
+        self._values = values
+
+    @property
+    def max_column(self):
+        return max((column for _, column in self._values), default=0)
+
+    def cell(self, row, column):
+        if (row, column) not in self._values:
+            raise KeyError(f"読み込み対象として宣言されていないセルです: 行{row} 列{column}")
+        return SheetCell(self._values[(row, column)])
+
+    def __getitem__(self, coordinate):
+        column_letter, row = openpyxl.utils.cell.coordinate_from_string(coordinate)
+        return self.cell(row, openpyxl.utils.cell.column_index_from_string(column_letter))
+
+    def close(self):
+        pass
+
+def _read_cells_openpyxl(file_path, sheet_name, cells):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        columns_by_row = {}
+        for row, column in cells:
+            columns_by_row.setdefault(row, []).append(column)
+        min_row, max_row = min(columns_by_row), max(columns_by_row)
+        min_column = min(column for _, column in cells)
+        max_column = max(column for _, column in cells)
+
+        values = {}
+        # 必要な範囲の行だけを読み込み、最後の行を読んだ時点で終了する
+        for row_index, row in enumerate(worksheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_column, max_col=max_column, values_only=True), start=min_row):
+            for column in columns_by_row.get(row_index, ()):
+                if column - min_column < len(row):
+                    values[(row_index, column)] = row[column - min_column]
+        return values
+    finally:
+        workbook.close()
+
+def _read_cells_xlrd(file_path, sheet_name, cells):
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        worksheet = workbook.sheet_by_name(sheet_name) if sheet_name else workbook.sheet_by_index(0)
+        values = {}
+        for row, column in cells:
+            if row <= worksheet.nrows and column <= worksheet.ncols:
+                value = worksheet.cell_value(row - 1, column - 1)
+                values[(row, column)] = None if value == '' else value
+        return values
+    finally:
+        workbook.release_resources()
+
+def read_cells(file_path, cells, sheet_name=None, column_offset=0):
+    """
+    ワークシートから指定したセルの値だけを読み込む。
+    読み込むのは指定したシートのみで、最後に必要な行を読んだ時点で読み込みを終了する。
+
+    Args:
+        file_path (str): Excelファイルのパス
+        cells (Iterable[Tuple[int, int]]): 読み込むセルの (行番号, 列番号) のリスト
+        sheet_name (str): シート名（省略時は先頭のシート）
+        column_offset (int): 取込時に先頭へ追加される列の数（「年月」列を追加するファイルは1）。
+                             cellsは追加後の列番号で指定し、追加される列自体の値はNoneとする
+    Returns:
+        SparseSheet: 指定したセルのみを参照できるワークシート
+    """
+    cells = set(cells)
+    source_cells = {(row, column - column_offset) for row, column in cells if column - column_offset >= 1}
+    source_values = {}
+    if source_cells:
+        read_func = _read_cells_xlrd if file_path.lower().endswith('.xls') else _read_cells_openpyxl
+        source_values = read_func(file_path, sheet_name, source_cells)
+    logging.info(f"ファイル {file_path} から {len(source_cells)} セルを読み込みました。")
+    return SparseSheet({(row, column): source_values.get((row, column - column_offset)) for row, column in cells})
+
+def normalize_label(value):
+    """
+    見出しの表記ゆれを吸収するため、全角英数字・記号を半角に揃え（NFKC正規化）、空白をすべて除去する。
+    文字列以外の値はNoneを返す。
+    """
+    if not isinstance(value, str):
+        return None
+    return re.sub(r'\s+', '', unicodedata.normalize('NFKC', value)) or None
+
+class LabelIndex:
+    """
+    見出し列の値から行を引くための索引。
+    ワークシートを1回だけ走査して作成し、以降の参照では再走査しない。
+    同じ見出しが複数ある場合は最初の行を使用する。
+    """
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __contains__(self, label):
+        return normalize_label(label) in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def find_row(self, label):
+        """
+        見出しに一致する行の行番号を返す（見つからない場合はNone）。
+        """
+        found = self._rows.get(normalize_label(label))
+        return found[0] if found else None
+
+    def value(self, label, column):
+        """
+        見出しに一致する行の指定した列（1始まり）の値を返す（見つからない場合はKeyError）。
+        """
+        found = self._rows.get(normalize_label(label))
+        if found is None:
+            raise KeyError(label)
+        row_values = found[1]
+        return row_values[column - 1] if column <= len(row_values) else None
+
+def build_label_index(sheet, label_column, min_row=1):
+    """
+    ワークシートを1回走査し、見出し列の値（正規化後）から行を引く索引を作成する。
+    Args:
+        sheet: ワークシートのラッパー（iter_rowsを持つもの）
+        label_column (int): 見出し列の列番号（1始まり）
+        min_row (int): 走査を開始する行番号
+    Returns:
+        LabelIndex: 見出しの索引
+    """
+    rows = {}
+    for row_index, row_values in enumerate(sheet.iter_rows(min_row=min_row, values_only=True), start=min_row):
+        if label_column > len(row_values):
+            continue
+        label = normalize_label(row_values[label_column - 1])
+        if label is not None and label not in rows:
+            rows[label] = (row_index, row_values)
+    return LabelIndex(rows)
+
+def open_frame(frame):
+    """
+    「年月」列追加後のDataFrameをワークシートとして開く。
+    Args:
+        frame (DataFrame): convert_source_fileが返したDataFrame
+    Returns:
+        FrameSheet: ワークシートのラッパー
+    """
+    return FrameSheet(frame)
+
+def _open_streaming(file_path, sheet_name):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    worksheet = workbook[sheet_name] if sheet_name else workbook.active
+    return StreamingSheet(workbook, worksheet)
+
+def _open_xlrd(file_path, sheet_name):
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    worksheet = workbook.sheet_by_name(sheet_name) if sheet_name else workbook.sheet_by_index(0)
+    return XlrdSheet(workbook, worksheet)
+
+READER_BACKENDS = {
+    BACKEND_STREAMING: _open_streaming,
+    BACKEND_XLRD: _open_xlrd,
+}
+
+def open_sheet(file_path, backend=BACKEND_STREAMING, sheet_name=None):
+    """
+    指定したバックエンドでワークシートを開く。
+    Args:
+        file_path (str): Excelファイルのパス
+        backend (str): 読み込みバックエンド名（READER_BACKENDSのキー）
+        sheet_name (str): シート名（省略時はアクティブシート）
+    Returns:
+        ワークシートのラッパー（max_column, iter_rows, close を持つ）
+    """
+    if file_path.lower().endswith('.xls'):
+        backend = BACKEND_XLRD  # .xlsはopenpyxlで読めないため常にxlrdを使用
+
+    open_func = READER_BACKENDS.get(backend)
+    if open_func is None:
+        raise ValueError(f"未対応の読み込みバックエンドです: {backend}")
+
+    logging.info(f"ファイル {file_path} を {backend} バックエンドで開きます。")
+    return open_func(file_path, sheet_name)
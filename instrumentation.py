@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# 処理年月のディレクトリに追記する計測結果ファイル（1行1区間のJSON Lines形式）
+METRICS_FILENAME = 'load_metrics.jsonl'
+
+# 計測中の区間（スレッドごとの入れ子）と、計測結果を集める先（実行中の取込処理ごと）
+_local = threading.local()
+_active_metrics = None
+
+class RunMetrics:
+    """
+    1回の取込処理で計測した区間（データソース・処理段階ごとの処理時間、件数など）を集めるクラス。
+    挿入はスレッドプールから並行して行われるため、追加はロックで保護する。
+    """
+    def __init__(self, **fields):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        with self._lock:
+            self.records.extend(records)
+
+    def write_jsonl(self, path):
+        """
+        計測した区間をJSON Lines形式でファイルに追記する。
+        """
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps({'run_id': self.run_id, **self.fields, **record}, ensure_ascii=False, default=str) + '\n')
+
+    def summarize(self):
+        """
+        データソース・処理段階ごとに処理時間、件数、読み込んだバイト数、コミット時間を合計する。
+        Returns:
+            List[dict]: 集計結果（処理時間の長い順）
+        """
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            key = (record.get('source') or '-', record['stage'])
+            total = totals.setdefault(key, {'source': key[0], 'stage': key[1], 'count': 0, 'seconds': 0.0,
+                                            'rows': 0, 'bytes': 0, 'commit_seconds': 0.0, 'errors': 0})
+            total['count'] += 1
+            total['seconds'] += record['seconds']
+            total['rows'] += record.get('rows') or 0
+            total['bytes'] += record.get('bytes') or 0
+            total['commit_seconds'] += record.get('commit_seconds') or 0.0
+            total['errors'] += 1 if record.get('error') else 0
+        for total in totals.values():
+            total['rows_per_sec'] = total['rows'] / total['seconds'] if total['seconds'] > 0 else 0
+        return sorted(totals.values(), key=lambda total: total['seconds'], reverse=True)
+
+    def format_summary(self):
+        """
+        集計結果を表形式の文字列で返す。
+        """
+        header = f"{'データソース':<36}{'処理段階':<10}{'秒':>9}{'件数':>10}{'件/秒':>11}{'MB':>9}{'コミット秒':>11}"
+        lines = [header, '-' * len(header)]
+        for total in self.summarize():
+            lines.append(
+                f"{total['source']:<36}{total['stage']:<10}{total['seconds']:>9.3f}{total['rows']:>10}"
+                f"{total['rows_per_sec']:>11.0f}{total['bytes'] / 1024 ** 2:>9.2f}{total['commit_seconds']:>11.3f}"
+                + (f"  エラー: {total['errors']}件" if total['errors'] else "")
+            )
+        return '\n'.join(lines)
+
+@contextmanager
+def collect(metrics=None):
+    """
+    ブロック内で計測した区間をmetricsに集める（省略時は新しいRunMetricsを作成する）。
+    """
+    global _active_metrics
+    metrics = metrics if metrics is not None else RunMetrics()
+    previous, _active_metrics = _active_metrics, metrics
+    try:
+        yield metrics
+    finally:
+        _active_metrics = previous
+
+def _span_stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+@contextmanager
+def span(stage, source=None, **fields):
+    """
+    処理段階の区間を計測する。ブロック内で返されたdictに件数（rows）やバイト数（bytes）を設定できる。
+    計測結果を集める先が無い場合（collectの外）は記録しない。
+
+    Args:
+        stage (str): 処理段階（read, extract, convert, insert など）
+        source (str): データソース（ファイル名）
+        fields: 区間に記録する追加の値
+    """
+    record = {'stage': stage, 'source': source, 'started_at': datetime.now().isoformat(timespec='milliseconds'), **fields}
+    stack = _span_stack()
+    stack.append(record)
+    start_time = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        record['seconds'] = time.perf_counter() - start_time
+        if record.get('rows') is not None and record['seconds'] > 0:
+            record['rows_per_sec'] = record['rows'] / record['seconds']
+        if _active_metrics is not None:
+            _active_metrics.add(record)
+
+def annotate(**fields):
+    """
+    計測中の最も内側の区間に値を追加する（区間の外では何もしない）。
+    """
+    stack = _span_stack()
+    if stack:
+        stack[-1].update(fields)
+
+def current_source():
+    """
+    計測中の区間のデータソース（ファイル名）を、最も内側の区間から順に探して返す（区間の外ではNone）。
+    """
+    for record in reversed(_span_stack()):
+        if record.get('source'):
+            return record['source']
+    return None
+
+def call_with_spans(func, *args, **kwargs):
+    """
+    プロセスプールのワーカーで関数を実行し、戻り値とワーカー内で計測した区間を返す。
+    Returns:
+        tuple: (戻り値, 区間のリスト)
+    """
+    with collect() as metrics:
+        result = func(*args, **kwargs)
+    return result, metrics.records
+
+def write_metrics(input_dir_path, metrics):
+    """
+    計測結果を処理年月のディレクトリのload_metrics.jsonlへ追記し、集計結果をログに出力する。
+    """
+    try:
+        metrics.write_jsonl(os.path.join(input_dir_path, METRICS_FILENAME))
+    except OSError as e:
+        logging.warning(f"計測結果を保存できませんでした: {e}")
+    logging.info(f"処理段階ごとの処理時間（run_id: {metrics.run_id}）\n{metrics.format_summary()}")
@@ -0,0 +1,137 @@
+import logging
+import re
+
+# SAPの元帳出力（拡張子.xlsのタブ区切りテキスト）のエンコーディング
+LEDGER_ENCODING = 'cp932'
+# cp932で読めない行を読み直すエンコーディング
+FALLBACK_ENCODINGS = ('utf-8',)
+
+DEFAULT_CHUNK_SIZE = 50000  # 1チャンクあたりの行数
+
+# データ行ではない行（タイトル、ページ見出し、列見出し、「＜資産の部＞」などの区切り行）
+SKIP_LINE_PATTERN = re.compile('|'.join([
+    'ナブテスコ株式会社',
+    'Japan 元帳',
+    'ページ',
+    '^(?=.*会社コード)(?=.*事業領域)(?=.*金額)',
+    'C 会社 事業 テキスト',
+    '＜.*＞',
+    '＞.*＜',
+]))
+
+class LineDecoder:
+    """
+    1行ずつエンコーディングを切り替えながらデコードするクラス。
+    cp932で読めない行は代替エンコーディング、それでも読めない行はchardetで検出したエンコーディングで読み直す。
+    """
+    def __init__(self, file_path, encodings=(LEDGER_ENCODING,) + FALLBACK_ENCODINGS):
+        self.file_path = file_path
+        self.encodings = list(encodings)
+        self.replaced_lines = 0
+
+    def decode(self, raw):
+        for encoding in self.encodings:
+            try:
+                return raw.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+
+        import chardet
+
+        detected = chardet.detect(raw)['encoding']
+        if detected and detected not in self.encodings:
+            try:
+                line = raw.decode(detected)
+                logging.info(f"{self.file_path} の検出エンコーディング: {detected}")
+                self.encodings.append(detected)
+                return line
+            except (UnicodeDecodeError, LookupError):
+                pass
+
+        # どのエンコーディングでも読めない行は、読めない文字を置き換えて取り込む
+        self.replaced_lines += 1
+        return raw.decode(self.encodings[0], errors='replace')
+
+def is_skip_line(line):
+    """
+    データ行ではない行（空行、見出し行）かどうかを返す。
+    """
+    return not line.strip() or SKIP_LINE_PATTERN.search(line) is not None
+
+def iter_ledger_rows(file_path):
+    """
+    元帳形式のテキストを1行ずつ読み込み、データ行をタブで分割して返すジェネレータ。
+    ファイルは1回だけ読み込み、メモリ使用量はファイルサイズに依存しない。
+    """
+    decoder = LineDecoder(file_path)
+    with open(file_path, 'rb') as f:
+        for raw in f:
+            line = decoder.decode(raw)
+            if is_skip_line(line):
+                continue
+            yield line.strip().split('\t')
+
+    if decoder.replaced_lines:
+        logging.warning(f"{file_path} の {decoder.replaced_lines} 行は文字コードを判定できなかったため、読めない文字を置き換えました。")
+
+def iter_ledger_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    元帳形式のテキストをchunk_size行ずつのDataFrameとして返すジェネレータ。
+    列名は0から始まる列番号とする。
+    """
+    import pandas as pd
+
+    batch = []
+    for row in iter_ledger_rows(file_path):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+def read_ledger(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    元帳形式のテキストを読み込み、データ行のみのDataFrameを返す。
+    行によって列数が異なる場合は不足する列を欠損値とし、すべて欠損値の列は削除する。
+    Args:
+        file_path (str): テキストファイルのパス
+        chunk_size (int): 1チャンクあたりの行数
+    Returns:
+        DataFrame: データ行のDataFrame
+    """
+    import pandas as pd
+
+    # DataFrameを作成するため全行をメモリに展開する（取込ではLedgerSheetで1行ずつ読み込み、TMPフォルダへ出力する場合のみ使用する）
+    chunks = list(iter_ledger_chunks(file_path, chunk_size))
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+    # 空の列を削除
+    df.dropna(axis=1, how='all', inplace=True)
+    return df
+
+class LedgerSheet:
+    """
+    元帳形式のテキストを、read_ledgerのDataFrameをワークシートとして開いた場合と同じ座標で行単位に読み込むラッパー。
+    1行目は列番号の見出し、2行目以降がデータ行となる。ファイルは行単位で読み込むため、メモリ使用量はファイルサイズに依存しない。
+    元帳は列数を先に求められないため、読み込む列数（max_column）は呼び出し側が指定する。
+    ファイルを先頭から読み込むことしかできないため、セル単位の参照（cell()）は持たない。
+    """
+    def __init__(self, file_path, max_column):
+        self.file_path = file_path
+        self.max_column = max_column
+
+    def iter_rows(self, min_row=1, values_only=True):
+        from excel_reader import SheetCell
+
+        if min_row <= 1:
+            header = tuple(range(self.max_column))
+            yield header if values_only else tuple(SheetCell(value) for value in header)
+        for row_index, row in enumerate(iter_ledger_rows(self.file_path), start=2):
+            if row_index >= min_row:
+                yield tuple(row) if values_only else tuple(SheetCell(value) for value in row)
+
+    def close(self):
+        pass
@@ -0,0 +1,112 @@
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+
+# 処理年月のディレクトリに保存する取込履歴ファイル
+MANIFEST_FILENAME = 'load_manifest.json'
+
+def compute_file_hash(file_path, block_size=1024 * 1024):
+    """
+    ファイル内容のSHA-256ハッシュを返す（大きなファイルも一定のメモリで計算する）。
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_file_fingerprint(file_path, with_hash=True):
+    """
+    ファイルのサイズと内容のハッシュを返す。
+    with_hash=Falseの場合はファイルを読まず、ハッシュをNoneとする（次回の差分取込では変更されたものとして扱う）。
+    """
+    return {'size': os.path.getsize(file_path), 'sha256': compute_file_hash(file_path) if with_hash else None}
+
+def get_manifest_path(input_dir_path):
+    return os.path.join(input_dir_path, MANIFEST_FILENAME)
+
+def load_manifest(input_dir_path, processing_year_month):
+    """
+    処理年月の取込履歴を読み込む。存在しない場合や別の年月のものは空の履歴を返す。
+    Returns:
+        dict: {'year_month': 処理年月, 'sources': {ファイル名: 取込履歴}}
+    """
+    manifest_path = get_manifest_path(input_dir_path)
+    empty_manifest = {'year_month': processing_year_month, 'sources': {}}
+    if not os.path.exists(manifest_path):
+        return empty_manifest
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"取込履歴 {manifest_path} を読み込めないため、すべてのファイルを取り込みます: {e}")
+        return empty_manifest
+
+    if manifest.get('year_month') != processing_year_month:
+        return empty_manifest
+    return manifest
+
+def save_manifest(input_dir_path, manifest):
+    """
+    取込履歴を保存する。書き込み途中で中断しても壊れないよう、一時ファイルから置き換える。
+    """
+    manifest_path = get_manifest_path(input_dir_path)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def clear_manifest(input_dir_path):
+    """
+    取込履歴を削除する（リセット後はすべてのファイルを再取込の対象にする）。
+    """
+    manifest_path = get_manifest_path(input_dir_path)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+        logging.info(f"取込履歴 {manifest_path} を削除しました。")
+
+# 取込方法（load_modeのmode）
+MODE_INSERT = 'insert'  # 処理年月分を削除してから挿入（ストリーミング・1トランザクションでの取込を含む）
+MODE_UPSERT = 'upsert'  # 主キーで照合して更新・挿入
+MODE_SWAP = 'swap'      # シャドウテーブルから処理年月分を入れ替え
+
+def get_load_mode(typed=False, upsert=False, swap=False):
+    """
+    取込履歴に記録し、前回の取込と比較する取込方法を返す。
+    型付きテーブルへの取込と元のテーブルへの取込は挿入先が異なるため、別の取込として扱う。
+    """
+    return {'typed': bool(typed), 'mode': MODE_SWAP if swap else MODE_UPSERT if upsert else MODE_INSERT}
+
+def is_unchanged(manifest, filename, fingerprint, load_mode):
+    """
+    前回正常に取り込んだ時点からファイルが変更されておらず、同じ取込方法で取り込んだかどうかを返す。
+    取込方法やハッシュを記録していない取込履歴は、変更されたものとして扱う。
+    """
+    entry = manifest['sources'].get(filename)
+    return (entry is not None and entry['size'] == fingerprint['size'] and entry['sha256'] is not None and entry['sha256'] == fingerprint['sha256']
+            and all(entry.get(key) == value for key, value in load_mode.items()))
+
+def record_load(manifest, filename, fingerprint, source_key, tables, row_count, load_mode):
+    """
+    正常に取り込んだファイルの情報を取込履歴に記録する。
+    Args:
+        manifest (dict): 取込履歴
+        filename (str): 入力ファイル名
+        fingerprint (dict): get_file_fingerprintの戻り値
+        source_key (str): データソース名
+        tables (List[str]): 挿入先テーブル名
+        row_count (int): 挿入件数
+        load_mode (dict): get_load_modeの戻り値
+    """
+    manifest['sources'][filename] = {
+        'size': fingerprint['size'],
+        'sha256': fingerprint['sha256'],
+        'source': source_key,
+        'tables': tables,
+        'row_count': row_count,
+        **load_mode,
+        'loaded_at': datetime.now().isoformat(timespec='seconds'),
+    }
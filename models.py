@@ -1,4 +1,4 @@
-from sqlalchemy import VARCHAR, Integer, Float
+from sqlalchemy import VARCHAR, Integer, Float, Numeric, Date, inspect
 from sqlalchemy.orm import Mapped, mapped_column
 from database import Base
 
@@ -388,3 +388,97 @@ class FinancialOperatingIncome(Base):
 
     年月: Mapped[int] = mapped_column("年月", Integer, primary_key=True, autoincrement=False)
     金額: Mapped[float] = mapped_column("金額", Float(53))
+
+# 集計テーブル（明細テーブルを取込時に処理年月ごとに集計した結果を格納する。BIは明細テーブルの代わりに参照する）
+class CostCenterReportSummary(Base):
+    __tablename__ = "T_CostCenterReportSummary"
+    __table_args__ = {"extend_existing": True}
+
+    年月: Mapped[int] = mapped_column("年月", Integer, primary_key=True, autoincrement=False)
+    得意先グループ: Mapped[str] = mapped_column("得意先グループ", VARCHAR(50), primary_key=True)
+    営業グループ: Mapped[str] = mapped_column("営業グループ", VARCHAR(50), primary_key=True)
+    品目グループ: Mapped[str] = mapped_column("品目グループ", VARCHAR(50), primary_key=True)
+    売上高: Mapped[float] = mapped_column("売上高", Float(53))
+    直接費: Mapped[float] = mapped_column("直接費", Float(53))
+    間接費: Mapped[float] = mapped_column("間接費", Float(53))
+    件数: Mapped[int] = mapped_column("件数", Integer)
+
+class ExpenseActualsSummary(Base):
+    __tablename__ = "T_ExpenseActualsSummary"
+    __table_args__ = {"extend_existing": True}
+
+    年月: Mapped[int] = mapped_column("年月", Integer, primary_key=True, autoincrement=False)
+    原価センタ: Mapped[str] = mapped_column("原価センタ", VARCHAR(50), primary_key=True)
+    原価要素: Mapped[str] = mapped_column("原価要素", VARCHAR(50), primary_key=True)
+    金額: Mapped[float] = mapped_column("金額", Float(53))
+    件数: Mapped[int] = mapped_column("件数", Integer)
+
+# 型付きテーブル（VARCHAR(50)のみで定義された明細テーブルを、数値・日付の列を型付きで格納する）
+AMOUNT = Numeric(19, 4)
+
+def _columns(start, end):
+    return [f"column{i}" for i in range(start, end + 1)]
+
+def make_typed_model(model, column_types):
+    """
+    VARCHARのモデルと同じ列構成で、指定した列だけ型を置き換えたモデル（テーブル名の末尾に_Typed）を生成する。
+    Args:
+        model: 元のモデルクラス
+        column_types (dict): 属性名をキー、SQLAlchemyの型を値とする辞書
+    Returns:
+        型付きのモデルクラス
+    """
+    attributes = {"__tablename__": f"{model.__tablename__}_Typed", "__table_args__": {"extend_existing": True}}
+    for prop in inspect(model).column_attrs:
+        column = prop.columns[0]
+        if prop.key in column_types:
+            attributes[prop.key] = mapped_column(column.name, column_types[prop.key], primary_key=column.primary_key, autoincrement=False)
+        else:
+            attributes[prop.key] = mapped_column(column.name, column.type, primary_key=column.primary_key, autoincrement=column.autoincrement)
+    return type(f"{model.__name__}Typed", (Base,), attributes)
+
+CostCenterReportsTyped = make_typed_model(CostCenterReports, {
+    "column1": Integer,
+    **{key: AMOUNT for key in ["column15", "column16", "column18"] + _columns(39, 109)},
+    **{key: Date for key in _columns(33, 35)},
+})
+
+ActualExpensesTyped = make_typed_model(ActualExpenses, {
+    "column1": Integer,
+    "column7": Date,
+    "column8": AMOUNT,
+    "column10": AMOUNT,
+})
+
+SalesReceivablesTyped = make_typed_model(SalesReceivables, {
+    "column10": Integer,
+    **{key: AMOUNT for key in _columns(11, 14)},
+})
+
+DiscountsTyped = make_typed_model(Discounts, {
+    "column1": Integer,
+    **{key: AMOUNT for key in ["column12", "column14", "column15"]},
+})
+
+PurchasePriceGapTyped = make_typed_model(PurchasePriceGap, {
+    "column1": Integer,
+    **{key: AMOUNT for key in ["column11", "column12", "column14", "column15"]},
+    "column17": Integer,
+    **{key: Date for key in _columns(18, 20)},
+})
+
+ItemListTyped = make_typed_model(ItemList, {
+    "column1": Integer,
+    **{key: AMOUNT for key in _columns(24, 31) + ["column39", "column40", "column86", "column87"]},
+    **{key: Date for key in ["column15", "column17", "column64", "column65", "column70", "column71", "column80"]},
+})
+
+# 元のモデルと型付きモデルの対応
+TYPED_MODELS = {
+    CostCenterReports: CostCenterReportsTyped,
+    ActualExpenses: ActualExpensesTyped,
+    SalesReceivables: SalesReceivablesTyped,
+    Discounts: DiscountsTyped,
+    PurchasePriceGap: PurchasePriceGapTyped,
+    ItemList: ItemListTyped,
+}
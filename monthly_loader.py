@@ -0,0 +1,1200 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from operator import itemgetter
+import fnmatch
+import logging
+import os
+from openpyxl.utils.cell import column_index_from_string
+from sqlalchemy import delete, inspect
+from database import SessionLocal
+from models import PurchaseCostVariance, CostCenterReports, ActualExpenses, SalesReceivables, Discounts, StaffingSummary, SalesBacklog, ConstructionSuspenseAccounts, ItemizedInventoryDetails, DirectExpenses, PurchasePriceGap, ItemList, FinancialCostOfSales, FinancialOperatingIncome
+from models import CostCenterReportsTyped, ActualExpensesTyped, SalesReceivablesTyped, DiscountsTyped, PurchasePriceGapTyped, ItemListTyped, TYPED_MODELS
+from models import CostCenterReportSummary, ExpenseActualsSummary
+from column_insert import convert_source_file, get_output_filename, get_previous_year_month, get_year_month_to_insert, write_tmp_file, has_year_month_column, is_text_file
+from bulk_insert_utils import bulk_insert_stream, bulk_insert_with_chunk, LoadCancelled
+from row_batch import RowBatch, get_table_layout
+from reset_utils import reset_tables, DEFAULT_DELETE_BATCH_SIZE
+from instrumentation import RunMetrics, call_with_spans, collect, span, write_metrics
+from row_validation import Quarantine, collect_rejected, write_quarantine
+from load_manifest import load_manifest, save_manifest, clear_manifest, get_file_fingerprint, get_load_mode, is_unchanged, record_load
+from transaction_utils import begin_transaction, shares_connection
+
+#################初期値指定エリア#####################
+#INPUT_ROOT_DIR = 'C:/Users/1221050/Documents/work/01_業務/BI/Board/総務課/データソース/'
+INPUT_ROOT_DIR = 'W:/WF_07_ｼｽﾃﾑ関係/16_BI/総務課/データソース/'
+#INPUT_ROOT_DIR = 'C:/Users/KYOHEI/Documents/work/データソース/'
+
+# 変換後のファイル名パターンとデータソースの対応（同じパターンに複数ファイルが該当する場合は最初の1つのみ）
+SOURCE_PATTERNS = [
+    ('受注売上受注残*', 'SalesBacklog'),
+    ('売上実績*', 'CostCenterReports'),
+    ('S4データ*', 'ActualExpenses'),
+    ('*SBU別売上債権（各種売掛金）*', 'SalesReceivables'),
+    ('*値引き.xlsx', 'Discounts'),
+    ('人員集計表*', 'Staffingtable'),
+    ('*建仮計上額.xlsx', 'ConstructionSuspenseAccounts'),
+    ('*原価差額調整計算表 AI.xlsx', 'CostVarianceAdjustment'),
+    ('*品目別在庫明細表.xlsx', 'ItemizedInventoryDetails'),
+    ('PJ管理物件勘定内訳表*', 'DirectExpenses'),
+    ('*AQZZCO_CT.xlsx', 'PurchasePriceGap'),
+    ('品目一覧表.xlsx', 'ItemList'),
+    ('財務諸表*', 'FinancialCostOfSales')
+]
+
+# 表形式のデータソースのモデルと開始行・開始列
+TABLE_SOURCES = {
+    'CostCenterReports': (CostCenterReports, {'start_row': 2, 'start_column': 1}),
+    'ActualExpenses': (ActualExpenses, {'start_row': 2, 'start_column': 1}),
+    'SalesReceivables': (SalesReceivables, {'start_row': 2, 'start_column': 1}),
+    'Discounts': (Discounts, {'start_row': 2, 'start_column': 1}),
+    'PurchasePriceGap': (PurchasePriceGap, {'start_row': 2, 'start_column': 1}),
+    'ItemList': (ItemList, {'start_row': 2, 'start_column': 1})
+}
+
+# タイトルやページ見出しを含む元帳形式のテキスト（拡張子.xls）で出力されるデータソース
+LEDGER_SOURCES = ('SalesReceivables',)
+
+# C列（"column3"）がNULLの行を抽出対象外とするモデル
+SKIP_EMPTY_COLUMN3_MODELS = (ActualExpenses, Discounts, SalesReceivables)
+
+# 挿入前に同じ年月のレコードを削除するモデル
+REPLACE_MONTH_MODELS = (FinancialCostOfSales, FinancialOperatingIncome)
+
+def get_input_dir_path(processing_year_month):
+    """
+    処理年月に対応するデータソースのディレクトリを返す
+    """
+    return INPUT_ROOT_DIR + str(processing_year_month)
+
+def configure_logging(input_dir_path, console_level=None):
+    """
+    データソースのディレクトリにある app.log へログを出力するよう設定する
+    console_levelを指定した場合は、そのレベル以上のログを標準エラー出力にも表示する。
+    """
+    logging.basicConfig(
+        filename=input_dir_path + '/app.log',
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='a'
+    )
+    if console_level is not None:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(console_handler)
+
+def make_sheet_name_mapping(processing_year_month):
+    """
+    ファイル名パターンと読み込むシート名の対応を返す
+    """
+    year_month = str(processing_year_month)
+
+    # YYYYMM形式から年と月を取得
+    year = year_month[:4]  # 年の部分を取得
+    month = int(year_month[4:])  # 月の部分を整数で取得
+
+    # 年の後ろ2桁を取得
+    year_last_two_digits = year[2:]
+
+    # 月が7月未満かどうかでDirectExpenses_sheetnameを決定
+    if month < 7:
+        DirectExpenses_sheetname = f'{year_last_two_digits}・6'
+    else:
+        DirectExpenses_sheetname = f'{year_last_two_digits}・12'
+
+    return {
+        '受注売上受注残*': str(year),
+        '*建仮計上額.xls': f'{year}年度実績',
+        '人員集計表*': f'{year_last_two_digits}年度実績',
+        '*品目別在庫明細表.xlsx': '差額有',
+        'PJ管理物件勘定内訳表*': DirectExpenses_sheetname,
+        '*原価差額調整計算表 AI.xlsx': '年度調整版'
+    }
+
+def get_sheet_name(filename, processing_year_month):
+    """ ファイル名に基づいてシート名を返す """
+    for pattern, sheet_name in make_sheet_name_mapping(processing_year_month).items():
+        if fnmatch.fnmatch(filename, pattern):
+            return sheet_name
+    return None  # 指定がない場合
+
+def get_source_keys():
+    """
+    選択できるデータソース名の一覧を返す。
+    """
+    return [source_key for _, source_key in SOURCE_PATTERNS]
+
+def assign_sources(filenames):
+    """
+    入力ファイル名をデータソースに割り当てる。
+    Args:
+        filenames (List[str]): 入力ディレクトリ内のファイル名
+    Returns:
+        tuple: ({入力ファイル名: データソース名}, [対応するデータソースが無いファイル名])
+    """
+    output_filenames = {get_output_filename(filename): filename for filename in filenames}
+    assignments = {}
+    for search_string, source_key in SOURCE_PATTERNS:
+        file_list = fnmatch.filter(output_filenames, search_string)
+        if file_list:
+            assignments[output_filenames[file_list[0]]] = source_key
+            logging.info(f'{source_key} に {file_list[0]} を格納しました。')
+    unknown_files = [filename for filename in filenames if filename not in assignments]
+    return assignments, unknown_files
+
+def _table_filter_index(model, keys):
+    """
+    C列（"column3"）がNULLの行を抽出対象外とするモデルの場合、column3の位置を返すヘルパー関数（対象外のモデルはNone）。
+    ワークシートにC列が無い場合はすべての行が対象外となるため、-1を返す。
+    """
+    if model not in SKIP_EMPTY_COLUMN3_MODELS:
+        return None
+    return keys.index("column3") if "column3" in keys else -1
+
+def iter_table_rows(input_sheet, model, start_row, start_column):
+    """
+    表形式のワークシートから、get_table_layoutの列の並び（column1, column2, ...）の値のタプルを1行ずつ返すジェネレータ
+    """
+    keys, positions = get_table_layout(model, input_sheet.max_column, start_column)
+    filter_index = _table_filter_index(model, keys)
+    if filter_index == -1 or not positions:
+        return
+    pick = itemgetter(*positions) if len(positions) > 1 else (lambda row: (row[positions[0]],))
+    last_position = max(positions)
+
+    # 開始列を考慮してデータを取得
+    for row in input_sheet.iter_rows(min_row=start_row, values_only=True):
+        values = pick(row) if last_position < len(row) else tuple(row[i] if i < len(row) else None for i in positions)
+        # ActualExpenses、Discounts、SalesReceivablesの場合、C列（"column3"）がNULLならスキップ
+        if filter_index is not None and values[filter_index] is None:
+            continue  # このレコードは抽出対象外とする
+        yield values
+
+def extract_table(input_sheet, model, start_row, start_column):
+    """
+    表形式のワークシートから、列番号（column1, column2, ...）の並びと値のタプルのリストを持つRowBatchを作成する。
+    メモリ上のDataFrameから読み込んだワークシートは、C列がNULLの行の除外と列の取り出しを列単位でまとめて行う。
+    """
+    keys, positions = get_table_layout(model, input_sheet.max_column, start_column)
+    frame = getattr(input_sheet, 'frame', None)
+    if frame is None or start_row < 2:
+        return RowBatch(keys, list(iter_table_rows(input_sheet, model, start_row, start_column)))
+
+    # 2行目（データの先頭行）がDataFrameの先頭行に対応する
+    values = frame.iloc[start_row - 2:, list(positions)]
+    filter_index = _table_filter_index(model, keys)
+    if filter_index == -1:
+        values = values.iloc[0:0]
+    elif filter_index is not None:
+        # ActualExpenses、Discounts、SalesReceivablesの場合、C列（"column3"）がNULLの行は抽出対象外とする
+        values = values[values.iloc[:, filter_index].notna().to_numpy()]
+    return RowBatch(keys, list(values.itertuples(index=False, name=None)))
+
+# 『人員集計表』の人員の行（59行目から67行目まで）
+STAFFING_SUMMARY_ROWS = range(59, 68)
+
+def staffing_summary_cells(processing_year_month):
+    return [(row_index, processing_year_month % 100 + 3) for row_index in STAFFING_SUMMARY_ROWS]
+
+def extract_staffing_summary(input_sheet, processing_year_month):
+    """
+    『人員集計表』から処理年月の人員を抽出する
+    """
+    # 処理年月に応じた列インデックスを算出
+    target_column_index = processing_year_month % 100 + 3  # 202405 -> 8, 202406 -> 9, 202407 -> 10
+
+    data_list = []
+    # データ行をループしてリストに追加
+    for row_index in STAFFING_SUMMARY_ROWS:  # 59行目から67行目まで
+        segment = 'D' if row_index <= 61 else ('PD' if row_index <= 64 else 'F')
+        category = '社員' if row_index % 3 == 2 else ('引入外注者' if row_index % 3 == 1 else '有期契約社員')
+        personnel = input_sheet.cell(row=row_index, column=target_column_index).value
+
+        data_list.append({
+            '年月': processing_year_month,
+            'セグメント': segment,
+            '分類': category,
+            '人員': personnel
+        })
+
+    return [(StaffingSummary, data_list)]
+
+# 『受注売上受注残』のセグメントごとの開始行（開始行から受注高・売上高・受注残高の順）
+SALES_BACKLOG_SEGMENTS = ['国内D', '国内K', '国内S', '国内BD', '海外D', '海外K', '海外S', 'PD', 'IP', 'AW']
+SALES_BACKLOG_CATEGORIES = ['受注高', '売上高', '受注残高']
+SALES_BACKLOG_START_ROWS = [6, 9, 12, 15, 21, 24, 27, 36, 39, 42]
+
+def sales_backlog_cells(processing_year_month):
+    return [
+        (start_row + i, processing_year_month % 100 + 4)
+        for start_row in SALES_BACKLOG_START_ROWS for i in range(len(SALES_BACKLOG_CATEGORIES))
+    ]
+
+def extract_sales_backlog(input_sheet, processing_year_month):
+    """
+    『受注売上受注残』から処理年月の受注高・売上高・受注残高を抽出する
+    """
+    # 処理年月に応じた列インデックスを算出 (202405 -> 9, 202406 -> 10, 202407 -> 11)
+    target_column_index = processing_year_month % 100 + 4
+
+    # 特定の行と列からデータを取得し、リストに追加
+    data_list = []
+    for segment, start_row in zip(SALES_BACKLOG_SEGMENTS, SALES_BACKLOG_START_ROWS):
+        for i, category in enumerate(SALES_BACKLOG_CATEGORIES):
+            amount = input_sheet.cell(row=start_row + i, column=target_column_index).value
+
+            data_list.append({
+                '年月': processing_year_month,
+                'セグメント': segment,
+                '科目': category,
+                '金額': amount
+            })
+
+    return [(SalesBacklog, data_list)]
+
+# 「品目別在庫明細表」のセグメントの行と、科目・科目コード・金額区分の列
+ITEMIZED_INVENTORY_SEGMENTS_AND_ROWS = [
+    ('D(N0+N1)', 8), ('D(N2)', 9), ('K', 10), ('S', 11),
+    ('BD', 12), ('PSD', 13), ('F', 14)
+]
+ITEMIZED_INVENTORY_COLUMNS = [
+    ('購入品', '3040', '在庫額', 'B'),
+    ('購入品', '-', '評価減', 'C'),
+    ('購入品', '-', '差額振分け', 'D'),
+    ('購入品', '-', '未着品', 'F'),
+    ('製品', '7920', '在庫額', 'H'),
+    ('製品', '-', '評価減', 'I'),
+    ('製品', '-', '差額振分け', 'J'),
+    ('仕掛', '7900', '在庫額', 'L'),
+    ('仕掛', '4000', '在庫額', 'M'),
+    ('仕掛', '16310', '在庫額', 'N'),
+    ('仕掛', '-', '評価減', 'O'),
+    ('仕掛', '-', '差額振分け', 'Q'),
+]
+
+def itemized_inventory_details_cells(processing_year_month):
+    return [
+        (row_index, column_index_from_string(col))
+        for _, row_index in ITEMIZED_INVENTORY_SEGMENTS_AND_ROWS for _, _, _, col in ITEMIZED_INVENTORY_COLUMNS
+    ]
+
+def extract_itemized_inventory_details(input_sheet, processing_year_month):
+    """
+    必要なデータを抽出して「品目別在庫明細」テーブルの形式にする関数
+    """
+    data_list = []
+
+    logging.info(f"データ抽出を開始します。")
+    for segment, row_index in ITEMIZED_INVENTORY_SEGMENTS_AND_ROWS:
+        for 科目, 科目コード, 金額区分, col in ITEMIZED_INVENTORY_COLUMNS:
+            amount = input_sheet[f"{col}{row_index}"].value
+            data_list.append({
+                '年月': processing_year_month,
+                'セグメント': segment,
+                '科目': 科目,
+                '科目コード': 科目コード,
+                '金額区分': 金額区分,
+                '金額': amount * 1000 if amount else 0
+            })
+    logging.info(f"データ抽出が完了しました。")
+
+    return [(ItemizedInventoryDetails, data_list)]
+
+# 「原価差額調整計算表」の月ごとの列と、購入原価差額科目の行
+COST_VARIANCE_MONTH_COLUMN_MAP = {
+    1: 4,  2: 5,  3: 6,  4: 7,  5: 8,  6: 9,
+    7: 11, 8: 12, 9: 13, 10: 14, 11: 15, 12: 16
+}
+COST_VARIANCE_SUBJECTS = [
+    "材料・購入品在庫_繰越", "材料・購入品在庫_増加", "材料・購入品在庫_減少", "材料・購入品在庫_残高",
+    "購入価格差異_繰越", "購入価格差異_増加", "購入価格差異_仕掛品振替", "購入価格差異_廃却分", "購入価格差異_残高",
+    "製造原価差額_間接費", "製造原価差額_加工費",
+    "調整原差_繰越", "調整原差_間接費差異", "調整原差_購入価額差異", "調整原差_標準原価評価替差額", "調整原差_その他原価差額",
+    "仕掛品在庫_繰越", "仕掛品在庫_増加", "仕掛品在庫_他勘定", "仕掛品在庫_製品振替", "仕掛品在庫_残高",
+    "製品在庫_繰越", "製品在庫_増加", "製品在庫_他勘定", "製品在庫_売上原価振替", "製品在庫_残高",
+    "原価差額負担額"
+]
+COST_VARIANCE_ROWS = [5, 6, 7, 8, 13, 14, 15, 16, 17, 22, 23,
+                      29, 30, 31, 32, 33, 40, 41, 42, 43, 44,
+                      49, 50, 51, 52, 53, 65]
+
+def cost_variance_adjustment_cells(processing_year_month):
+    target_column_index = COST_VARIANCE_MONTH_COLUMN_MAP.get(processing_year_month % 100)
+    if target_column_index is None:
+        return []
+    return [(row_index, target_column_index) for row_index in COST_VARIANCE_ROWS]
+
+def extract_cost_variance_adjustment(input_sheet, processing_year_month):
+    """
+    「原価差額調整計算表」のワークシートからデータを抽出する関数
+    """
+    processing_month = processing_year_month % 100
+    target_column_index = COST_VARIANCE_MONTH_COLUMN_MAP.get(processing_month)
+
+    if target_column_index is None:
+        logging.error(f"無効な月です: {processing_month}")
+        return []
+
+    data_list = []
+    for subject, row_index in zip(COST_VARIANCE_SUBJECTS, COST_VARIANCE_ROWS):
+        amount = input_sheet.cell(row=row_index, column=target_column_index).value
+
+        data_list.append({
+            '年月': processing_year_month,
+            'セグメント': 'ALL',
+            '購入原価差額科目': subject,
+            '金額': amount if amount is not None else 0
+        })
+
+    logging.info(f"データ抽出が完了しました。")
+
+    return [(PurchaseCostVariance, data_list)]
+
+# 「建仮計上額」のセグメントの行（2行目から4行目まで）
+CONSTRUCTION_SUSPENSE_ROWS = range(2, 5)
+
+def construction_suspense_accounts_cells(processing_year_month):
+    return [(row_index, processing_year_month % 100 + 1) for row_index in CONSTRUCTION_SUSPENSE_ROWS]
+
+def extract_construction_suspense_accounts(input_sheet, processing_year_month):
+    """
+    「建仮計上額」のワークシート（「YYYY年度実績」シート）からデータを抽出する関数
+    """
+    target_column_index = processing_year_month % 100 + 1
+
+    logging.info(f"データ抽出を開始します。")
+    data_list = []
+    for row_index in CONSTRUCTION_SUSPENSE_ROWS:  # 2行目から4行目まで
+        segment = 'D' if row_index == 2 else ('PD' if row_index == 3 else 'F')
+        amount = input_sheet.cell(row=row_index, column=target_column_index).value
+
+        data_list.append({
+            '年月': processing_year_month,
+            'セグメント': segment,
+            '金額': amount if amount is not None else 0
+        })
+    logging.info(f"データ抽出が完了しました。")
+
+    return [(ConstructionSuspenseAccounts, data_list)]
+
+# 「PJ管理物件勘定内訳表」の月ごとの行（AA列）
+DIRECT_EXPENSES_ROW_MAP = {
+    1: 346, 2: 349, 3: 352, 4: 355, 5: 358, 6: 361,
+    7: 346, 8: 349, 9: 352, 10: 355, 11: 358, 12: 361
+}
+
+def direct_expenses_cells(processing_year_month):
+    row_index = DIRECT_EXPENSES_ROW_MAP.get(processing_year_month % 100)
+    return [(row_index, column_index_from_string('AA'))] if row_index else []
+
+def extract_direct_expenses(input_sheet, processing_year_month):
+    """
+    「PJ管理物件勘定内訳表」のワークシートから指定されたデータを抽出する関数
+    """
+    month = processing_year_month % 100
+    row_index = DIRECT_EXPENSES_ROW_MAP.get(month)
+    if not row_index:
+        logging.error(f"無効な年月: {processing_year_month}")
+        return []
+
+    amount = input_sheet[f"AA{row_index}"].value
+    if amount is None:
+        logging.error(f"行 {row_index} でデータが見つかりません")
+        return []
+
+    data_list = [{
+        '年月': processing_year_month,
+        'SBU': 'PD',
+        '金額': amount
+    }]
+
+    return [(DirectExpenses, data_list)]
+
+# 「財務諸表」から取り込む科目（B列の見出し）と取込先のモデル
+# 見出しは空白・全角半角の違いを無視して照合する
+FINANCIAL_STATEMENT_ITEMS = [
+    ("売上原価  合計", FinancialCostOfSales),
+    ("営業利益", FinancialOperatingIncome),
+]
+FINANCIAL_STATEMENT_LABEL_COLUMN = 2   # B列
+FINANCIAL_STATEMENT_AMOUNT_COLUMN = 8  # H列
+
+def extract_financial_statements(input_sheet, processing_year_month):
+    """
+    「財務諸表」のワークシートから指定されたデータ（年月, 金額）を抽出する関数
+    ワークシートは1回だけ走査し、B列の見出しの索引から各科目の行を参照する。
+    """
+    from excel_reader import build_label_index
+
+    label_index = build_label_index(input_sheet, FINANCIAL_STATEMENT_LABEL_COLUMN)
+    extracted = []
+
+    for target_string, model in FINANCIAL_STATEMENT_ITEMS:
+        if target_string not in label_index:
+            logging.error(f"Excelファイル内に B列が '{target_string}' の行が見つかりません。")
+            continue
+
+        amount = label_index.value(target_string, FINANCIAL_STATEMENT_AMOUNT_COLUMN)  # H列（8列目）
+        if amount is None:
+            logging.error(f"{target_string} の H列 に金額がありません。")
+            continue
+
+        if isinstance(amount, str):
+            try:
+                amount = float(amount.replace(",", "").strip())
+            except ValueError:
+                logging.error(f"{target_string} の金額変換に失敗しました: {amount}")
+                continue
+
+        elif not isinstance(amount, (int, float)):
+            logging.error(f"{target_string} の金額が不正な形式です: {amount}")
+            continue
+
+        extracted.append((model, [{
+            '年月': processing_year_month,
+            '金額': amount
+        }]))
+
+    return extracted
+
+# 固定レイアウトのデータソースと抽出関数の対応
+SOURCE_EXTRACTORS = {
+    'Staffingtable': extract_staffing_summary,
+    'SalesBacklog': extract_sales_backlog,
+    'ConstructionSuspenseAccounts': extract_construction_suspense_accounts,
+    'CostVarianceAdjustment': extract_cost_variance_adjustment,
+    'ItemizedInventoryDetails': extract_itemized_inventory_details,
+    'DirectExpenses': extract_direct_expenses,
+    'FinancialCostOfSales': extract_financial_statements
+}
+
+# 必要なセルだけを読み込む固定レイアウトのデータソースと、読み込むセル（「年月」列追加後の行・列番号）の対応
+SOURCE_CELLS = {
+    'Staffingtable': staffing_summary_cells,
+    'SalesBacklog': sales_backlog_cells,
+    'ConstructionSuspenseAccounts': construction_suspense_accounts_cells,
+    'CostVarianceAdjustment': cost_variance_adjustment_cells,
+    'ItemizedInventoryDetails': itemized_inventory_details_cells,
+    'DirectExpenses': direct_expenses_cells,
+}
+
+def extract_source(source_key, input_sheet, processing_year_month):
+    """
+    データソースの種類に応じてワークシートからデータを抽出する。
+    Returns:
+        List[tuple]: (モデル, 辞書形式データのリストまたはRowBatch) のリスト
+    """
+    if source_key in TABLE_SOURCES:
+        model, start_config = TABLE_SOURCES[source_key]
+        return [(model, extract_table(input_sheet, model, start_config['start_row'], start_config['start_column']))]
+    return SOURCE_EXTRACTORS[source_key](input_sheet, processing_year_month)
+
+def convert_to_typed(extracted):
+    """
+    VARCHARのみの明細テーブルのデータを型付きテーブル用に変換する。
+    変換できなかった値はNULLとし、列ごとにログへ出力する。
+    """
+    from type_conversion import convert_rows, log_conversion_errors
+
+    converted = []
+    for model, data_list in extracted:
+        typed_model = TYPED_MODELS.get(model)
+        if typed_model is None:
+            converted.append((model, data_list))
+            continue
+        rows, errors = convert_rows(typed_model, data_list)
+        log_conversion_errors(typed_model, errors)
+        converted.append((typed_model, rows))
+    return converted
+
+def parse_source(input_dir_path, filename, source_key, processing_year_month, output_dir_path=None, write_tmp=False, typed=False, cache_dir=None, content_hash=None):
+    """
+    1つの入力ファイルを読み込み、「年月」列の追加とデータ抽出までを行う（データベースには接続しない）。
+    プロセスプールのワーカーで実行できるよう、引数と戻り値はすべてpickle可能な値とする。
+    typed=Trueの場合は、明細テーブルのデータを型変換して型付きテーブルへ格納する。
+    cache_dirを指定した場合は、「年月」列追加後のDataFrameをファイル内容のハッシュをキーにキャッシュし、
+    同じ内容のファイルは読み込み直さない。
+    元帳形式のテキストは、DataFrameに変換せず1行ずつ読み込みながら抽出する（write_tmp=Trueの場合を除き、キャッシュもしない）。
+    Returns:
+        List[tuple]: (モデル, 辞書形式データのリストまたはRowBatch) のリスト
+    """
+    from excel_reader import open_frame, read_cells
+
+    file_path = os.path.join(input_dir_path, filename)
+    if source_key in SOURCE_CELLS and not write_tmp and not is_text_file(file_path):
+        # 固定レイアウトの帳票は、DataFrameに変換せず必要なセルだけを読み込む
+        logging.info(f"ファイル {filename} の処理を開始します。")
+        with span('read_cells', filename, bytes=os.path.getsize(file_path)):
+            input_sheet = read_cells(
+                file_path, SOURCE_CELLS[source_key](processing_year_month),
+                sheet_name=get_sheet_name(filename, processing_year_month),
+                column_offset=1 if has_year_month_column(filename) else 0,
+            )
+    elif source_key in LEDGER_SOURCES and not write_tmp and is_text_file(file_path):
+        # 見出し行を除いた元帳の行を、DataFrameに展開せずそのまま抽出する（抽出したデータ以外の行のリストを作らない）
+        logging.info(f"{filename} を元帳形式のテキストとして読み込みます。")
+        input_sheet = open_ledger_sheet(file_path, filename, source_key, processing_year_month)
+    else:
+        convert = partial(convert_source_file, input_dir_path, filename, processing_year_month, partial(get_sheet_name, processing_year_month=processing_year_month),
+                          ledger=source_key in LEDGER_SOURCES)
+        if cache_dir:
+            from parse_cache import get_or_convert
+
+            df = get_or_convert(cache_dir, file_path, get_sheet_name(filename, processing_year_month), processing_year_month, convert, content_hash)
+        else:
+            df = convert()
+        if write_tmp:
+            write_tmp_file(output_dir_path, get_output_filename(filename), df)
+        input_sheet = open_frame(df)
+
+    with span('extract', filename) as extract_span:
+        extracted = extract_source(source_key, input_sheet, processing_year_month)
+        extract_span['rows'] = sum(len(data_list) for _, data_list in extracted)
+    if not typed:
+        return extracted
+    with span('typed', filename, rows=extract_span['rows']):
+        return convert_to_typed(extracted)
+
+def can_stream_source(input_dir_path, filename, source_key):
+    """
+    ファイルをDataFrameに展開せず、行単位で読み込みながら挿入できるかどうかを返す。
+    対象は表形式のデータソースの.xlsxファイル（openpyxlのread_onlyモードで読み込めるもの）と、元帳形式のテキストのみ。
+    """
+    if source_key not in TABLE_SOURCES:
+        return False
+    if is_text_file(os.path.join(input_dir_path, filename)):
+        return source_key in LEDGER_SOURCES
+    return filename.lower().endswith('.xlsx')
+
+def _model_column_count(model, start_column):
+    """
+    モデルのすべての属性（column1, column2, ...）を含むワークシートの列数を返すヘルパー関数。
+    """
+    numbers = [int(key[len('column'):]) for key in inspect(model).column_attrs.keys() if key.startswith('column') and key[len('column'):].isdigit()]
+    return max(numbers) + start_column - 1
+
+def open_ledger_sheet(file_path, filename, source_key, processing_year_month):
+    """
+    元帳形式のテキストを、「年月」列を追加したDataFrame（convert_source_file）と同じ座標で行単位に読み込むワークシートとして開く。
+    """
+    from excel_reader import YearMonthSheet
+    from ledger_parser import LedgerSheet
+
+    model, start_config = TABLE_SOURCES[source_key]
+    # 元帳は列数を先に求められないため、モデルのすべての列を読み込み範囲とする
+    sheet = LedgerSheet(file_path, _model_column_count(model, start_config['start_column']))
+    if has_year_month_column(filename):
+        sheet = YearMonthSheet(sheet, get_year_month_to_insert(filename, processing_year_month))
+    return sheet
+
+def stream_table_source(input_dir_path, filename, source_key, processing_year_month, session_factory=SessionLocal, cancel_event=None, progress_callback=None, replace_month=False):
+    """
+    表形式のデータソースを1行ずつ読み込み、チャンクごとにデータベースへ挿入する。
+    ワークシート全体をDataFrameや行のリストに展開しないため、メモリ使用量はチャンクサイズに比例する。
+    元帳形式のテキストは、見出し行を除きながら1行ずつ読み込む（ファイルに無い列はNoneとして挿入する）。
+    セルの値はブックに保存されている値をそのまま使用する（pandasの列単位の型推定を行わないため、
+    「0000000117」のような文字列のコードは先頭の0が残り、整数の金額は小数点なしで格納される）。
+    replace_month=Trueの場合は、同じトランザクション内で処理年月分の既存レコードを削除してから挿入する。
+    Returns:
+        List[tuple]: (モデル, 挿入した件数) のリスト
+    """
+    from excel_reader import BACKEND_STREAMING, YearMonthSheet, open_sheet
+
+    model, start_config = TABLE_SOURCES[source_key]
+    file_path = os.path.join(input_dir_path, filename)
+    if source_key in LEDGER_SOURCES and is_text_file(file_path):
+        input_sheet = open_ledger_sheet(file_path, filename, source_key, processing_year_month)
+    else:
+        input_sheet = open_sheet(file_path, BACKEND_STREAMING, get_sheet_name(filename, processing_year_month))
+        if has_year_month_column(filename):
+            input_sheet = YearMonthSheet(input_sheet, get_year_month_to_insert(filename, processing_year_month))
+
+    db = session_factory()
+    try:
+        with span('stream', filename, table=model.__tablename__):
+            # 接続URLでautocommitを有効にしている場合も、既存レコードの削除から挿入までを1つのトランザクションにする
+            begin_transaction(db)
+            if replace_month:
+                deleted = db.execute(delete(model).where(get_month_filter(model, processing_year_month))).rowcount
+                logging.info(f"{model.__tablename__}の{processing_year_month}の既存レコード {deleted} 件を削除しました。")
+            keys, _ = get_table_layout(model, input_sheet.max_column, start_config['start_column'])
+            rows = iter_table_rows(input_sheet, model, start_config['start_row'], start_config['start_column'])
+            inserted = bulk_insert_stream(db, model, rows, chunk_size=1000, cancel_event=cancel_event, progress_callback=progress_callback, keys=keys)
+        return [(model, inserted)]
+    finally:
+        db.close()
+        input_sheet.close()
+
+def get_month_target(model, processing_year_month):
+    """
+    モデルの年月カラムと、処理年月分として扱う値を返す（前月を格納するテーブルはリセットと同じく前月）。
+    """
+    for table, year_month_column, target_year_month in get_reset_targets(processing_year_month, typed=True):
+        if table is model:
+            return year_month_column, target_year_month
+    raise ValueError(f"年月カラムが定義されていないモデルです: {model.__tablename__}")
+
+def get_month_filter(model, processing_year_month):
+    """
+    モデルの処理年月分のレコードを絞り込む条件を返す。
+    """
+    year_month_column, target_year_month = get_month_target(model, processing_year_month)
+    return year_month_column == target_year_month
+
+def swap_extracted(extracted, processing_year_month, session_factory=SessionLocal, cancel_event=None, progress_callback=None, source=None):
+    """
+    抽出済みのデータをシャドウテーブルへ挿入した後、1つのトランザクションで処理年月分を入れ替える。
+    取込中も元のテーブルの処理年月分はそのまま参照でき、途中で失敗した場合も元のデータが残る。
+    Returns:
+        List[Tuple]: (モデル, 入れ替えた件数) のリスト
+    """
+    from swap_utils import load_into_shadow, swap_months
+
+    targets = []
+    for model, data_list in extracted:
+        year_month_column, target_year_month = get_month_target(model, processing_year_month)
+        db = session_factory()
+        try:
+            with span('insert', source, table=model.__tablename__, rows=len(data_list)):
+                load_into_shadow(db, model, data_list, year_month_column.property.columns[0].name, target_year_month,
+                                 chunk_size=1000, cancel_event=cancel_event, progress_callback=progress_callback)
+        finally:
+            db.close()
+        targets.append((model, year_month_column.property.columns[0].name, target_year_month))
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise LoadCancelled(f"処理年月 {processing_year_month} の入れ替えはキャンセルされました。")
+    db = session_factory()
+    try:
+        with span('swap', source, tables=len(targets)) as swap_span:
+            swapped = swap_months(db, targets)
+            swap_span['rows'] = sum(swapped.values())
+    finally:
+        db.close()
+    return [(model, swapped[model.__tablename__]) for model, _, _ in targets]
+
+def insert_extracted(extracted, processing_year_month, session_factory=SessionLocal, cancel_event=None, progress_callback=None, replace_month=False, upsert=False, source=None):
+    """
+    抽出済みのデータをモデルごとにデータベースへ挿入する。
+    スレッドプールから呼び出されるため、挿入ごとにコネクションプールからセッションを取得する。
+    replace_month=Trueの場合は、同じトランザクション内で処理年月分の既存レコードを削除してから挿入する。
+    upsert=Trueの場合は、ステージングテーブル経由で主キーが一致するレコードを更新し、それ以外を挿入する（削除はしない）。
+    照合できる主キーが無いモデル（T_ExpenseActuals）は、処理年月分を削除してから挿入する。
+    Returns:
+        List[Tuple]: (モデル, 挿入した件数) のリスト（upsert=Trueの場合は反映した件数）
+    """
+    from upsert_utils import supports_upsert, upsert_with_staging
+
+    counts = []
+    for model, data_list in extracted:
+        db = session_factory()
+        try:
+            with span('insert', source, table=model.__tablename__, rows=len(data_list)):
+                # 接続URLでautocommitを有効にしている場合も、既存レコードの削除から挿入までを1つのトランザクションにする
+                begin_transaction(db)
+                if upsert and supports_upsert(model):
+                    counts.append((model, upsert_with_staging(db, model, data_list, chunk_size=1000, cancel_event=cancel_event, progress_callback=progress_callback)))
+                    continue
+                if upsert or replace_month or model in REPLACE_MONTH_MODELS:
+                    # すでに存在するレコードがある場合は delete してから insert
+                    deleted = db.execute(delete(model).where(get_month_filter(model, processing_year_month))).rowcount
+                    logging.info(f"{model.__tablename__}の{processing_year_month}の既存レコード {deleted} 件を削除しました。")
+                counts.append((model, bulk_insert_with_chunk(db, model, data_list, chunk_size=1000, cancel_event=cancel_event, progress_callback=progress_callback)))
+        finally:
+            db.close()
+    return counts
+
+def refresh_summaries(models, processing_year_month, session_factory=SessionLocal, source=None):
+    """
+    取り込んだ明細テーブルに集計テーブルがある場合は、集計テーブルの処理年月分を明細テーブルから集計し直す。
+    挿入方法（upsert・シャドウテーブルからの入れ替え・ストリーミング）によらず、取込後の明細テーブルを集計する。
+    Returns:
+        dict: 集計テーブル名をキー、集計した件数を値とする辞書
+    """
+    from summary_utils import get_summary_model, refresh_summary
+
+    refreshed = {}
+    for model in models:
+        summary_model = get_summary_model(model)
+        if summary_model is None:
+            continue
+        year_month_column, target_year_month = get_month_target(model, processing_year_month)
+        db = session_factory()
+        try:
+            with span('summary', source, table=summary_model.__tablename__) as summary_span:
+                refreshed[summary_model.__tablename__] = summary_span['rows'] = refresh_summary(db, model, year_month_column, target_year_month)
+        finally:
+            db.close()
+    return refreshed
+
+def _init_worker(input_dir_path):
+    """
+    プロセスプールのワーカーでもapp.logへログを出力する
+    """
+    configure_logging(input_dir_path)
+
+def load_year_month(processing_year_month, input_dir_path=None, workers=1, write_tmp=False, progress_callback=None, session_factory=SessionLocal, cancel_event=None, chunk_callback=None, incremental=False, typed=False, sources=None, upsert=False, swap=False, cache_dir=None, stream=False, single_transaction=False, savepoint_per_source=True):
+    """
+    処理年月のデータソースをすべて読み込み、データベースへ挿入する。
+
+    workers=1の場合はファイルを1つずつ順番に処理する。
+    workers>1の場合は、ファイルの読み込み・抽出をプロセスプールで並列実行し、
+    抽出が終わったものから順にスレッドプール（コネクションプールのセッション）で並行して挿入する。
+    1つのデータソースで発生したエラーは他のデータソースの処理に影響しない。
+    cancel_eventがセットされると、挿入中のデータはチャンクの区切りでロールバックし、残りのファイルは処理しない。
+
+    正常に取り込んだファイルは取込履歴（load_manifest.json）に記録する。
+    incremental=Trueの場合は、前回の取込から内容が変わっておらず、同じ取込方法（型付きテーブルかどうか、upsert・swap）で取り込んだファイルをスキップし、
+    変更されたファイルは対象テーブルの処理年月分を削除してから取り込み直す。
+    sourcesを指定した場合は、指定したデータソースのファイルのみを読み込み、
+    対象テーブルの処理年月分を置き換える（取込履歴に関係なく取り込み直す）。
+
+    single_transaction=Trueの場合は、コネクションを1つだけ使用し、すべてのデータソースを1つのトランザクションで挿入して最後に1回だけコミットする
+    （読み込みは並列に行い、挿入は1つずつ順番に行う）。キャンセルされた場合はすべてロールバックする。
+    savepoint_per_source=Trueの場合は、エラーが発生したデータソースだけをセーブポイントまでロールバックして残りを取り込み、
+    Falseの場合は、最初のエラーで処理を中断してすべてロールバックする（処理年月分が中途半端に取り込まれた状態を残さない）。
+    取込履歴は、コミットした後にまとめて保存する。
+
+    主キーの重複・NULLの行、文字列が列の長さを超える行、データベースのエラーで挿入できなかった行は、
+    ファイル全体をエラーにせずにその行だけを取込から除外し、処理年月のディレクトリのload_quarantine.jsonlへ出力する。
+    集計テーブルがある明細テーブル（T_CostCenterReport、T_ExpenseActuals）は、取り込んだ後に集計テーブルの処理年月分を集計し直す。
+
+    Args:
+        processing_year_month (int): 処理年月（YYYYMM形式）
+        input_dir_path (str): 入力ディレクトリのパス（省略時はINPUT_ROOT_DIR配下）
+        workers (int): 並列実行数
+        write_tmp (bool): 監査用にTMPフォルダへ.xlsxを出力するかどうか
+        progress_callback (function): 1ファイル完了ごとに (完了数, 総数) で呼び出される関数
+        session_factory: セッションを生成する関数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        chunk_callback (function): 1チャンク挿入ごとに (ファイル名, 挿入済み件数, 総件数) で呼び出される関数
+        incremental (bool): 変更されたファイルのみを取り込むかどうか
+        typed (bool): 明細テーブルを型付きテーブル（_Typed）へ格納するかどうか
+        sources (List[str]): 取り込むデータソース名（get_source_keysの値。省略時はすべて）
+        upsert (bool): 処理年月分を削除せず、主キーで照合して更新・挿入するかどうか
+        swap (bool): シャドウテーブルへ取り込んでから、処理年月分を1つのトランザクションで入れ替えるかどうか
+        cache_dir (str): 読み込んだファイルの変換結果をキャッシュするディレクトリ（省略時はキャッシュしない）
+        stream (bool | Iterable[str]): 表形式の.xlsxファイルと元帳形式のテキストを1行ずつ読み込みながら挿入するデータソース
+                       （Trueの場合は表形式のすべてのデータソース。typed・upsert・swap・write_tmpを指定しない場合のみ。キャッシュは使用しない）
+                       pandasで読み込む場合と異なり、数字だけの文字列のセル（先頭が0の伝票番号など）は文字列のまま格納する
+        single_transaction (bool): すべてのデータソースを1つのコネクション・トランザクションで取り込むかどうか
+        savepoint_per_source (bool): single_transaction=Trueの場合に、データソースごとにセーブポイントを作成するかどうか
+    Returns:
+        dict: {'loaded': [成功したファイル名], 'skipped': [変更が無いためスキップしたファイル名], 'failed': {ファイル名: エラー},
+               'unknown': [対応するデータソースが無いファイル名], 'cancelled': キャンセルされたかどうか,
+               'rolled_back': [挿入後にトランザクション全体のロールバックで取り消されたファイル名],
+               'rejected': {ファイル名: 取込から除外した行数}}
+    """
+    if upsert and swap:
+        raise ValueError("upsertとswapは同時に指定できません。")
+    stream_sources = set(TABLE_SOURCES) if stream is True else set(stream or ())
+    if stream_sources - set(TABLE_SOURCES):
+        raise ValueError(f"1行ずつ読み込めないデータソースです: {', '.join(sorted(stream_sources - set(TABLE_SOURCES)))}")
+    input_dir_path = input_dir_path or get_input_dir_path(processing_year_month)
+    output_dir_path = os.path.join(input_dir_path, 'TMP')
+
+    filenames = [filename for filename in os.listdir(input_dir_path) if filename.lower().endswith(('.xlsx', '.xls'))]
+    assignments, unknown_files = assign_sources(filenames)
+    if sources is not None:
+        invalid_sources = set(sources) - set(get_source_keys())
+        if invalid_sources:
+            raise ValueError(f"未対応のデータソースです: {', '.join(sorted(invalid_sources))}")
+        # 指定したデータソースのファイルのみを対象にする
+        assignments = {filename: source_key for filename, source_key in assignments.items() if source_key in sources}
+        unknown_files = []
+        for source_key in set(sources) - set(assignments.values()):
+            logging.warning(f"{source_key} に対応するファイルが {input_dir_path} にありません。")
+    for filename in unknown_files:
+        logging.error(f"対応するモデルが見つかりません：{filename}")
+
+    # 処理段階ごとの処理時間・件数を計測し、終了時にload_metrics.jsonlへ追記する
+    metrics = RunMetrics(year_month=processing_year_month)
+    quarantine = Quarantine(run_id=metrics.run_id, year_month=processing_year_month)
+    result = {'loaded': [], 'skipped': [], 'failed': {}, 'unknown': unknown_files, 'cancelled': False, 'rolled_back': [], 'rejected': {}, 'metrics': metrics}
+    total_files = len(assignments) + len(unknown_files)
+    completed = len(unknown_files)
+    replace_month = incremental or sources is not None
+    # 1つのトランザクションでセーブポイントを使わない場合は、最初のエラーで中断する
+    abort_on_failure = single_transaction and not savepoint_per_source
+
+    # 取込履歴と比較して、取り込むファイルを決定する
+    manifest = load_manifest(input_dir_path, processing_year_month)
+    load_mode = get_load_mode(typed, upsert, swap)
+    compare_manifest = incremental and sources is None
+    # ファイル内容のハッシュは、取込履歴との比較か読み込み結果のキャッシュで使う場合にだけ計算する（ファイル全体を読むため）
+    with_hash = compare_manifest or bool(cache_dir)
+    fingerprints = {}
+    for filename in list(assignments):
+        fingerprints[filename] = get_file_fingerprint(os.path.join(input_dir_path, filename), with_hash)
+        if compare_manifest and is_unchanged(manifest, filename, fingerprints[filename], load_mode):
+            logging.info(f"{filename} は前回の取込から変更されていないためスキップします。")
+            result['skipped'].append(filename)
+            del assignments[filename]
+            completed += 1
+
+    def report_progress():
+        if progress_callback:
+            progress_callback(completed, total_files)
+
+    def is_cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def insert_file(filename, extracted, load_session_factory):
+        """
+        Returns:
+            List[Tuple]: (モデル, 挿入した件数) のリスト（取込から除外した行を含まない）
+        """
+        file_chunk_callback = partial(chunk_callback, filename) if chunk_callback else None
+        if swap:
+            counts = swap_extracted(extracted, processing_year_month, load_session_factory, cancel_event, file_chunk_callback, source=filename)
+        else:
+            counts = insert_extracted(extracted, processing_year_month, load_session_factory, cancel_event, file_chunk_callback, replace_month=replace_month, upsert=upsert, source=filename)
+        refresh_summaries([model for model, _ in extracted], processing_year_month, load_session_factory, source=filename)
+        return counts
+
+    def record_counts(filename, counts):
+        result['loaded'].append(filename)
+        tables = [model.__tablename__ for model, _ in counts]
+        row_count = sum(count for _, count in counts)
+        record_load(manifest, filename, fingerprints[filename], assignments[filename], tables, row_count, load_mode)
+        if not single_transaction:
+            save_manifest(input_dir_path, manifest)
+
+    def should_stream(filename, source_key):
+        return source_key in stream_sources and not (typed or upsert or swap or write_tmp) and can_stream_source(input_dir_path, filename, source_key)
+
+    def stream_file(filename, source_key, load_session_factory):
+        """
+        Returns:
+            List[Tuple]: (モデル, 挿入した件数) のリスト（取込から除外した行を含まない）
+        """
+        file_chunk_callback = partial(chunk_callback, filename) if chunk_callback else None
+        counts = stream_table_source(input_dir_path, filename, source_key, processing_year_month, load_session_factory, cancel_event,
+                                     file_chunk_callback, replace_month=replace_month)
+        refresh_summaries([model for model, _ in counts], processing_year_month, load_session_factory, source=filename)
+        return counts
+
+    def run_files(load_session_factory):
+        nonlocal completed
+        if workers <= 1:
+            for filename, source_key in assignments.items():
+                if is_cancelled():
+                    result['cancelled'] = True
+                    break
+                try:
+                    if should_stream(filename, source_key):
+                        record_counts(filename, stream_file(filename, source_key, load_session_factory))
+                    else:
+                        extracted = parse_source(input_dir_path, filename, source_key, processing_year_month, output_dir_path, write_tmp, typed,
+                                                 cache_dir=cache_dir, content_hash=fingerprints[filename]['sha256'])
+                        record_counts(filename, insert_file(filename, extracted, load_session_factory))
+                except LoadCancelled:
+                    result['cancelled'] = True
+                    break
+                except Exception as e:
+                    logging.error(f"{filename}の処理中にエラーが発生しました：{e}")
+                    result['failed'][filename] = e
+                    if abort_on_failure:
+                        raise
+                completed += 1
+                report_progress()
+            return
+
+        parse_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(input_dir_path,))
+        # 1つのトランザクションで取り込む場合や、1つのコネクションを共有するデータベース（メモリ上のSQLite）では、
+        # 同時に複数のトランザクションを実行できないため、挿入を1つずつ順番に行う（読み込みは並列に行う）
+        load_pool = ThreadPoolExecutor(max_workers=1 if single_transaction or shares_connection(load_session_factory) else workers)
+        load_futures = {}
+        try:
+            # 1行ずつ読み込むファイルは、プロセスプールで読み込まずに挿入のスレッドで読み込みながら挿入する
+            for filename, source_key in assignments.items():
+                if should_stream(filename, source_key):
+                    load_futures[load_pool.submit(stream_file, filename, source_key, load_session_factory)] = filename
+            parse_futures = {
+                parse_pool.submit(call_with_spans, parse_source, input_dir_path, filename, source_key, processing_year_month, output_dir_path, write_tmp, typed,
+                                  cache_dir=cache_dir, content_hash=fingerprints[filename]['sha256']): filename
+                for filename, source_key in assignments.items() if not should_stream(filename, source_key)
+            }
+            pending = set(parse_futures) | set(load_futures)
+
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if is_cancelled() and not result['cancelled']:
+                    # 読み込み中のファイルは待たずに破棄し、挿入中のデータはチャンクの区切りで中断させる
+                    result['cancelled'] = True
+                    pending = {future for future in pending if future in load_futures}
+                    parse_pool.shutdown(wait=False, cancel_futures=True)
+
+                for future in done:
+                    if future in parse_futures:
+                        if result['cancelled']:
+                            continue
+                        filename = parse_futures[future]
+                        try:
+                            extracted, records = future.result()
+                            metrics.extend(records)
+                        except Exception as e:
+                            logging.error(f"{filename}の読み込み中にエラーが発生しました：{e}")
+                            result['failed'][filename] = e
+                            if abort_on_failure:
+                                raise
+                            completed += 1
+                            report_progress()
+                            continue
+                        load_future = load_pool.submit(insert_file, filename, extracted, load_session_factory)
+                        load_futures[load_future] = filename
+                        pending.add(load_future)
+                    else:
+                        filename = load_futures[future]
+                        try:
+                            record_counts(filename, future.result())
+                        except LoadCancelled:
+                            continue
+                        except Exception as e:
+                            logging.error(f"{filename}のデータ挿入中にエラーが発生しました：{e}")
+                            result['failed'][filename] = e
+                            if abort_on_failure:
+                                raise
+                        completed += 1
+                        report_progress()
+        finally:
+            aborted = result['cancelled'] or (abort_on_failure and bool(result['failed']))
+            if aborted:
+                # 中断する場合は、挿入待ちのデータを共有のコネクションへ挿入させない
+                for future in load_futures:
+                    future.cancel()
+            parse_pool.shutdown(wait=not aborted, cancel_futures=True)
+            load_pool.shutdown(wait=True)
+
+    def run_in_transaction():
+        from transaction_utils import LoadRolledBack, run_transaction
+
+        try:
+            with run_transaction(session_factory, savepoint_per_source) as run_session_factory:
+                run_files(run_session_factory)
+                if result['cancelled']:
+                    raise LoadCancelled(f"処理年月 {processing_year_month} の取込はキャンセルされました。")
+        except Exception as e:
+            # 挿入済みのファイルも取り消されたため、取込履歴には記録しない
+            result['rolled_back'], result['loaded'] = result['loaded'], []
+            if isinstance(e, LoadCancelled):
+                result['cancelled'] = True
+                return
+            for filename in result['rolled_back']:
+                result['failed'][filename] = LoadRolledBack(f"他のデータソースのエラーによりロールバックしました：{e}")
+            if not result['failed']:
+                raise
+            return
+        save_manifest(input_dir_path, manifest)
+
+    report_progress()
+    try:
+        with collect(metrics), collect_rejected(quarantine), span('total', workers=workers, typed=typed) as total:
+            if single_transaction:
+                run_in_transaction()
+            else:
+                run_files(session_factory)
+            total['rows'] = sum(record.get('rows') or 0 for record in metrics.records if record['stage'] == 'insert')
+    finally:
+        write_metrics(input_dir_path, metrics)
+        write_quarantine(input_dir_path, quarantine)
+        result['rejected'] = quarantine.count_by_source()
+
+    if result['cancelled']:
+        logging.warning(f"処理がキャンセルされました。（完了: {len(result['loaded'])}ファイル）")
+    return result
+
+# 1年分の月を列（原価差額調整計算表は月ごとの列の対応）で持ち、1つのブックから複数の年月を抽出できるデータソース
+BACKFILL_SOURCES = ('SalesBacklog', 'Staffingtable', 'ConstructionSuspenseAccounts', 'CostVarianceAdjustment')
+
+def iter_year_months(start_year_month, end_year_month):
+    """
+    開始年月から終了年月まで（両端を含む）の年月（YYYYMM形式）を順に返すジェネレータ
+    """
+    year, month = divmod(start_year_month, 100)
+    while year * 100 + month <= end_year_month:
+        yield year * 100 + month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def extract_year_months(input_dir_path, filename, source_key, year_months):
+    """
+    1つのブックから複数の年月分のデータを抽出する。
+    読み込むシートが同じ年月（同じ年のシートなど）は、すべての年月の列のセルをまとめて1回だけ読み込む。
+    Returns:
+        List[tuple]: (モデル, 全年月分の辞書形式データのリスト) のリスト
+    """
+    from excel_reader import read_cells
+
+    file_path = os.path.join(input_dir_path, filename)
+    months_by_sheet = {}
+    for year_month in year_months:
+        months_by_sheet.setdefault(get_sheet_name(filename, year_month), []).append(year_month)
+
+    merged = {}
+    for sheet_name, months in months_by_sheet.items():
+        with span('read_cells', filename, bytes=os.path.getsize(file_path), months=len(months)):
+            input_sheet = read_cells(
+                file_path, [cell for year_month in months for cell in SOURCE_CELLS[source_key](year_month)],
+                sheet_name=sheet_name, column_offset=1 if has_year_month_column(filename) else 0,
+            )
+        with span('extract', filename) as extract_span:
+            for year_month in months:
+                for model, data_list in extract_source(source_key, input_sheet, year_month):
+                    merged.setdefault(model, []).extend(data_list)
+            extract_span['rows'] = sum(len(data_list) for data_list in merged.values())
+    return list(merged.items())
+
+def replace_year_months(extracted, year_months, session_factory=SessionLocal, cancel_event=None, progress_callback=None, source=None):
+    """
+    抽出済みのデータをモデルごとに、対象の年月分をすべて削除してからまとめて挿入する（削除と挿入は同じトランザクション）。
+    """
+    for model, data_list in extracted:
+        year_month_column = get_month_target(model, year_months[0])[0]
+        targets = [get_month_target(model, year_month)[1] for year_month in year_months]
+        db = session_factory()
+        try:
+            with span('insert', source, table=model.__tablename__, rows=len(data_list)):
+                begin_transaction(db)
+                deleted = db.execute(delete(model).where(year_month_column.in_(targets))).rowcount
+                logging.info(f"{model.__tablename__}の{year_months[0]}～{year_months[-1]}の既存レコード {deleted} 件を削除しました。")
+                bulk_insert_with_chunk(db, model, data_list, chunk_size=1000, cancel_event=cancel_event, progress_callback=progress_callback)
+        finally:
+            db.close()
+
+def backfill_year_months(start_year_month, end_year_month, input_dir_path=None, sources=None, session_factory=SessionLocal, cancel_event=None, progress_callback=None):
+    """
+    1年分の月を持つデータソース（BACKFILL_SOURCES）から、開始年月から終了年月までの各年月分をまとめて取り込み直す。
+    各ブックは1回だけ開き（年ごとにシートが分かれている場合はシートごとに1回）、すべての年月の列を1回で抽出して、
+    対象の年月分を削除してから一括で挿入する。取込履歴（load_manifest.json）には記録しない。
+
+    Args:
+        start_year_month (int): 開始年月（YYYYMM形式）
+        end_year_month (int): 終了年月（YYYYMM形式）
+        input_dir_path (str): ブックを読み込むディレクトリ（省略時は終了年月のディレクトリ）
+        sources (List[str]): 取り込むデータソース名（BACKFILL_SOURCESの値。省略時はすべて）
+        session_factory: セッションを生成する関数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        progress_callback (function): 1ファイル完了ごとに (完了数, 総数) で呼び出される関数
+    Returns:
+        dict: {'year_months': [取り込んだ年月], 'loaded': {ファイル名: 件数}, 'failed': {ファイル名: エラー},
+               'missing': [ファイルが無いデータソース名], 'cancelled': キャンセルされたかどうか,
+               'rejected': {ファイル名: 取込から除外した行数}}
+    """
+    if start_year_month > end_year_month:
+        raise ValueError(f"開始年月 {start_year_month} が終了年月 {end_year_month} より後です。")
+    sources = list(sources) if sources is not None else list(BACKFILL_SOURCES)
+    invalid_sources = set(sources) - set(BACKFILL_SOURCES)
+    if invalid_sources:
+        raise ValueError(f"複数年月の取込に対応していないデータソースです: {', '.join(sorted(invalid_sources))}")
+    year_months = list(iter_year_months(start_year_month, end_year_month))
+    input_dir_path = input_dir_path or get_input_dir_path(end_year_month)
+
+    filenames = [filename for filename in os.listdir(input_dir_path) if filename.lower().endswith(('.xlsx', '.xls'))]
+    assignments = {filename: source_key for filename, source_key in assign_sources(filenames)[0].items() if source_key in sources}
+    metrics = RunMetrics(year_month=f"{start_year_month}-{end_year_month}")
+    quarantine = Quarantine(run_id=metrics.run_id, year_month=metrics.fields['year_month'])
+    result = {'year_months': year_months, 'loaded': {}, 'failed': {}, 'cancelled': False, 'rejected': {}, 'metrics': metrics,
+              'missing': [source_key for source_key in sources if source_key not in assignments.values()]}
+    for source_key in result['missing']:
+        logging.warning(f"{source_key} に対応するファイルが {input_dir_path} にありません。")
+
+    try:
+        with collect(metrics), collect_rejected(quarantine), span('total', months=len(year_months)) as total:
+            for completed, (filename, source_key) in enumerate(assignments.items(), start=1):
+                if cancel_event is not None and cancel_event.is_set():
+                    result['cancelled'] = True
+                    break
+                logging.info(f"ファイル {filename} から {year_months[0]}～{year_months[-1]} の {len(year_months)} か月分を取り込みます。")
+                try:
+                    extracted = extract_year_months(input_dir_path, filename, source_key, year_months)
+                    replace_year_months(extracted, year_months, session_factory, cancel_event, source=filename)
+                    result['loaded'][filename] = sum(len(data_list) for _, data_list in extracted)
+                except LoadCancelled:
+                    result['cancelled'] = True
+                    break
+                except Exception as e:
+                    logging.error(f"{filename}の処理中にエラーが発生しました：{e}")
+                    result['failed'][filename] = e
+                if progress_callback:
+                    progress_callback(completed, len(assignments))
+            total['rows'] = sum(result['loaded'].values())
+    finally:
+        write_metrics(input_dir_path, metrics)
+        write_quarantine(input_dir_path, quarantine)
+        result['rejected'] = quarantine.count_by_source()
+    return result
+
+def get_reset_targets(processing_year_month, typed=False):
+    """
+    リセット対象のテーブル、年月カラム、削除する年月の組を返す
+    typed=Trueの場合は型付きテーブル（_Typed）も対象にする。
+    """
+    processing_year_month = str(processing_year_month)
+    previous_month = str(get_previous_year_month(int(processing_year_month)))
+
+    # 各テーブルと年月カラムを対応付ける
+    targets = [
+        (PurchaseCostVariance, PurchaseCostVariance.年月, processing_year_month),
+        (CostCenterReports, CostCenterReports.column1, processing_year_month),
+        (ActualExpenses, ActualExpenses.column1, processing_year_month),
+        (SalesReceivables, SalesReceivables.column10, processing_year_month),
+        (Discounts, Discounts.column1, processing_year_month),
+        (StaffingSummary, StaffingSummary.年月, processing_year_month),
+        (SalesBacklog, SalesBacklog.年月, processing_year_month),
+        (ConstructionSuspenseAccounts, ConstructionSuspenseAccounts.年月, processing_year_month),
+        (ItemizedInventoryDetails, ItemizedInventoryDetails.年月, processing_year_month),
+        (DirectExpenses, DirectExpenses.年月, processing_year_month),
+        (PurchasePriceGap, PurchasePriceGap.column1, previous_month),  # 前月を使用
+        (ItemList, ItemList.column1, previous_month),  # 前月を使用
+        (FinancialCostOfSales, FinancialCostOfSales.年月, processing_year_month),
+        (FinancialOperatingIncome, FinancialOperatingIncome.年月, processing_year_month)
+    ]
+    if typed:
+        # 型付きテーブルの年月は整数で格納する
+        targets += [
+            (CostCenterReportsTyped, CostCenterReportsTyped.column1, int(processing_year_month)),
+            (ActualExpensesTyped, ActualExpensesTyped.column1, int(processing_year_month)),
+            (SalesReceivablesTyped, SalesReceivablesTyped.column10, int(processing_year_month)),
+            (DiscountsTyped, DiscountsTyped.column1, int(processing_year_month)),
+            (PurchasePriceGapTyped, PurchasePriceGapTyped.column1, int(previous_month)),  # 前月を使用
+            (ItemListTyped, ItemListTyped.column1, int(previous_month)),  # 前月を使用
+        ]
+    # 集計テーブル（型付きテーブルから集計した場合も同じテーブル）
+    targets += [
+        (CostCenterReportSummary, CostCenterReportSummary.年月, int(processing_year_month)),
+        (ExpenseActualsSummary, ExpenseActualsSummary.年月, int(processing_year_month)),
+    ]
+    return targets
+
+def reset_month(processing_year_month, session_factory=SessionLocal, cancel_event=None, input_dir_path=None, workers=1, batch_size=DEFAULT_DELETE_BATCH_SIZE, typed=False):
+    """
+    処理年月のデータを全テーブルから削除する。
+    各テーブルは存在確認の後、batch_size件ずつ削除してコミットする（workers>1の場合はテーブルを並列に処理する）。
+    cancel_eventがセットされた場合はバッチの区切りで中断し、LoadCancelledを送出する。
+    input_dir_pathを指定した場合は、次回すべてのファイルを取り込むよう取込履歴も削除する。
+    typed=Trueの場合は型付きテーブル（_Typed）も削除する。
+    集計テーブルは、まだ作成されていない（一度も集計していない）場合は対象外とする。
+
+    Returns:
+        dict: テーブル名をキー、削除件数を値とする辞書
+    """
+    from summary_utils import get_missing_summary_models
+
+    missing_summary_models = get_missing_summary_models(session_factory)
+    targets = [
+        (table, year_month_column == target_year_month)
+        for table, year_month_column, target_year_month in get_reset_targets(processing_year_month, typed)
+        if table not in missing_summary_models
+    ]
+    try:
+        deleted_counts = reset_tables(targets, session_factory, batch_size, workers, cancel_event)
+    except LoadCancelled:
+        raise
+    except Exception as e:
+        logging.error(f"データ削除中にエラーが発生しました: {e}")
+        raise
+
+    logging.info(f"{processing_year_month}のリセットが完了しました。（削除: {sum(deleted_counts.values())}件）")
+    if input_dir_path:
+        clear_manifest(input_dir_path)
+    return deleted_counts
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+from instrumentation import span
+from load_manifest import compute_file_hash
+
+# 「年月」列追加後のDataFrameをキャッシュするローカルのディレクトリ（ネットワーク共有上のファイルを読み直さないため）
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.monthly_report_cache')
+
+# 読み込み・変換処理を変更した場合は値を上げ、古いキャッシュを使わないようにする
+PARSER_VERSION = 1
+
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3     # キャッシュ全体の上限（2GB）
+DEFAULT_MAX_AGE_SECONDS = 45 * 24 * 60 * 60  # 最後に使用してから削除するまでの期間（45日）
+
+# キャッシュファイルの拡張子（pyarrowが無い場合や列の型が混在する場合はpickleで保存する）
+PARQUET_EXTENSION = '.parquet'
+PICKLE_EXTENSION = '.pkl'
+
+def get_cache_key(file_path, sheet_name, processing_year_month, content_hash=None):
+    """
+    ファイル内容のハッシュ、ファイル名、シート名、処理年月、読み込み処理のバージョンからキャッシュのキーを作成する。
+    ファイル名は「年月」列を追加するか・前月を埋め込むかの判定に使われるため、キーに含める。
+    """
+    content_hash = content_hash or compute_file_hash(file_path)
+    parts = [content_hash, os.path.basename(file_path), sheet_name or '', str(processing_year_month), str(PARSER_VERSION)]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+def _cache_paths(cache_dir, key):
+    return [os.path.join(cache_dir, key + extension) for extension in (PARQUET_EXTENSION, PICKLE_EXTENSION)]
+
+def load_frame(cache_dir, key):
+    """
+    キャッシュからDataFrameを読み込む。キャッシュが無い場合や読み込めない場合はNoneを返す。
+    読み込んだキャッシュは更新日時を現在に更新する（使用されているものを削除対象にしないため）。
+    """
+    import pandas as pd
+
+    for path in _cache_paths(cache_dir, key):
+        if not os.path.exists(path):
+            continue
+        try:
+            if path.endswith(PARQUET_EXTENSION):
+                frame = pd.read_parquet(path)
+            else:
+                with open(path, 'rb') as f:
+                    frame = pickle.load(f)
+            os.utime(path)
+            return frame
+        except Exception as e:
+            logging.warning(f"キャッシュ {path} を読み込めないため削除します: {e}")
+            _remove(path)
+    return None
+
+def _write_parquet(frame, path):
+    """
+    DataFrameをparquet形式で保存するヘルパー関数。列名が文字列でない場合や、列の型が混在して保存できない場合はFalseを返す。
+    """
+    if not all(isinstance(column, str) for column in frame.columns):
+        return False
+    try:
+        frame.to_parquet(path, index=False)
+        return True
+    except ImportError:
+        return False
+    except Exception as e:
+        logging.debug(f"parquet形式で保存できないためpickleで保存します: {e}")
+        return False
+
+def save_frame(cache_dir, key, frame):
+    """
+    DataFrameをキャッシュに保存する。並列に実行しても壊れないよう、一時ファイルから置き換える。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    parquet_path, pickle_path = _cache_paths(cache_dir, key)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        if _write_parquet(frame, tmp_path):
+            os.replace(tmp_path, parquet_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, pickle_path)
+    except OSError as e:
+        logging.warning(f"キャッシュを保存できませんでした: {e}")
+    finally:
+        _remove(tmp_path)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_CACHE_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+    """
+    最後に使用してからmax_age_seconds以上経過したキャッシュを削除し、
+    合計サイズがmax_bytesを超える場合は使用日時の古いものから削除する。
+    Returns:
+        int: 削除したキャッシュの数
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith((PARQUET_EXTENSION, PICKLE_EXTENSION)):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    removed = 0
+    now = time.time()
+    total_bytes = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if now - mtime < max_age_seconds and total_bytes <= max_bytes:
+            break
+        _remove(path)
+        total_bytes -= size
+        removed += 1
+    if removed:
+        logging.info(f"キャッシュ {removed} 件を削除しました。（残り {total_bytes / 1024 ** 2:.1f}MB）")
+    return removed
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    キャッシュをすべて削除する。
+    """
+    return evict(cache_dir, max_bytes=0, max_age_seconds=0)
+
+def get_or_convert(cache_dir, file_path, sheet_name, processing_year_month, convert_func, content_hash=None):
+    """
+    キャッシュに同じ内容のファイルの変換結果があればそれを返し、無ければconvert_funcで変換してキャッシュに保存する。
+    Args:
+        cache_dir (str): キャッシュのディレクトリ
+        file_path (str): 入力ファイルのパス
+        sheet_name (str): シート名
+        processing_year_month (int): 処理年月（YYYYMM形式）
+        convert_func (function): 引数なしで「年月」列追加後のDataFrameを返す関数
+        content_hash (str): 計算済みのファイル内容のハッシュ（省略時は計算する）
+    Returns:
+        DataFrame: 「年月」列追加後のデータ
+    """
+    filename = os.path.basename(file_path)
+    key = get_cache_key(file_path, sheet_name, processing_year_month, content_hash)
+    with span('cache_read', filename) as cache_span:
+        frame = load_frame(cache_dir, key)
+        cache_span['hit'] = frame is not None
+        cache_span['rows'] = len(frame) if frame is not None else 0
+    if frame is not None:
+        logging.info(f"{filename} はキャッシュの変換結果を使用します。")
+        return frame
+
+    frame = convert_func()
+    with span('cache_write', filename, rows=len(frame)):
+        save_frame(cache_dir, key, frame)
+        evict(cache_dir)
+    return frame
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import delete, exists, literal, literal_column, select
+import logging
+import time
+
+from bulk_insert_utils import LoadCancelled
+from transaction_utils import shares_connection
+
+# 1回のDELETEで削除する最大件数
+# SQL Serverは1文で約5000件のロックを取得するとテーブルロックへ昇格するため、それより小さくする
+DEFAULT_DELETE_BATCH_SIZE = 4000
+
+def _has_rows_statement(condition):
+    """
+    条件に一致するレコードがある場合だけ1行を返すSELECT文を返すヘルパー関数。
+    SQL ServerはSELECT句にEXISTSを書けないため、EXISTSはWHERE句に置く。
+    """
+    return select(literal(1)).where(exists().where(condition))
+
+def has_rows(session, model, condition):
+    """
+    条件に一致するレコードが存在するかどうかをEXISTSで確認する（レコードは読み込まない）。
+    """
+    return session.scalar(_has_rows_statement(condition)) is not None
+
+def _batched_delete_statement(model, condition, batch_size, dialect_name):
+    """
+    最大batch_size件を削除するDELETE文を返すヘルパー関数。
+    件数を制限できないデータベースではNoneを返す。
+    """
+    table = model.__table__
+    if dialect_name == 'mssql':
+        # DELETE TOP (n) FROM ... WHERE ...
+        return delete(table).where(condition).prefix_with(f"TOP ({int(batch_size)})")
+    if dialect_name == 'sqlite':
+        # SQLiteのDELETEはLIMITを使えないため、rowidで削除対象を絞り込む
+        rowid = literal_column('rowid')
+        return delete(table).where(rowid.in_(select(rowid).select_from(table).where(condition).limit(batch_size)))
+    return None
+
+def delete_in_batches(session, model, condition, batch_size=DEFAULT_DELETE_BATCH_SIZE, cancel_event=None):
+    """
+    条件に一致するレコードをbatch_size件ずつ削除し、バッチごとにコミットする。
+    トランザクションログの肥大化とロックの昇格を防ぐため、1つのトランザクションで全件を削除しない。
+    cancel_eventがセットされた場合は次のバッチの前で中断し、LoadCancelledを送出する（削除済みのバッチは戻らない）。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        model: SQLAlchemyのモデルクラス
+        condition: 削除条件
+        batch_size (int): 1回のDELETEで削除する最大件数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+    Returns:
+        int: 削除した件数
+    """
+    statement = _batched_delete_statement(model, condition, batch_size, session.get_bind().dialect.name)
+    if statement is None:
+        deleted = session.execute(delete(model).where(condition)).rowcount
+        session.commit()
+        return deleted
+
+    deleted = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise LoadCancelled(f"{model.__tablename__} の削除はキャンセルされました。（削除済み: {deleted}件）")
+        rowcount = session.execute(statement).rowcount
+        session.commit()
+        deleted += rowcount
+        if rowcount < batch_size:
+            return deleted
+
+def reset_table(session_factory, model, condition, batch_size=DEFAULT_DELETE_BATCH_SIZE, cancel_event=None):
+    """
+    1つのテーブルから条件に一致するレコードを削除し、削除件数を返す。
+    """
+    db = session_factory()
+    try:
+        if not has_rows(db, model, condition):
+            logging.info(f"{model.__tablename__}に削除対象はありませんでした。")
+            return 0
+
+        start_time = time.perf_counter()
+        deleted = delete_in_batches(db, model, condition, batch_size, cancel_event)
+        logging.info(f"{model.__tablename__}のレコード {deleted} 件を削除しました。（{time.perf_counter() - start_time:.2f}秒）")
+        return deleted
+    except LoadCancelled as e:
+        db.rollback()
+        logging.warning(str(e))
+        raise
+    except Exception as e:
+        db.rollback()
+        logging.error(f"{model.__tablename__}のデータ削除中にエラーが発生しました: {e}")
+        raise
+    finally:
+        db.close()
+
+def reset_tables(targets, session_factory, batch_size=DEFAULT_DELETE_BATCH_SIZE, workers=1, cancel_event=None):
+    """
+    複数のテーブルから条件に一致するレコードを削除する。
+    workers>1の場合は、テーブルごとにコネクションプールのセッションを使って並列に削除する。
+    1つのコネクションを共有するデータベース（メモリ上のSQLite）では、workersによらず1テーブルずつ削除する。
+
+    Args:
+        targets (List[Tuple]): (モデル, 削除条件) のリスト
+        session_factory: セッションを生成する関数
+        batch_size (int): 1回のDELETEで削除する最大件数
+        workers (int): 並列に削除するテーブル数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+    Returns:
+        dict: テーブル名をキー、削除件数を値とする辞書
+    """
+    if workers <= 1 or shares_connection(session_factory):
+        return {
+            model.__tablename__: reset_table(session_factory, model, condition, batch_size, cancel_event)
+            for model, condition in targets
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            model.__tablename__: executor.submit(reset_table, session_factory, model, condition, batch_size, cancel_event)
+            for model, condition in targets
+        }
+        # いずれかのテーブルで発生した例外は、すべてのテーブルの処理が終わった後に送出する
+        return {tablename: future.result() for tablename, future in futures.items()}
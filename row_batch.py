@@ -0,0 +1,62 @@
+from functools import lru_cache
+from sqlalchemy import inspect
+
+class RowBatch:
+    """
+    列の並び（属性名: column1など）を1つだけ持ち、各行を値のタプルとして保持する行のまとまり。
+    行ごとに列名をキーとする辞書を作らないため、列数の多い表でも抽出・挿入の負荷とメモリ使用量を抑えられる。
+    len・スライス・反復に対応し、反復した場合や1行だけ取り出した場合は従来どおり辞書を返す。
+    """
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, keys, rows):
+        self.keys = tuple(keys)
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowBatch(self.keys, self.rows[index])
+        return dict(zip(self.keys, self.rows[index]))
+
+    def __iter__(self):
+        for row in self.rows:
+            yield dict(zip(self.keys, row))
+
+    def to_frame(self):
+        """
+        列名を属性名とするDataFrameに変換する。
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.rows, columns=list(self.keys))
+
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        列名を属性名とするDataFrameから作成する。
+        """
+        return cls(frame.columns, list(frame.itertuples(index=False, name=None)))
+
+@lru_cache(maxsize=None)
+def get_table_layout(model, num_columns, start_column):
+    """
+    表形式のワークシートの列とモデルの属性（column1, column2, ...）の対応を、モデルごとに1回だけ求める。
+    ワークシートの範囲外の属性と、対応する属性の無い列は含めない。
+
+    Args:
+        model: SQLAlchemyのモデルクラス
+        num_columns (int): ワークシートの列数
+        start_column (int): column1に対応する列番号
+    Returns:
+        Tuple[tuple, tuple]: (テーブルの列順の属性名, 各属性に対応する行のインデックス（0始まり）)
+    """
+    keys, positions = [], []
+    for prop in inspect(model).column_attrs:
+        number = prop.key[len('column'):]
+        if prop.key.startswith('column') and number.isdigit() and int(number) <= num_columns - start_column + 1:
+            keys.append(prop.key)
+            positions.append(int(number) + start_column - 2)
+    return tuple(keys), tuple(positions)
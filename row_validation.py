@@ -0,0 +1,227 @@
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import NVARCHAR, String, Unicode, inspect
+import json
+import logging
+import os
+import threading
+
+from instrumentation import current_source
+from row_batch import RowBatch
+
+# 取込から除外した行を追記するファイル（処理年月のディレクトリ、1行1レコードのJSON Lines形式）
+QUARANTINE_FILENAME = 'load_quarantine.jsonl'
+
+# 行を除外した理由
+REASON_NULL_KEY = 'null_key'              # 主キーの列が空
+REASON_TOO_LONG = 'too_long'              # 文字列が列の長さを超える
+REASON_DUPLICATE_KEY = 'duplicate_key'    # 同じ主キーの行が先に現れている
+REASON_DATABASE_ERROR = 'database_error'  # 1行ずつに分けても挿入できなかった（既存レコードとの重複など）
+
+# VARCHARの長さはSQL Serverの照合順序（Japanese_CI_AS）のコードページでのバイト数として検査する
+VARCHAR_ENCODING = 'cp932'
+MAX_BYTES_PER_CHAR = 2
+
+# エラーログに出力する値の最大数（理由ごと）
+MAX_LOGGED_REJECTED_ROWS = 5
+
+_active_quarantine = None
+
+@lru_cache(maxsize=None)
+def get_column_rules(model):
+    """
+    挿入前に検査する列の条件を、モデルごとに1回だけ求める。
+    自動採番の代理キー（id）はデータに含まれないため対象外とする。
+    NULLは主キーの列のみ検査する（Mapped[str]の列はモデル上NOT NULLになるが、既存のテーブルは空のセルをNULLで格納している）。
+    Returns:
+        Tuple[tuple, dict, dict]: (主キーの属性名, {属性名: (長さ, バイト数で数えるかどうか)}, {属性名: 列名})
+    """
+    from upsert_utils import is_surrogate_key
+
+    key_attrs, max_lengths, column_names = [], {}, {}
+    for prop in inspect(model).column_attrs:
+        column = prop.columns[0]
+        column_names[prop.key] = column.name
+        if is_surrogate_key(column):
+            continue
+        if column.primary_key:
+            key_attrs.append(prop.key)
+        if isinstance(column.type, String) and column.type.length:
+            max_lengths[prop.key] = (column.type.length, not isinstance(column.type, (NVARCHAR, Unicode)))
+    return tuple(key_attrs), max_lengths, column_names
+
+def _is_null(value):
+    return value is None or value != value  # NaNは自身と等しくない
+
+def _value_length(value, count_bytes):
+    if not count_bytes:
+        return len(value)
+    return len(value.encode(VARCHAR_ENCODING, errors='replace'))
+
+def _find_too_long(values, length, count_bytes):
+    """
+    列の値のうち、長さを超える文字列の行番号を返すヘルパー関数。
+    ほとんどの列は最長の文字列でも長さに収まるため、先に列全体の最大文字数だけを調べる。
+    """
+    try:
+        longest = max(map(len, values))
+    except TypeError:
+        # 数値などの文字列以外の値が混在する列
+        longest = max((len(value) for value in values if isinstance(value, str)), default=0)
+    if longest * (MAX_BYTES_PER_CHAR if count_bytes else 1) <= length:
+        return []
+    return [index for index, value in enumerate(values)
+            if isinstance(value, str) and len(value) * (MAX_BYTES_PER_CHAR if count_bytes else 1) > length
+            and _value_length(value, count_bytes) > length]
+
+class RowValidator:
+    """
+    挿入前のチャンクを列単位でまとめて検査し、主キーの列が空の行、文字列が列の長さを超える行、
+    主キーが重複する行（2件目以降）を取り除く。
+    チャンクをまたいだ主キーの重複も検出するため、1つのテーブルへの挿入ごとに作成する。
+    """
+    def __init__(self, model):
+        self.model = model
+        self.key_attrs, self.max_lengths, self.column_names = get_column_rules(model)
+        self.seen_keys = set()
+
+    def check(self, chunk):
+        """
+        Args:
+            chunk (List[Dict] | RowBatch): 挿入対象の辞書形式データ、またはRowBatch
+        Returns:
+            Tuple[List[Dict] | RowBatch, List[Dict]]: 検査を通過した行（chunkと同じ形式）、
+                除外した行（{'reason': 理由, 'column': 列名, 'values': {列名: 値}}）のリスト
+        """
+        if not chunk:
+            return chunk, []
+        keys = chunk.keys if isinstance(chunk, RowBatch) else tuple(chunk[0])
+        rows = chunk.rows if isinstance(chunk, RowBatch) else [tuple(row.get(key) for key in keys) for row in chunk]
+        positions = {key: index for index, key in enumerate(keys)}
+        columns = list(zip(*rows))
+
+        reasons = {}
+        for attr in self.key_attrs:
+            if attr in positions:
+                for index, value in enumerate(columns[positions[attr]]):
+                    if _is_null(value):
+                        reasons.setdefault(index, (REASON_NULL_KEY, attr))
+        for attr, (length, count_bytes) in self.max_lengths.items():
+            if attr in positions:
+                for index in _find_too_long(columns[positions[attr]], length, count_bytes):
+                    reasons.setdefault(index, (REASON_TOO_LONG, attr))
+        key_positions = [positions[attr] for attr in self.key_attrs if attr in positions]
+        if key_positions and len(key_positions) == len(self.key_attrs):
+            for index, key in enumerate(zip(*(columns[position] for position in key_positions))):
+                if index in reasons:
+                    continue
+                if key in self.seen_keys:
+                    reasons[index] = (REASON_DUPLICATE_KEY, None)
+                else:
+                    self.seen_keys.add(key)
+
+        if not reasons:
+            return chunk, []
+        rejected = [self.make_record(dict(zip(keys, rows[index])), reason, attr) for index, (reason, attr) in sorted(reasons.items())]
+        if isinstance(chunk, RowBatch):
+            return RowBatch(keys, [row for index, row in enumerate(rows) if index not in reasons]), rejected
+        return [row for index, row in enumerate(chunk) if index not in reasons], rejected
+
+    def make_record(self, row, reason, attr=None, detail=None):
+        """
+        除外した行を、取込から除外した行のファイルに出力する形式（列名をキーとする辞書）に変換する。
+        """
+        record = {'reason': reason, 'column': self.column_names.get(attr) if attr else None,
+                  'values': {self.column_names.get(key, key): value for key, value in row.items()}}
+        if detail:
+            record['detail'] = detail
+        return record
+
+class Quarantine:
+    """
+    1回の取込処理で取込から除外した行を集めるクラス。
+    挿入はスレッドプールから並行して行われるため、追加はロックで保護する。
+    """
+    def __init__(self, **fields):
+        self.fields = fields
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, records):
+        with self._lock:
+            self.records.extend(records)
+
+    def count_by_source(self):
+        """
+        データソース（ファイル名）ごとの除外した行数を返す。
+        """
+        counts = {}
+        with self._lock:
+            for record in self.records:
+                counts[record.get('source')] = counts.get(record.get('source'), 0) + 1
+        return counts
+
+    def write_jsonl(self, path):
+        """
+        除外した行をJSON Lines形式でファイルに追記する。
+        """
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps({**self.fields, **record}, ensure_ascii=False, default=str) + '\n')
+
+@contextmanager
+def collect_rejected(quarantine=None):
+    """
+    ブロック内で取込から除外した行をquarantineに集める（省略時は新しいQuarantineを作成する）。
+    """
+    global _active_quarantine
+    quarantine = quarantine if quarantine is not None else Quarantine()
+    previous, _active_quarantine = _active_quarantine, quarantine
+    try:
+        yield quarantine
+    finally:
+        _active_quarantine = previous
+
+def reject_rows(model, rejected):
+    """
+    取込から除外した行を理由ごとにログへ出力し、集める先（collect_rejectedのブロック内）があれば追加する。
+    """
+    if not rejected:
+        return
+    source = current_source()
+    by_reason = {}
+    for record in rejected:
+        record.update(table=model.__tablename__, source=source)
+        by_reason.setdefault(record['reason'], []).append(record)
+    for reason, records in by_reason.items():
+        samples = ", ".join(
+            _format_key(model, record['values']) + (f"（{record['column']}）" if record['column'] else "")
+            for record in records[:MAX_LOGGED_REJECTED_ROWS]
+        )
+        detail = f" {records[0]['detail']}" if records[0].get('detail') else ""
+        logging.warning(f"{model.__tablename__}の{len(records)}件の行を取込から除外しました（{reason}）。（例: {samples}）{detail}")
+    if _active_quarantine is not None:
+        _active_quarantine.add(rejected)
+
+def _format_key(model, values):
+    """
+    ログに出力する行の識別情報（主キーの値。主キーが無い場合は先頭の列の値）を返すヘルパー関数。
+    """
+    key_attrs, _, column_names = get_column_rules(model)
+    names = [column_names[attr] for attr in key_attrs] or list(values)[:3]
+    return "(" + ", ".join(repr(values.get(name)) for name in names) + ")"
+
+def write_quarantine(input_dir_path, quarantine):
+    """
+    除外した行を処理年月のディレクトリのload_quarantine.jsonlへ追記する（除外した行が無い場合は何もしない）。
+    """
+    if not quarantine.records:
+        return
+    path = os.path.join(input_dir_path, QUARANTINE_FILENAME)
+    try:
+        quarantine.write_jsonl(path)
+        logging.warning(f"取込から除外した {len(quarantine.records)} 件の行を {path} に出力しました。")
+    except OSError as e:
+        logging.warning(f"取込から除外した行を保存できませんでした: {e}")
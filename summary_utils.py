@@ -0,0 +1,103 @@
+from sqlalchemy import Float, Integer, String, cast, delete, func, insert, inspect, literal, select, try_cast
+from sqlalchemy.orm import Session
+import logging
+import time
+
+from instrumentation import annotate
+from models import CostCenterReports, ActualExpenses, CostCenterReportSummary, ExpenseActualsSummary, TYPED_MODELS
+from transaction_utils import begin_transaction
+
+# 集計テーブルごとの集計元の明細テーブルと、集計キー・集計値の列の対応（集計テーブルの属性名: 明細テーブルの属性名）
+# 型付きテーブル（_Typed）へ取り込んだ場合も、同じ集計テーブルへ集計する
+SUMMARY_DEFINITIONS = {
+    CostCenterReportSummary: {
+        'source': CostCenterReports,
+        'keys': {'得意先グループ': 'column8', '営業グループ': 'column37', '品目グループ': 'column25'},
+        'values': {'売上高': 'column78', '直接費': 'column79', '間接費': 'column83'},  # 実績当月
+    },
+    ExpenseActualsSummary: {
+        'source': ActualExpenses,
+        'keys': {'原価センタ': 'column2', '原価要素': 'column3'},
+        'values': {'金額': 'column8'},
+    },
+}
+
+def get_summary_model(model):
+    """
+    明細テーブルのモデルに対応する集計テーブルのモデルを返す（集計テーブルが無い場合はNone）。
+    """
+    for summary_model, definition in SUMMARY_DEFINITIONS.items():
+        if model is definition['source'] or model is TYPED_MODELS.get(definition['source']):
+            return summary_model
+    return None
+
+def get_summary_sources(typed=False):
+    """
+    集計テーブルの集計元の明細テーブルのモデルを返す（typed=Trueの場合は型付きテーブル）。
+    """
+    sources = [definition['source'] for definition in SUMMARY_DEFINITIONS.values()]
+    return [TYPED_MODELS[source] for source in sources] if typed else sources
+
+def get_missing_summary_models(session_factory):
+    """
+    データベースにまだ作成されていない集計テーブルのモデルを返す（集計テーブルは初回の集計時に作成する）。
+    """
+    db = session_factory()
+    try:
+        inspector = inspect(db.connection())
+        return {summary_model for summary_model in SUMMARY_DEFINITIONS if not inspector.has_table(summary_model.__tablename__)}
+    finally:
+        db.close()
+
+def _to_number(column, dialect_name):
+    """
+    明細テーブルの列を数値に変換する式を返すヘルパー関数。
+    VARCHARの列は桁区切りのカンマを除いてから変換し、SQL Serverでは変換できない値をNULLとして集計から除く（TRY_CAST）。
+    """
+    if not isinstance(column.type, String):
+        return cast(column, Float)
+    expression = func.replace(column, ',', '')
+    return try_cast(expression, Float) if dialect_name == 'mssql' else cast(expression, Float)
+
+def refresh_summary(session: Session, model, year_month_column, year_month):
+    """
+    明細テーブルの処理年月分を集計キーごとに集計し、集計テーブルの処理年月分を置き換えてコミットする。
+    集計はデータベース内で行い（INSERT ... SELECT ... GROUP BY）、明細の行は読み込まない。
+    集計テーブルが無い場合は作成する（既存のデータベースはcreate_allで作成していないため）。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        model: 明細テーブルのモデルクラス
+        year_month_column: 明細テーブルの年月カラム
+        year_month: 処理年月の値（明細テーブルの年月カラムの型）
+    Returns:
+        int: 集計テーブルに挿入した件数
+    """
+    summary_model = get_summary_model(model)
+    definition = SUMMARY_DEFINITIONS[summary_model]
+    summary = summary_model.__table__
+    try:
+        start_time = time.perf_counter()
+        # 接続URLでautocommitを有効にしている場合も、集計テーブルの削除から挿入までを1つのトランザクションにする
+        connection = begin_transaction(session)
+        summary.create(connection, checkfirst=True)
+        dialect_name = connection.dialect.name
+        # GROUP BYとSELECTの式を一致させるため、定数はパラメータにせずSQLに埋め込む
+        keys = [func.coalesce(getattr(model, attr), literal('', literal_execute=True)) for attr in definition['keys'].values()]
+        values = [func.coalesce(func.sum(_to_number(getattr(model, attr), dialect_name)), 0) for attr in definition['values'].values()]
+        aggregate = (
+            select(literal(int(year_month), Integer, literal_execute=True), *keys, *values, func.count())
+            .where(year_month_column == year_month)
+            .group_by(*keys)
+        )
+        deleted = session.execute(delete(summary).where(summary.c.年月 == int(year_month))).rowcount
+        inserted = session.execute(insert(summary).from_select(['年月', *definition['keys'], *definition['values'], '件数'], aggregate)).rowcount
+        commit_start_time = time.perf_counter()
+        session.commit()
+        annotate(commit_seconds=time.perf_counter() - commit_start_time)
+        logging.info(f"{summary.name} の{year_month}分を集計しました。（削除: {deleted}件, 挿入: {inserted}件, {time.perf_counter() - start_time:.2f}秒）")
+        return inserted
+    except Exception as e:
+        session.rollback()
+        logging.error(f"{summary.name} の集計中にエラーが発生しました: {e}")
+        raise
@@ -0,0 +1,125 @@
+from sqlalchemy import MetaData, delete, insert, select
+from sqlalchemy.orm import Session
+import logging
+import threading
+import time
+
+from bulk_insert_utils import LoadCancelled, execute_insert
+from instrumentation import annotate
+from row_validation import RowValidator, reject_rows
+from transaction_utils import begin_transaction
+from upsert_utils import is_surrogate_key
+
+# シャドウテーブル（取込中のデータを格納する、各テーブルと同じ構成のテーブル）の接尾辞
+SHADOW_SUFFIX = "_Shadow"
+
+# シャドウテーブルはBase.metadataとは別に管理し、create_allでは作成しない（初回の取込時に作成する）
+shadow_metadata = MetaData()
+_shadow_lock = threading.Lock()
+
+def get_shadow_table(model):
+    """
+    モデルのテーブルと同じ列・主キーを持つシャドウテーブル（テーブル名の末尾に_Shadow）を返す。
+    """
+    name = f"{model.__tablename__}{SHADOW_SUFFIX}"
+    with _shadow_lock:
+        if name not in shadow_metadata.tables:
+            model.__table__.to_metadata(shadow_metadata, name=name)
+        return shadow_metadata.tables[name]
+
+def _copy_columns(table):
+    """
+    シャドウテーブルから挿入先テーブルへ移す列名を返すヘルパー関数。
+    自動採番の代理キー（id）は挿入先テーブルで採番し直すため除く。
+    """
+    return [column.name for column in table.columns if not is_surrogate_key(column)]
+
+def load_into_shadow(session: Session, model, data_list, year_month_column, year_month, chunk_size=1000, cancel_event=None, progress_callback=None):
+    """
+    データを処理年月分のシャドウテーブルへチャンク単位で挿入し、コミットする。
+    挿入先テーブルには触れないため、取込中も利用者の参照をブロックしない。
+    前回失敗した取込のデータがシャドウテーブルに残っている場合は、先に削除する。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        model: SQLAlchemyのモデルクラス
+        data_list (List[Dict] | RowBatch): 挿入対象の辞書形式データ、またはRowBatch
+        year_month_column (str): 年月カラムの列名
+        year_month: 処理年月の値（前月を格納するテーブルは前月）
+        chunk_size (int): 1チャンクあたりのレコード数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        progress_callback (function): 1チャンク挿入ごとに (挿入済み件数, 総件数) で呼び出される関数
+    Returns:
+        int: シャドウテーブルに挿入した件数（除外した行を含まない）
+    """
+    shadow = get_shadow_table(model)
+    inserted = 0
+    try:
+        # 接続URLでautocommitを有効にしている場合も、前回のデータの削除から挿入までを1つのトランザクションにする
+        connection = begin_transaction(session)
+        shadow.create(connection, checkfirst=True)
+        connection.execute(delete(shadow).where(shadow.c[year_month_column] == year_month))
+        execution_options = {'fast_executemany': True} if connection.dialect.name == 'mssql' else {}
+        # 主キーが重複する行などは、シャドウテーブルへの挿入を失敗させないよう先に除外する
+        validator = RowValidator(model)
+        for i in range(0, len(data_list), chunk_size):
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled(f"{model.__tablename__} へのデータ挿入はキャンセルされました。")
+            chunk = data_list[i:i + chunk_size]
+            valid_chunk, rejected = validator.check(chunk)
+            reject_rows(model, rejected)
+            if valid_chunk:
+                execute_insert(connection, model, shadow, valid_chunk, execution_options=execution_options)
+                inserted += len(valid_chunk)
+            if progress_callback:
+                progress_callback(i + len(chunk), len(data_list))
+        commit_start_time = time.perf_counter()
+        session.commit()
+        annotate(strategy='shadow', commit_seconds=time.perf_counter() - commit_start_time)
+        logging.info(f"{shadow.name} に {inserted} 件のデータを挿入しました。")
+        return inserted
+    except LoadCancelled as e:
+        session.rollback()
+        logging.warning(f"{e}ロールバックしました。")
+        raise
+    except Exception as e:
+        session.rollback()
+        logging.error(f"{shadow.name} へのデータ挿入中にエラーが発生しました: {e}")
+        raise
+
+def swap_months(session: Session, targets):
+    """
+    シャドウテーブルに挿入済みの処理年月分を、1つのトランザクションで挿入先テーブルへ入れ替える。
+    挿入先テーブルの処理年月分の削除と、シャドウテーブルからの INSERT ... SELECT をサーバー内で実行するため、
+    ロックを保持するのは入れ替えの間だけで、失敗した場合は前回のデータがそのまま残る。
+    SQL Serverのパーティション切り替えは年月でパーティション分割されたテーブルが前提のため使用しない。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        targets (List[Tuple]): (モデル, 年月カラムの列名, 処理年月の値) のリスト
+    Returns:
+        dict: テーブル名をキー、入れ替えた件数を値とする辞書
+    """
+    swapped = {}
+    try:
+        start_time = time.perf_counter()
+        # 接続URLでautocommitを有効にしている場合も、文ごとにコミットせず、すべてのテーブルを1回のコミットで入れ替える
+        begin_transaction(session)
+        for model, year_month_column, year_month in targets:
+            table = model.__table__
+            shadow = get_shadow_table(model)
+            columns = _copy_columns(table)
+            session.execute(delete(table).where(table.c[year_month_column] == year_month))
+            swapped[table.name] = session.execute(insert(table).from_select(
+                columns, select(*[shadow.c[name] for name in columns]).where(shadow.c[year_month_column] == year_month)
+            )).rowcount
+            session.execute(delete(shadow).where(shadow.c[year_month_column] == year_month))
+        commit_start_time = time.perf_counter()
+        session.commit()
+        annotate(commit_seconds=time.perf_counter() - commit_start_time)
+        logging.info(f"{', '.join(f'{name}: {count}件' for name, count in swapped.items())} を入れ替えました。（{time.perf_counter() - start_time:.2f}秒）")
+        return swapped
+    except Exception as e:
+        session.rollback()
+        logging.error(f"シャドウテーブルからの入れ替え中にエラーが発生しました: {e}")
+        raise
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from bulk_insert_utils import bulk_insert_with_chunk
+from database import Base
+from models import StaffingSummary
+from row_validation import REASON_DATABASE_ERROR, REASON_DUPLICATE_KEY, REASON_TOO_LONG, Quarantine, collect_rejected
+from transaction_utils import is_autocommit
+
+YEAR_MONTH = 202405
+
+@pytest.fixture
+def autocommit_engine(tmp_path):
+    """
+    本番の接続URL（pyodbcのautocommit=True）と同じく、SQLAlchemyからは見えないDBAPIのautocommitを有効にしたSQLiteのエンジン。
+    コネクションをプールせず、セッションごとにautocommitのコネクションから始める。
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={'isolation_level': None}, poolclass=NullPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(StaffingSummary(年月=YEAR_MONTH, セグメント='既存', 分類='A', 人員=1.0))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+def make_rows():
+    return [
+        {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'A', '人員': 1.0},
+        {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'X', '人員': None},         # NOT NULLの列が空（挿入時にエラー）
+        {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'B', '人員': 3.0},
+        {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'B', '人員': 4.0},          # チャンク内で主キーが重複
+        {'年月': YEAR_MONTH, 'セグメント': '長すぎるセグメント名', '分類': 'C', '人員': 5.0},
+        {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'C', '人員': 6.0},
+    ]
+
+def read_rows(engine):
+    with Session(engine) as session:
+        return sorted(session.execute(select(StaffingSummary.セグメント, StaffingSummary.分類, StaffingSummary.人員)).all())
+
+def test_quarantine_under_autocommit(autocommit_engine):
+    session_factory = sessionmaker(bind=autocommit_engine)
+    autocommit_states = []
+    with session_factory() as session, collect_rejected(Quarantine()) as quarantine:
+        bulk_insert_with_chunk(session, StaffingSummary, make_rows(), chunk_size=3,
+                               progress_callback=lambda *_: autocommit_states.append(is_autocommit(session.connection())))
+
+    assert autocommit_states == [False, False]
+    assert read_rows(autocommit_engine) == [('新規', 'A', 1.0), ('新規', 'B', 3.0), ('新規', 'C', 6.0), ('既存', 'A', 1.0)]
+    assert sorted(record['reason'] for record in quarantine.records) == sorted([REASON_DATABASE_ERROR, REASON_DUPLICATE_KEY, REASON_TOO_LONG])
+
+def test_existing_rows_fail_the_load(autocommit_engine):
+    # 既存レコードとの主キーの重複は、処理年月分が取込済みとしてテーブル全体をロールバックする
+    rows = [{'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'A', '人員': 1.0},
+            {'年月': YEAR_MONTH, 'セグメント': '既存', '分類': 'A', '人員': 2.0},
+            {'年月': YEAR_MONTH, 'セグメント': '新規', '分類': 'B', '人員': 3.0}]
+    with Session(autocommit_engine) as session, collect_rejected(Quarantine()) as quarantine, pytest.raises(IntegrityError, match='UNIQUE constraint failed'):
+        bulk_insert_with_chunk(session, StaffingSummary, rows)
+
+    assert read_rows(autocommit_engine) == [('既存', 'A', 1.0)]
+    assert quarantine.records == []
+
+def test_mostly_failing_chunk_fails_the_load(autocommit_engine):
+    rows = [{'年月': YEAR_MONTH, 'セグメント': '新規', '分類': str(i), '人員': 1.0 if i == 0 else None} for i in range(4)]
+    with Session(autocommit_engine) as session, collect_rejected(Quarantine()), pytest.raises(IntegrityError, match='NOT NULL constraint failed'):
+        bulk_insert_with_chunk(session, StaffingSummary, rows)
+
+    assert read_rows(autocommit_engine) == [('既存', 'A', 1.0)]
+
+def test_autocommit_connection_inserts_without_savepoints(autocommit_engine):
+    # 明示的なトランザクションにできないコネクション（分離レベルがAUTOCOMMIT）では、分割せずにエラーを送出する
+    with autocommit_engine.connect() as connection:
+        session = Session(bind=connection.execution_options(isolation_level='AUTOCOMMIT'))
+        with collect_rejected(Quarantine()) as quarantine, pytest.raises(IntegrityError, match='NOT NULL constraint failed'):
+            bulk_insert_with_chunk(session, StaffingSummary, make_rows(), chunk_size=3)
+        session.close()
+
+    assert quarantine.records == []
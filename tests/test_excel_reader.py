@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+from excel_reader import FrameSheet
+
+def read_back(frame, tmp_path):
+    """
+    以前のTMPフォルダ経由の読み込みと同じく、to_excelで書き出した.xlsxをopenpyxlで読み込み直す。
+    """
+    path = tmp_path / "tmp.xlsx"
+    frame.to_excel(path, index=False)
+    workbook = openpyxl.load_workbook(path, data_only=True)
+    try:
+        return list(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+def test_frame_sheet_matches_tmp_reread(tmp_path):
+    frame = pd.DataFrame({
+        '年月': [202405, 202405, 202405],
+        '受注伝票': [1, None, 3],                  # 欠損値を含む整数の列（float64になる）
+        '明細': [10.0, 20.0, -0.0],
+        '金額': [1.0, 2.5, 1e20],
+        '品目コード': ['0000000117', 1.0, None],   # 文字列と数値が混在する列
+        '名称': pd.Series(['a', 'b', None], dtype='str'),
+        '日付': pd.to_datetime(['2024-05-01', None, '2024-05-31']),
+    })
+
+    rows = list(FrameSheet(frame).iter_rows())
+
+    assert rows == read_back(frame, tmp_path)
+    assert [type(value) for value in rows[1][1:4]] == [int, int, int]
+    assert isinstance(rows[1][6], datetime)
+
+def test_frame_sheet_cell_and_frame_use_converted_values():
+    frame = pd.DataFrame({'受注伝票': [1, None], '金額': [2.5, 3.0]})
+    sheet = FrameSheet(frame)
+
+    assert sheet['A2'].value == 1 and type(sheet['A2'].value) is int
+    assert sheet.cell(3, 1).value is None
+    assert sheet.frame.iloc[:, 1].tolist() == [2.5, 3]
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from benchmark import generate_sources
+from database import build_engine
+from load_manifest import get_load_mode, is_unchanged, record_load
+from monthly_loader import load_year_month
+
+YEAR_MONTH = 202405
+FINGERPRINT = {'size': 10, 'sha256': 'abc'}
+
+def make_manifest(load_mode):
+    manifest = {'year_month': YEAR_MONTH, 'sources': {}}
+    record_load(manifest, '売上実績.xlsx', FINGERPRINT, 'CostCenterReports', ['T_CostCenterReport'], 1, load_mode)
+    return manifest
+
+def test_same_file_and_mode_is_unchanged():
+    manifest = make_manifest(get_load_mode())
+    assert is_unchanged(manifest, '売上実績.xlsx', FINGERPRINT, get_load_mode())
+    assert not is_unchanged(manifest, '売上実績.xlsx', {'size': 10, 'sha256': 'def'}, get_load_mode())
+
+def test_different_mode_is_not_unchanged():
+    manifest = make_manifest(get_load_mode())
+    assert not is_unchanged(manifest, '売上実績.xlsx', FINGERPRINT, get_load_mode(typed=True))
+    assert not is_unchanged(manifest, '売上実績.xlsx', FINGERPRINT, get_load_mode(upsert=True))
+    assert not is_unchanged(manifest, '売上実績.xlsx', FINGERPRINT, get_load_mode(swap=True))
+
+def test_entry_without_mode_is_not_unchanged():
+    manifest = make_manifest(get_load_mode())
+    for key in ('typed', 'mode'):
+        del manifest['sources']['売上実績.xlsx'][key]
+    assert not is_unchanged(manifest, '売上実績.xlsx', FINGERPRINT, get_load_mode())
+
+def test_incremental_typed_load_after_untyped_load(tmp_path):
+    input_dir_path = tmp_path / str(YEAR_MONTH)
+    generate_sources(str(input_dir_path), YEAR_MONTH, rows=20)
+    engine = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}", 'create_tables': True})
+    session_factory = sessionmaker(bind=engine)
+
+    first = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory, incremental=True)
+    typed = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory, incremental=True, typed=True)
+    again = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory, incremental=True, typed=True)
+
+    assert not first['failed'] and not typed['failed']
+    assert sorted(typed['loaded']) == sorted(first['loaded'])
+    assert typed['skipped'] == []
+    assert sorted(again['skipped']) == sorted(first['loaded'])
+    engine.dispose()
+
+def test_full_load_without_cache_does_not_hash(tmp_path, monkeypatch):
+    input_dir_path = tmp_path / str(YEAR_MONTH)
+    generate_sources(str(input_dir_path), YEAR_MONTH, rows=20)
+    engine = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}", 'create_tables': True})
+    session_factory = sessionmaker(bind=engine)
+
+    with monkeypatch.context() as m:
+        m.setattr('load_manifest.compute_file_hash', lambda *_: pytest.fail('ハッシュを計算しました'))
+        first = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory)
+    # ハッシュを記録していないファイルは、次回の差分取込で取り込み直す
+    again = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory, incremental=True)
+
+    assert not first['failed'] and not again['failed']
+    assert sorted(again['loaded']) == sorted(first['loaded'])
+    assert again['skipped'] == []
+    engine.dispose()
@@ -0,0 +1,48 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from benchmark import generate_sources
+from database import build_engine
+from models import StaffingSummary
+from monthly_loader import insert_extracted, load_year_month
+from row_validation import Quarantine, collect_rejected
+
+YEAR_MONTH = 202405
+
+def test_second_full_load_fails_instead_of_quarantining(tmp_path):
+    input_dir_path = tmp_path / str(YEAR_MONTH)
+    generate_sources(str(input_dir_path), YEAR_MONTH, rows=20)
+    engine = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}", 'create_tables': True})
+    session_factory = sessionmaker(bind=engine)
+
+    first = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory)
+    second = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=session_factory)
+
+    assert not first['failed']
+    assert isinstance(second['failed'].get('人員集計表.xlsx'), IntegrityError)
+    assert second['rejected'] == {}
+    engine.dispose()
+
+def test_loaded_counts_exclude_rejected_rows(tmp_path):
+    engine = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}", 'create_tables': True})
+    rows = [{'年月': YEAR_MONTH, 'セグメント': 'A', '分類': '正社員', '人員': 1.0},
+            {'年月': YEAR_MONTH, 'セグメント': 'A', '分類': '正社員', '人員': 2.0}]  # 主キーが重複
+
+    with collect_rejected(Quarantine()) as quarantine:
+        counts = insert_extracted([(StaffingSummary, rows)], YEAR_MONTH, session_factory=sessionmaker(bind=engine))
+
+    assert counts == [(StaffingSummary, 1)]
+    assert len(quarantine.records) == 1
+    engine.dispose()
+
+def test_stream_selected_sources_with_workers(tmp_path):
+    input_dir_path = tmp_path / str(YEAR_MONTH)
+    generate_sources(str(input_dir_path), YEAR_MONTH, rows=20)
+    engine = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}", 'create_tables': True})
+
+    result = load_year_month(YEAR_MONTH, str(input_dir_path), session_factory=sessionmaker(bind=engine), workers=2, stream=('CostCenterReports',))
+
+    assert not result['failed']
+    assert len(result['loaded']) == 13
+    assert [record['source'] for record in result['metrics'].records if record['stage'] == 'stream'] == ['売上実績.xlsx']
+    engine.dispose()
@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mssql
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import StaffingSummary
+from reset_utils import _has_rows_statement, has_rows
+
+def test_has_rows_statement_compiles_for_sql_server():
+    sql = str(_has_rows_statement(StaffingSummary.年月 == 202405).compile(dialect=mssql.dialect()))
+
+    assert 'SELECT EXISTS' not in sql
+    assert 'WHERE EXISTS (SELECT * \nFROM [T_PersonnelSummary] \nWHERE [T_PersonnelSummary].[年月] = ' in sql
+
+def test_has_rows():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(StaffingSummary(年月=202405, セグメント='A', 分類='B', 人員=1.0))
+        session.commit()
+
+        assert has_rows(session, StaffingSummary, StaffingSummary.年月 == 202405) is True
+        assert has_rows(session, StaffingSummary, StaffingSummary.年月 == 202406) is False
+    engine.dispose()
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from database import Base
+from models import ActualExpenses
+from swap_utils import get_shadow_table, load_into_shadow, swap_months
+
+YEAR_MONTH = '202405'
+
+@pytest.fixture
+def autocommit_session_factory(tmp_path):
+    """
+    本番の接続URL（pyodbcのautocommit=True）と同じく、SQLAlchemyからは見えないDBAPIのautocommitを有効にしたSQLiteのセッション。
+    コネクションをプールせず、セッションごとにautocommitのコネクションから始める。
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={'isolation_level': None}, poolclass=NullPool)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def make_row(name):
+    """
+    すべての列に値を持つ行（属性名をキーとする辞書）を返す。
+    """
+    return {'column1': YEAR_MONTH, 'column2': name, **{f'column{i}': str(i) for i in range(3, 14)}}
+
+def count_rows(session_factory, table, name):
+    with session_factory() as session:
+        return session.scalar(select(func.count()).select_from(table).where(table.c.原価センタ == name))
+
+def test_failed_swap_keeps_previous_month_under_autocommit(autocommit_session_factory):
+    with autocommit_session_factory() as session:
+        session.add_all([ActualExpenses(**make_row('前回')) for _ in range(2)])
+        session.commit()
+    with autocommit_session_factory() as session:
+        load_into_shadow(session, ActualExpenses, [make_row('今回') for _ in range(3)], '年月', YEAR_MONTH)
+
+    # 1つ目のテーブルの入れ替え後に失敗させる
+    targets = [(ActualExpenses, '年月', YEAR_MONTH), (ActualExpenses, '存在しない列', YEAR_MONTH)]
+    with autocommit_session_factory() as session, pytest.raises(KeyError):
+        swap_months(session, targets)
+
+    table = ActualExpenses.__table__
+    assert count_rows(autocommit_session_factory, table, '前回') == 2
+    assert count_rows(autocommit_session_factory, table, '今回') == 0
+    assert count_rows(autocommit_session_factory, get_shadow_table(ActualExpenses), '今回') == 3
+
+def test_swap_under_autocommit(autocommit_session_factory):
+    with autocommit_session_factory() as session:
+        session.add(ActualExpenses(**make_row('前回')))
+        session.commit()
+    with autocommit_session_factory() as session:
+        load_into_shadow(session, ActualExpenses, [make_row('今回') for _ in range(3)], '年月', YEAR_MONTH)
+        assert swap_months(session, [(ActualExpenses, '年月', YEAR_MONTH)]) == {'T_ExpenseActuals': 3}
+
+    table = ActualExpenses.__table__
+    assert count_rows(autocommit_session_factory, table, '前回') == 0
+    assert count_rows(autocommit_session_factory, table, '今回') == 3
+    assert count_rows(autocommit_session_factory, get_shadow_table(ActualExpenses), '今回') == 0
@@ -0,0 +1,13 @@
+from sqlalchemy.orm import sessionmaker
+
+from database import build_engine
+from transaction_utils import shares_connection
+
+def test_shares_connection(tmp_path):
+    memory = build_engine({'url': 'sqlite://'})
+    file = build_engine({'url': f"sqlite:///{tmp_path / 'test.db'}"})
+
+    assert shares_connection(sessionmaker(bind=memory))
+    assert not shares_connection(sessionmaker(bind=file))
+    memory.dispose()
+    file.dispose()
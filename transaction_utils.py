@@ -0,0 +1,109 @@
+from contextlib import contextmanager
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import logging
+import time
+
+from instrumentation import annotate
+
+# 1回の取込のトランザクションの分離レベル
+# 接続URLでautocommitを有効にしている場合も、取込中はこのコネクションだけ明示的なトランザクションにする
+RUN_ISOLATION_LEVEL = 'READ COMMITTED'
+
+# セッションを明示的なトランザクションで実行するための分離レベル（データベースごとの既定の分離レベル）
+# 分離レベルを指定すると、DBAPIのautocommitが無効になる（コネクションがプールへ戻る時に元に戻る）
+TRANSACTION_ISOLATION_LEVELS = {'mssql': RUN_ISOLATION_LEVEL, 'sqlite': 'SERIALIZABLE'}
+
+class LoadRolledBack(Exception):
+    """
+    同じトランザクションで取り込んだ他のデータソースのエラーにより、取込がロールバックされたことを示す例外。
+    """
+
+def _get_bind(session_factory):
+    """
+    セッションファクトリの接続先（エンジン）を返すヘルパー関数。
+    """
+    session = session_factory()
+    try:
+        return session.get_bind()
+    finally:
+        session.close()
+
+def begin_transaction(session):
+    """
+    セッションの最初の操作の前に呼び出し、接続URLでautocommitを有効にしている場合も、
+    セッションのコミット・ロールバックまでを1つのトランザクションとして実行するコネクションを取得する。
+    取込用のコネクション（run_transaction）にバインドされたセッションや、すでにコネクションを取得したセッションはそのまま使用する。
+    Returns:
+        Connection: セッションのコネクション
+    """
+    bind = session.get_bind()
+    isolation_level = TRANSACTION_ISOLATION_LEVELS.get(bind.dialect.name)
+    if isinstance(bind, Connection) or session.in_transaction() or isolation_level is None:
+        return session.connection()
+    return session.connection(execution_options={'isolation_level': isolation_level})
+
+def is_autocommit(connection):
+    """
+    コネクションのDBAPIコネクションがautocommitかどうか（文ごとにコミットされ、セーブポイントが使えないかどうか）を返す。
+    """
+    return connection.dialect.detect_autocommit_setting(connection.connection.dbapi_connection)
+
+def shares_connection(session_factory):
+    """
+    すべてのセッションが1つのコネクションを共有するかどうか（メモリ上のSQLite）を返す。
+    1つのコネクションでは同時に1つのトランザクションしか実行できないため、呼び出し側はセッションを並行して使用しない。
+    """
+    bind = _get_bind(session_factory)
+    return isinstance(getattr(bind, 'pool', None), StaticPool)
+
+@contextmanager
+def run_transaction(session_factory, savepoint_per_source=True):
+    """
+    1回の取込で使用するコネクションを1つだけ取得し、1つのトランザクション内でセッションを生成するファクトリを返す。
+    生成したセッションのcommitはトランザクションを確定せず、ブロックが正常に終了した時点で1回だけコミットする。
+    ブロック内で例外が発生した場合（キャンセルを含む）は、すべてのデータソースの挿入をロールバックする。
+
+    savepoint_per_source=Trueの場合は、セッションごとにセーブポイントを作成し、
+    セッションのrollbackはそのデータソースの挿入だけを取り消す（他のデータソースはそのままコミットできる）。
+    Falseの場合は、セッションのrollbackでトランザクション全体をロールバックする。
+
+    Args:
+        session_factory: 接続先のエンジンにバインドされたセッションを生成する関数
+        savepoint_per_source (bool): セッション（データソース）ごとにセーブポイントを作成するかどうか
+    Yields:
+        function: 取込用のコネクションにバインドされたセッションを生成する関数
+    """
+    connection = _get_bind(session_factory).connect()
+    try:
+        if connection.dialect.name == 'mssql':
+            connection = connection.execution_options(isolation_level=RUN_ISOLATION_LEVEL)
+        transaction = connection.begin()
+        if connection.dialect.name == 'sqlite':
+            # pysqliteは最初の更新系の文まで BEGIN を送らず、その前に作成したセーブポイントの解放がコミットになるため、明示的に開始する
+            connection.exec_driver_sql('BEGIN')
+        run_sessionmaker = sessionmaker(
+            bind=connection, autoflush=False,
+            join_transaction_mode='create_savepoint' if savepoint_per_source else 'rollback_only',
+        )
+
+        def run_session_factory():
+            # ロールバック済みのコネクションで、挿入待ちだったデータソースが新しいトランザクションを始めないようにする
+            if not transaction.is_active:
+                raise LoadRolledBack("取込のトランザクションはすでにロールバックされています。")
+            return run_sessionmaker()
+
+        try:
+            yield run_session_factory
+        except BaseException:
+            if transaction.is_active:
+                transaction.rollback()
+            logging.warning("取込のトランザクションをロールバックしました。")
+            raise
+        commit_start_time = time.perf_counter()
+        transaction.commit()
+        annotate(commit_seconds=time.perf_counter() - commit_start_time)
+        logging.info(f"取込のトランザクションをコミットしました。（{time.perf_counter() - commit_start_time:.2f}秒）")
+    finally:
+        connection.close()
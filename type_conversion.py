@@ -0,0 +1,119 @@
+from sqlalchemy import Date, Integer, Numeric, inspect
+import logging
+import pandas as pd
+
+from row_batch import RowBatch
+
+# Excelのシリアル値の起点（1900年うるう年バグを含めた1899/12/30）
+EXCEL_EPOCH = '1899-12-30'
+# シリアル値として扱う範囲（1900/01/01 ～ 9999/12/31）
+EXCEL_SERIAL_RANGE = (1, 2958465)
+
+# エラーログに出力する値の最大数（列ごと）
+MAX_LOGGED_ERROR_VALUES = 5
+
+def _clean_text(series):
+    """
+    前後の空白と桁区切りのカンマを除去し、空文字列を欠損値にするヘルパー関数。
+    数値・日付型の値はそのまま残す。
+    """
+    is_text = series.map(lambda value: isinstance(value, str))
+    if not is_text.any():
+        return series
+    cleaned = series.copy()
+    text = series[is_text].str.strip().str.replace(',', '', regex=False)
+    cleaned[is_text] = text.where(text != '', None)
+    return cleaned
+
+def to_numeric_series(series):
+    """
+    列を数値に変換する。変換できない値は欠損値にする。
+    Returns:
+        Tuple[Series, Series]: 変換後の列、変換できなかった行のマスク
+    """
+    cleaned = _clean_text(series)
+    converted = pd.to_numeric(cleaned, errors='coerce')
+    return converted, cleaned.notna() & converted.isna()
+
+def to_integer_series(series):
+    """
+    列を整数に変換する。小数部を持つ値や変換できない値は欠損値にする。
+    """
+    converted, errors = to_numeric_series(series)
+    fractional = converted.notna() & (converted % 1 != 0)
+    converted = converted.where(~fractional).astype('Int64')
+    return converted, errors | fractional
+
+def to_date_series(series):
+    """
+    列を日付に変換する。数値はExcelのシリアル値、文字列は日付表記として解釈する。
+    """
+    cleaned = _clean_text(series)
+    numeric = pd.to_numeric(cleaned, errors='coerce')
+    is_serial = numeric.between(*EXCEL_SERIAL_RANGE)
+    # 20240501のような8桁の数値はyyyymmdd表記として扱う
+    is_compact = numeric.between(19000101, 99991231) & (numeric % 1 == 0)
+
+    converted = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    converted[is_serial] = pd.to_datetime(numeric[is_serial], unit='D', origin=EXCEL_EPOCH)
+    converted[is_compact] = pd.to_datetime(numeric[is_compact].astype('int64').astype(str), format='%Y%m%d', errors='coerce')
+    others = cleaned.notna() & ~is_serial & ~is_compact
+    if others.any():
+        converted[others] = pd.to_datetime(cleaned[others].astype(str), format='mixed', errors='coerce')
+    return converted.dt.date.where(converted.notna(), None), cleaned.notna() & converted.isna()
+
+def get_series_converter(column_type):
+    """
+    SQLAlchemyの型に対応する変換関数を返す（変換不要の型はNone）。
+    """
+    if isinstance(column_type, Integer):
+        return to_integer_series
+    if isinstance(column_type, Numeric):
+        return to_numeric_series
+    if isinstance(column_type, Date):
+        return to_date_series
+    return None
+
+def convert_rows(model, data_list):
+    """
+    辞書形式のデータを、モデルの列の型に合わせて列単位でまとめて変換する。
+    変換できない値はNULLとして挿入し、エラーとして収集する（チャンク全体を失敗させない）。
+
+    Args:
+        model: 型付きのモデルクラス
+        data_list (List[Dict] | RowBatch): 属性名をキーとする辞書形式データ、またはRowBatch
+    Returns:
+        Tuple[List[Dict] | RowBatch, List[Dict]]: 変換後のデータ（data_listと同じ形式）、変換エラー（{'row': 行番号, 'column': 列名, 'value': 元の値}）のリスト
+    """
+    if not data_list:
+        return data_list, []
+
+    frame = data_list.to_frame() if isinstance(data_list, RowBatch) else pd.DataFrame(data_list)
+    errors = []
+    for prop in inspect(model).column_attrs:
+        converter = get_series_converter(prop.columns[0].type)
+        if converter is None or prop.key not in frame.columns:
+            continue
+        original = frame[prop.key].astype(object)
+        converted, error_mask = converter(original)
+        frame[prop.key] = converted.astype(object).where(converted.notna(), None)
+        errors.extend(
+            {'row': row, 'column': prop.columns[0].name, 'value': original[row]}
+            for row in error_mask[error_mask].index
+        )
+
+    values = frame.astype(object).where(frame.notna(), None)
+    if isinstance(data_list, RowBatch):
+        return RowBatch.from_frame(values), errors
+    return values.to_dict('records'), errors
+
+def log_conversion_errors(model, errors):
+    """
+    変換エラーを列ごとに集計してログに出力する。
+    """
+    by_column = {}
+    for error in errors:
+        by_column.setdefault(error['column'], []).append(error['value'])
+    for column_name, values in by_column.items():
+        samples = ", ".join(repr(value) for value in values[:MAX_LOGGED_ERROR_VALUES])
+        logging.warning(f"{model.__tablename__}の{column_name}で{len(values)}件の値を変換できなかったためNULLにしました。（例: {samples}）")
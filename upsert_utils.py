@@ -0,0 +1,151 @@
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy.orm import Session
+import itertools
+import logging
+import time
+
+from bulk_insert_utils import LoadCancelled, execute_insert
+from instrumentation import annotate
+from row_validation import RowValidator, reject_rows
+
+# ステージングテーブル名の連番（同じセッション内で同じテーブルを続けてUPSERTしても名前が重複しないようにする）
+_staging_sequence = itertools.count(1)
+
+def is_surrogate_key(column):
+    """
+    自動採番の代理キー（id）の列かどうかを返す。
+    """
+    return column.primary_key and column.autoincrement is True and column.name == 'id'
+
+def get_upsert_keys(model):
+    """
+    UPSERTの照合に使う主キー列を返す。
+    自動採番の代理キー（id）しか主キーを持たないモデルは照合できないため、空のリストを返す。
+    """
+    return [column for column in model.__table__.primary_key.columns if not is_surrogate_key(column)]
+
+def supports_upsert(model):
+    """
+    モデルがUPSERTに対応しているかどうか（自動採番ではない主キーを持つかどうか）を返す。
+    """
+    return bool(get_upsert_keys(model))
+
+def _create_staging_table(connection, model):
+    """
+    セッション（コネクション）だけから見える一時テーブルを作成するヘルパー関数。
+    SQL Serverはローカル一時テーブル（#で始まる名前）、SQLiteはTEMPORARYテーブルを使用する。
+    主キー・制約は付けず、挿入先のテーブルと同じ列名と型のみを持たせる。
+    """
+    table = model.__table__
+    name = f"stg_{table.name}_{next(_staging_sequence)}"
+    columns = [Column(column.name, column.type, key=column.key) for column in table.columns]
+    if connection.dialect.name == 'mssql':
+        staging = Table(f"#{name}", MetaData(), *columns)
+    else:
+        staging = Table(name, MetaData(), *columns, prefixes=['TEMPORARY'])
+    staging.create(connection)
+    return staging
+
+def _merge_statement(target, staging, keys, dialect):
+    """
+    ステージングテーブルから挿入先テーブルへ1文で反映するSQLを返すヘルパー関数。
+    SQL ServerはMERGE、SQLite・PostgreSQLはINSERT ... ON CONFLICT DO UPDATEを使用する。
+    """
+    quote = dialect.identifier_preparer.quote
+    key_names = [column.name for column in keys]
+    column_names = [column.name for column in staging.columns]
+    update_names = [name for name in column_names if name not in key_names]
+    target_name = dialect.identifier_preparer.format_table(target)
+    staging_name = dialect.identifier_preparer.format_table(staging)
+    insert_columns = ", ".join(quote(name) for name in column_names)
+
+    if dialect.name == 'mssql':
+        on_clause = " AND ".join(f"t.{quote(name)} = s.{quote(name)}" for name in key_names)
+        update_clause = ", ".join(f"t.{quote(name)} = s.{quote(name)}" for name in update_names)
+        values = ", ".join(f"s.{quote(name)}" for name in column_names)
+        matched = f" WHEN MATCHED THEN UPDATE SET {update_clause}" if update_names else ""
+        return (
+            f"MERGE INTO {target_name} WITH (HOLDLOCK) AS t USING {staging_name} AS s ON {on_clause}"
+            f"{matched} WHEN NOT MATCHED BY TARGET THEN INSERT ({insert_columns}) VALUES ({values});"
+        )
+
+    if dialect.name in ('sqlite', 'postgresql'):
+        conflict_columns = ", ".join(quote(name) for name in key_names)
+        if update_names:
+            action = "DO UPDATE SET " + ", ".join(f"{quote(name)} = excluded.{quote(name)}" for name in update_names)
+        else:
+            action = "DO NOTHING"
+        # SQLiteはINSERT ... SELECTとON CONFLICTの構文のあいまいさを避けるためWHERE句が必要
+        return (
+            f"INSERT INTO {target_name} ({insert_columns}) SELECT {insert_columns} FROM {staging_name} WHERE true"
+            f" ON CONFLICT ({conflict_columns}) {action}"
+        )
+
+    raise ValueError(f"UPSERTに対応していないデータベースです: {dialect.name}")
+
+def upsert_with_staging(session: Session, model, data_list, chunk_size=1000, cancel_event=None, progress_callback=None):
+    """
+    データをセッション専用のステージングテーブルへチャンク単位で挿入し、
+    挿入先テーブルへ主キーで照合する1文（MERGE / ON CONFLICT）で反映する。
+    既存のレコードは更新し、新しいレコードは挿入するため、再配信されたデータを事前の削除なしで取り込める。
+    cancel_eventがセットされた場合は次のチャンクの前で中断し、ロールバックしてLoadCancelledを送出する。
+
+    Args:
+        session (Session): SQLAlchemyセッション
+        model: SQLAlchemyのモデルクラス（自動採番ではない主キーを持つもの）
+        data_list (List[Dict] | RowBatch): 挿入対象の辞書形式データ、またはRowBatch
+        chunk_size (int): ステージングテーブルへ1回に挿入するレコード数
+        cancel_event (threading.Event): キャンセル要求を通知するイベント
+        progress_callback (function): 1チャンク挿入ごとに (挿入済み件数, 総件数) で呼び出される関数
+    Returns:
+        int: 反映したレコード数（データベースが返す件数）
+    """
+    keys = get_upsert_keys(model)
+    if not keys:
+        raise ValueError(f"{model.__tablename__} は照合に使える主キーが無いためUPSERTできません。")
+    if not data_list:
+        return 0
+
+    connection = session.connection()
+    staging = None
+    try:
+        start_time = time.perf_counter()
+        staging = _create_staging_table(connection, model)
+        execution_options = {'fast_executemany': True} if connection.dialect.name == 'mssql' else {}
+        # 主キーが重複する行などは、反映（MERGE / ON CONFLICT）の文全体を失敗させないよう先に除外する
+        validator = RowValidator(model)
+        for i in range(0, len(data_list), chunk_size):
+            if cancel_event is not None and cancel_event.is_set():
+                raise LoadCancelled(f"{model.__tablename__} へのデータ挿入はキャンセルされました。")
+            chunk = data_list[i:i + chunk_size]
+            valid_chunk, rejected = validator.check(chunk)
+            reject_rows(model, rejected)
+            if valid_chunk:
+                execute_insert(connection, model, staging, valid_chunk, execution_options=execution_options)
+            if progress_callback:
+                progress_callback(i + len(chunk), len(data_list))
+
+        merged = connection.exec_driver_sql(_merge_statement(model.__table__, staging, keys, connection.dialect)).rowcount
+        staging.drop(connection)
+        staging = None
+        commit_start_time = time.perf_counter()
+        session.commit()
+        annotate(strategy='upsert', commit_seconds=time.perf_counter() - commit_start_time)
+        logging.info(f"{model.__tablename__} に {len(data_list)} 件のデータをステージングテーブル経由でUPSERTしました。（反映: {merged}件, {time.perf_counter() - start_time:.2f}秒）")
+        return merged
+    except LoadCancelled as e:
+        session.rollback()
+        logging.warning(f"{e}ロールバックしました。")
+        raise
+    except Exception as e:
+        session.rollback()
+        logging.error(f"{model.__tablename__} へのUPSERT中にエラーが発生しました: {e}")
+        raise
+    finally:
+        if staging is not None:
+            # 一時テーブルはセッション終了時に削除されるが、プールに戻るコネクションに残さないよう削除する
+            try:
+                staging.drop(session.connection(), checkfirst=True)
+                session.commit()
+            except Exception:
+                session.rollback()